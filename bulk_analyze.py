@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Bulk plant disease analysis for directories of scouting photos.
+
+Images are fanned out to a process pool and diagnosed with the same
+analyze_plant_image_bytes pipeline the MCP tools use. Results stream to a
+JSONL or Parquet file as they finish; a checkpoint file records the images
+whose results are safely in the output, so an interrupted run resumes where
+it left off. With --features the
+extracted features are also stored as compact records that can be
+re-diagnosed later with different thresholds (see models/feature_records.py).
+
+    python bulk_analyze.py photos/ "archive/**/*.jpg" -o results.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.image_files import find_images
+
+# Parquet output is optional
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    pq = None
+    PYARROW_AVAILABLE = False
+
+# Diagnoses returned for images that could not be analyzed
+ERROR_DISEASES = {"Error", "Analysis Error"}
+
+# Diagnosis returned for photos turned away by the quality gate
+REJECTED_DISEASE = "Image Rejected"
+
+# Submitted-but-unfinished images per worker
+IN_FLIGHT_PER_WORKER = 4
+
+# Thread pool limits for the workers are optional
+try:
+    from threadpoolctl import threadpool_limits
+    THREADPOOLCTL_AVAILABLE = True
+except ImportError:
+    threadpool_limits = None
+    THREADPOOLCTL_AVAILABLE = False
+
+def default_workers():
+    """Worker processes to use: the CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+class Checkpoint:
+    """Append-only list of finished image paths"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def mark(self, image_path):
+        self._file.write(image_path + "\n")
+        self._file.flush()
+        self.done.add(image_path)
+
+    def close(self):
+        self._file.close()
+
+class JsonlWriter:
+    """
+    One JSON record per line, flushed as results arrive. Like every writer,
+    write() and flush() return the paths whose records are now safely in
+    the output, which are the only ones the checkpoint may record.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        return [record["path"]]
+
+    def flush(self):
+        return []
+
+    def close(self):
+        self._file.close()
+
+class ParquetWriter:
+    """
+    Parquet output written in row groups of batch_size records. A Parquet
+    file is only readable once closed (its footer is written last), so the
+    writer closes the file every rows_per_file records and continues in the
+    next free '<stem>.partN.parquet'; rows count as written only when their
+    file is closed. A resumed run likewise starts a new part.
+    """
+
+    SCHEMA_FIELDS = [
+        ("path", "string"), ("status", "string"), ("disease", "string"), ("recommendations", "string"),
+        ("source_width", "int32"), ("source_height", "int32"),
+        ("analyzed_width", "int32"), ("analyzed_height", "int32"),
+        ("escalated", "bool"), ("elapsed", "float64"),
+    ]
+
+    def __init__(self, path, batch_size=256, rows_per_file=4096):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+        self.base_path = Path(path)
+        self.paths = []
+        self.schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in self.SCHEMA_FIELDS])
+        self.batch_size = batch_size
+        self.rows_per_file = rows_per_file
+        self._rows = []
+        self._unclosed = []
+        self._writer = None
+
+    @staticmethod
+    def part_path(base_path, part):
+        """Name of roll-over file 'part': results.parquet -> results.part1.parquet (other dots are kept)"""
+        name = base_path.name
+        stem = name[:-len(".parquet")] if name.endswith(".parquet") else name
+        return base_path.with_name(f"{stem}.part{part}.parquet")
+
+    def _open(self):
+        path = self.base_path
+        part = 1
+        while path.exists():
+            path = self.part_path(self.base_path, part)
+            part += 1
+        self.paths.append(path)
+        self._writer = pq.ParquetWriter(str(path), self.schema)
+
+    def write(self, record):
+        resolution = record.get("resolution") or {}
+        source = resolution.get("source") or [None, None]
+        analyzed = resolution.get("analyzed") or [None, None]
+        self._rows.append({
+            "path": record["path"],
+            "status": record["status"],
+            "disease": record.get("disease"),
+            "recommendations": record.get("recommendations"),
+            "source_width": source[0], "source_height": source[1],
+            "analyzed_width": analyzed[0], "analyzed_height": analyzed[1],
+            "escalated": resolution.get("escalated"),
+            "elapsed": record.get("elapsed"),
+        })
+        self._unclosed.append(record["path"])
+        if len(self._rows) >= self.batch_size:
+            self._write_row_group()
+        if len(self._unclosed) >= self.rows_per_file:
+            return self.flush()
+        return []
+
+    def _write_row_group(self):
+        if self._rows:
+            if self._writer is None:
+                self._open()
+            self._writer.write_table(pa.Table.from_pylist(self._rows, schema=self.schema))
+            self._rows = []
+
+    def flush(self):
+        """Close the current file; returns the paths it holds"""
+        self._write_row_group()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        written, self._unclosed = self._unclosed, []
+        return written
+
+    def close(self):
+        self.flush()
+
+def open_writer(path, output_format=None):
+    """JSONL or Parquet writer, chosen by --format or the output extension"""
+    output_format = output_format or ("parquet" if str(path).endswith(".parquet") else "jsonl")
+    if output_format == "parquet":
+        return ParquetWriter(path)
+    return JsonlWriter(path)
+
+def _init_worker():
+    # One process per core already; keep OpenCV and BLAS/OpenMP from adding their own threads
+    import cv2
+    cv2.setNumThreads(1)
+    if THREADPOOLCTL_AVAILABLE:
+        threadpool_limits(1)
+
+def analyze_file(path, with_features=False):
+    """
+    Diagnose one image file in a worker process; never raises.
+    With with_features the result carries the image's feature record under
+    'features' (None if it could not be analyzed).
+    """
+    from models.disease_predictor import analyze_plant_image_bytes
+    from models.feature_records import analyze_to_record
+
+    start = time.perf_counter()
+    features = None
+    try:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        if with_features:
+            diagnosis, features = analyze_to_record(image_bytes)
+        else:
+            diagnosis = analyze_plant_image_bytes(image_bytes)
+    except Exception as e:
+        diagnosis = {"disease": "Error", "recommendations": f"Unable to read the image: {e}"}
+    if diagnosis.get("disease") in ERROR_DISEASES:
+        status = "error"
+    elif diagnosis.get("disease") == REJECTED_DISEASE:
+        status = "rejected"
+    else:
+        status = "ok"
+    record = {"path": path, "status": status, **diagnosis, "elapsed": round(time.perf_counter() - start, 4)}
+    if with_features:
+        record["features"] = features
+    return record
+
+class Progress:
+    """Single-line progress display with images/sec, throttled to a few updates a second"""
+
+    def __init__(self, total, stream=sys.stderr, enabled=True, interval=0.5):
+        self.total = total
+        self.stream = stream
+        self.enabled = enabled
+        self.interval = interval
+        self.done = 0
+        self.errors = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, record):
+        self.done += 1
+        self.errors += record["status"] == "error"
+        now = time.perf_counter()
+        if self.enabled and (now - self._last >= self.interval or self.done == self.total):
+            self._last = now
+            self.stream.write(f"\r🌿 {self.done}/{self.total} images | {self.rate():.1f} img/s | {self.errors} errors")
+            self.stream.flush()
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def close(self):
+        if self.enabled and self.done:
+            self.stream.write("\n")
+
+def run(paths, writer, checkpoint, workers, progress, features_path=None):
+    """
+    Fan paths out to the pool, writing each result as it finishes. Images are
+    checkpointed (and their feature records appended to features_path, when
+    given) once the writer reports their records as written, so a crash
+    repeats at most the records the writer had not yet written out.
+    """
+    from models.feature_records import append_feature_records
+
+    pending = iter(paths)
+    in_flight = set()
+    unwritten_features = {}
+
+    def finish(written):
+        for path in written:
+            features = unwritten_features.pop(path, None)
+            if features is not None:
+                append_feature_records(features_path, features)
+            checkpoint.mark(path)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            def submit_next():
+                path = next(pending, None)
+                if path is None:
+                    return False
+                in_flight.add(executor.submit(analyze_file, path, features_path is not None))
+                return True
+
+            for _ in range(workers * IN_FLIGHT_PER_WORKER):
+                if not submit_next():
+                    break
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    in_flight.discard(future)
+                    record = future.result()
+                    features = record.pop("features", None)
+                    if features is not None:
+                        unwritten_features[record["path"]] = features
+                    finish(writer.write(record))
+                    progress.update(record)
+                    submit_next()
+    finally:
+        # Also on interrupt: finished results are written out and checkpointed
+        finish(writer.flush())
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk plant disease analysis of image directories")
+    parser.add_argument("inputs", nargs="+", help="Image directories (searched recursively) or glob patterns")
+    parser.add_argument("-o", "--output", default="analysis_results.jsonl", help="Output .jsonl or .parquet file")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], help="Output format (default: from extension)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--features", help="Also append feature records to this file for later re-diagnosis")
+    parser.add_argument("-j", "--workers", type=int, default=default_workers(), help="Worker processes")
+    parser.add_argument("--no-progress", action="store_true", help="Disable the progress display")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """CLI entry point; returns the process exit code"""
+    args = parse_args(argv)
+
+    paths = find_images(args.inputs)
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output}.checkpoint")
+    remaining = [path for path in paths if path not in checkpoint.done]
+    print(f"📂 {len(paths)} images found, {len(paths) - len(remaining)} already done, "
+          f"{len(remaining)} to analyze with {args.workers} workers", file=sys.stderr)
+    if not remaining:
+        checkpoint.close()
+        return 0
+
+    writer = open_writer(args.output, args.format)
+    progress = Progress(len(remaining), enabled=not args.no_progress)
+    try:
+        run(remaining, writer, checkpoint, args.workers, progress, args.features)
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted - rerun the same command to resume", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+        checkpoint.close()
+        progress.close()
+
+    print(f"✅ {progress.done} images in {time.perf_counter() - progress.start:.1f}s "
+          f"({progress.rate():.1f} img/s), {progress.errors} errors", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Export the MobileNetV2 plant disease model for the faster CPU backends.
+
+Writes a frozen TorchScript module and an int8-quantized ONNX graph next to
+the model in model_cache/exports/, then checks that each backend picks the
+same top-1 class as the fp32 model on a set of check images (the repo's
+sample leaves and flipped, rotated, cropped and re-lit copies of them) and
+fails if agreement drops below --min-agreement. Select the backend the server
+uses with "inference": {"backend": ...} in config.json.
+
+    python export_model.py --benchmark
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageOps
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.image_files import find_images
+from models.inference_backends import (
+    BACKEND_NAMES, EagerBackend, create_backend, export_directory, export_model, measure_backend, top1_agreement,
+)
+from models.model_loader import load_offline_model, resident_memory_mb
+from tools.config_loader import get_tool_config
+
+MODEL_REPO = "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification"
+SAMPLE_IMAGES = [str(Path(__file__).parent / "images.jpeg"),
+                 str(Path(__file__).parent / "rust_fungus-min_1024x1024.webp")]
+
+def check_variants(image):
+    """The image plus flipped, rotated, cropped and re-lit copies"""
+    width, height = image.size
+    return [
+        image,
+        ImageOps.mirror(image),
+        ImageOps.flip(image),
+        image.rotate(90, expand=True),
+        image.crop((width // 10, height // 10, width - width // 10, height - height // 10)),
+        ImageEnhance.Brightness(image).enhance(0.8),
+        ImageEnhance.Brightness(image).enhance(1.2),
+        ImageEnhance.Contrast(image).enhance(1.3),
+    ]
+
+def check_pixels(processor, paths):
+    """Preprocessed pixel_values of every check variant of every image"""
+    images = [variant for path in paths for variant in check_variants(Image.open(path).convert("RGB"))]
+    return processor(images=images, return_tensors="np")["pixel_values"]
+
+def load_fp32_model(cache_dir, offline, revision):
+    if offline:
+        return load_offline_model(cache_dir, MODEL_REPO, revision)
+    from transformers import AutoImageProcessor, AutoModelForImageClassification
+    processor = AutoImageProcessor.from_pretrained(MODEL_REPO, cache_dir=cache_dir)
+    model = AutoModelForImageClassification.from_pretrained(MODEL_REPO, cache_dir=cache_dir)
+    return processor, model.eval()
+
+def parse_args(argv=None):
+    loading = get_tool_config("disease_predictor").get("model_loading", {})
+    parser = argparse.ArgumentParser(description="Export the plant disease model to TorchScript and int8 ONNX")
+    parser.add_argument("--cache-dir", default=loading.get("cache_dir", "./model_cache"), help="Model cache directory")
+    parser.add_argument("--offline", action="store_true", default=loading.get("offline", False),
+                        help="Load the fp32 model straight from the cached snapshot")
+    parser.add_argument("--revision", default=loading.get("revision", "main"), help="Snapshot revision (offline)")
+    parser.add_argument("--check-images", nargs="+", default=SAMPLE_IMAGES,
+                        help="Image directories or glob patterns for the top-1 agreement check")
+    parser.add_argument("--min-agreement", type=float, default=0.95,
+                        help="Fail when a backend agrees with fp32 on fewer of the check images")
+    parser.add_argument("--benchmark", action="store_true", help="Also time every backend")
+    parser.add_argument("--batch-size", type=int, default=8, help="Batch size for the benchmark")
+    return parser.parse_args(argv)
+
+def memory_growth(before):
+    """Resident MB gained since 'before', or None where resident memory is not reported"""
+    after = resident_memory_mb()
+    return None if before is None or after is None else after - before
+
+def main(argv=None):
+    """CLI entry point; returns the process exit code"""
+    args = parse_args(argv)
+
+    before = resident_memory_mb()
+    processor, model = load_fp32_model(args.cache_dir, args.offline, args.revision)
+    memory = {"eager": memory_growth(before)}
+    directory = export_directory(args.cache_dir, MODEL_REPO)
+    for name, path in export_model(model, directory).items():
+        print(f"📦 {name}: {path} ({path.stat().st_size / 2 ** 20:.1f} MB)", file=sys.stderr)
+
+    paths = find_images(args.check_images)
+    if not paths:
+        print("❌ No check images found", file=sys.stderr)
+        return 1
+    pixel_values = check_pixels(processor, paths)
+    reference = EagerBackend(model)
+    backends = {"eager": reference}
+    failed = False
+    reference.run(pixel_values[:1])
+    for name in BACKEND_NAMES[1:]:
+        before = resident_memory_mb()
+        backends[name] = create_backend(name, directory=directory)
+        backends[name].run(pixel_values[:1])
+        memory[name] = memory_growth(before)
+        check = top1_agreement(reference, backends[name], pixel_values)
+        ok = check["agreement"] >= args.min_agreement
+        failed = failed or not ok
+        print(f"{'✅' if ok else '❌'} {name}: top-1 agreement {check['agreement']:.1%} on {check['images']} images "
+              f"(max logit difference {check['max_logit_difference']})", file=sys.stderr)
+
+    if args.benchmark:
+        batch = np.resize(pixel_values, (args.batch_size, *pixel_values.shape[1:]))
+        for name, backend in backends.items():
+            if memory[name] is not None:
+                print(f"⏱️  {name}: +{memory[name]:.1f} MB resident to load and run", file=sys.stderr)
+            for size in (1, args.batch_size):
+                stats = measure_backend(backend, batch[:size])
+                print(f"   {name} batch {size}: p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms, "
+                      f"{stats['images_per_second']} img/s", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
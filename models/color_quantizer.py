@@ -0,0 +1,130 @@
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+# Pixels kept by the subsampled clustering mode
+SUBSAMPLE_SIZE = 20000
+
+# Random batches fed to mini-batch KMeans
+MINIBATCH_SIZE = 4096
+MINIBATCH_STEPS = 50
+
+# Pixels checked first, then per step, when counting unique colours up to a limit
+UNIQUE_SAMPLE_SIZE = 4096
+UNIQUE_CHUNK_SIZE = 65536
+
+# Bits kept per channel when building the 3D colour histogram (5 bits -> 32^3 bins)
+HISTOGRAM_BITS = 5
+
+DEFAULT_MODE = "histogram"
+
+def pack_rgb(rgb_pixels):
+    """Pack an (N, 3) uint8 RGB array into one 24-bit integer per pixel"""
+    rgb_pixels = np.asarray(rgb_pixels, dtype=np.uint8).reshape(-1, 3)
+    return (rgb_pixels[:, 0].astype(np.uint32) << 16) | (rgb_pixels[:, 1].astype(np.uint32) << 8) | rgb_pixels[:, 2]
+
+def count_unique_colors(rgb_pixels, limit=None):
+    """
+    Count distinct RGB colors with a bincount over packed 24-bit values.
+    With a limit, the colours seen so far are grown chunk by chunk, starting
+    from a small sample, and the count stops once the limit is reached,
+    which is all analyze_color_distribution needs. Near-flat images never
+    pay for the 2^24-entry bincount that way.
+    """
+    rgb_pixels = np.asarray(rgb_pixels, dtype=np.uint8).reshape(-1, 3)
+    if limit is not None:
+        seen = np.unique(pack_rgb(rgb_pixels[:UNIQUE_SAMPLE_SIZE]))
+        for start in range(UNIQUE_SAMPLE_SIZE, len(rgb_pixels), UNIQUE_CHUNK_SIZE):
+            if len(seen) >= limit:
+                break
+            chunk = pack_rgb(rgb_pixels[start:start + UNIQUE_CHUNK_SIZE])
+            new = chunk[~np.isin(chunk, seen)]
+            if len(new):
+                seen = np.union1d(seen, new)
+        return min(len(seen), limit)
+    counts = np.bincount(pack_rgb(rgb_pixels), minlength=1)
+    return int(np.count_nonzero(counts))
+
+def colour_histogram(rgb_pixels, bits=HISTOGRAM_BITS):
+    """
+    Build a sparse 3D colour histogram.
+    Returns the mean RGB colour of every occupied bin and its pixel count.
+    """
+    rgb_pixels = np.asarray(rgb_pixels, dtype=np.uint8).reshape(-1, 3)
+    quantized = (rgb_pixels >> (8 - bits)).astype(np.uint16)
+    bins = ((quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]).astype(np.intp)
+    n_bins = 1 << (3 * bits)
+
+    counts = np.bincount(bins, minlength=n_bins)
+    occupied = np.nonzero(counts)[0]
+    sums = np.stack([np.bincount(bins, weights=rgb_pixels[:, c], minlength=n_bins)[occupied]
+                     for c in range(3)], axis=1)
+    weights = counts[occupied].astype(np.float64)
+    return sums / weights[:, None], weights
+
+def _quantize_exact(rgb_pixels, n_colors):
+    """Full-resolution KMeans, the original behaviour"""
+    kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
+    kmeans.fit(rgb_pixels)
+    return kmeans.cluster_centers_
+
+def _quantize_subsample(rgb_pixels, n_colors):
+    """KMeans on a fixed-size random subsample of the pixels"""
+    if len(rgb_pixels) > SUBSAMPLE_SIZE:
+        rng = np.random.default_rng(42)
+        rgb_pixels = rgb_pixels[rng.choice(len(rgb_pixels), SUBSAMPLE_SIZE, replace=False)]
+    return _quantize_exact(rgb_pixels, n_colors)
+
+def _quantize_minibatch(rgb_pixels, n_colors):
+    """Mini-batch KMeans over a fixed number of random pixel batches"""
+    rng = np.random.default_rng(42)
+    kmeans = MiniBatchKMeans(n_clusters=n_colors, random_state=42, n_init=3, batch_size=MINIBATCH_SIZE)
+    for _ in range(MINIBATCH_STEPS):
+        batch = rgb_pixels[rng.integers(0, len(rgb_pixels), MINIBATCH_SIZE)]
+        kmeans.partial_fit(batch.astype(np.float64))
+    return kmeans.cluster_centers_
+
+def _quantize_histogram(rgb_pixels, n_colors):
+    """Weighted KMeans on the occupied bins of a 3D colour histogram"""
+    colours, weights = colour_histogram(rgb_pixels)
+    n_colors = min(n_colors, len(colours))
+    kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
+    kmeans.fit(colours, sample_weight=weights)
+    return kmeans.cluster_centers_
+
+def _quantize_median_cut(rgb_pixels, n_colors):
+    """Median-cut quantization on the occupied bins of a 3D colour histogram"""
+    colours, weights = colour_histogram(rgb_pixels)
+    boxes = [np.arange(len(colours))]
+
+    while len(boxes) < n_colors:
+        # Split the box with the widest channel range at its weighted median
+        ranges = [np.ptp(colours[box], axis=0).max() if len(box) > 1 else -1 for box in boxes]
+        widest = int(np.argmax(ranges))
+        if ranges[widest] <= 0:
+            break
+        box = boxes.pop(widest)
+        channel = int(np.argmax(np.ptp(colours[box], axis=0)))
+        order = box[np.argsort(colours[box, channel], kind='stable')]
+        cumulative = np.cumsum(weights[order])
+        split = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        split = min(max(split, 1), len(order) - 1)
+        boxes.extend([order[:split], order[split:]])
+
+    return np.array([np.average(colours[box], axis=0, weights=weights[box]) for box in boxes])
+
+QUANTIZERS = {
+    "exact": _quantize_exact,
+    "subsample": _quantize_subsample,
+    "minibatch": _quantize_minibatch,
+    "histogram": _quantize_histogram,
+    "median_cut": _quantize_median_cut,
+}
+
+def quantize_colors(rgb_pixels, n_colors=5, mode=DEFAULT_MODE):
+    """
+    Find up to n_colors dominant colors of an (N, 3) RGB pixel array.
+    'mode' selects one of QUANTIZERS; returns an array of RGB cluster centers.
+    """
+    if mode not in QUANTIZERS:
+        raise ValueError(f"Unknown color quantizer '{mode}'. Available: {sorted(QUANTIZERS)}")
+    return np.asarray(QUANTIZERS[mode](np.asarray(rgb_pixels).reshape(-1, 3), n_colors))
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class DiagnosisCache:
+    """
+    Content-addressed cache of disease diagnoses.
+    Entries are keyed on a hash of the decoded image bytes inside a namespace
+    that encodes the analyzer version and thresholds, so changing either makes
+    old entries unreachable. A bounded in-process LRU tier sits in front of an
+    optional SQLite tier that survives restarts.
+
+    Entries are kept as JSON text, so every hit is a fresh copy. The SQLite
+    file may be shared by several server processes: it runs in WAL mode with
+    a busy timeout, disk errors (a locked or full database) are counted and
+    treated as misses, and entries of other namespaces are only deleted once
+    older than stale_namespace_seconds, so a process on another version does
+    not wipe the entries it is still using.
+    """
+
+    def __init__(self, max_entries=256, disk_path=None, namespace="", busy_timeout=5.0,
+                 stale_namespace_seconds=86400):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.stale_namespace_seconds = stale_namespace_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.namespace = None
+        self.last_error = None
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "disk_errors": 0,
+            "unserializable": 0,
+        }
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, timeout=busy_timeout, check_same_thread=False)
+            try:
+                self._db.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.Error:
+                # e.g. on file systems without shared memory; the default journal still works
+                pass
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS diagnoses ("
+                "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, diagnosis TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+        self.set_namespace(namespace)
+
+    @classmethod
+    def from_config(cls, config, namespace=""):
+        """Build a cache from the 'cache' block of the disease_predictor config"""
+        return cls(
+            max_entries=config.get("max_entries", 256),
+            disk_path=config.get("disk_path"),
+            namespace=namespace,
+            busy_timeout=config.get("busy_timeout_seconds", 5.0),
+            stale_namespace_seconds=config.get("stale_namespace_seconds", 86400),
+        )
+
+    @staticmethod
+    def image_key(image_bytes):
+        """Content hash of the decoded image bytes"""
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def set_namespace(self, namespace):
+        """
+        Switch to a new analyzer version / threshold namespace.
+        The memory tier is dropped; on disk, entries of other namespaces
+        older than stale_namespace_seconds are deleted.
+        """
+        with self._lock:
+            if namespace == self.namespace:
+                return
+            self.namespace = namespace
+            self.stats["invalidations"] += len(self._memory)
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    cursor = self._db.execute(
+                        "DELETE FROM diagnoses WHERE namespace != ? AND created < ?",
+                        (namespace, time.time() - self.stale_namespace_seconds),
+                    )
+                    self.stats["invalidations"] += cursor.rowcount
+                    self._db.commit()
+                except (sqlite3.Error, OSError) as e:
+                    self._disk_error(e)
+
+    def get(self, image_key):
+        """Return a copy of the cached diagnosis for an image, or None"""
+        key = f"{self.namespace}:{image_key}"
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return json.loads(self._memory[key])
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT diagnosis FROM diagnoses WHERE key = ?", (key,)).fetchone()
+                except (sqlite3.Error, OSError) as e:
+                    self._disk_error(e)
+                    row = None
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.stats["disk_hits"] += 1
+                    return json.loads(row[0])
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, image_key, diagnosis):
+        """
+        Store a diagnosis in both tiers. Caching is best-effort: a failed disk
+        write or a diagnosis that is not JSON-serializable is counted, not raised.
+        """
+        key = f"{self.namespace}:{image_key}"
+        try:
+            text = json.dumps(diagnosis)
+        except (TypeError, ValueError) as e:
+            with self._lock:
+                self.stats["unserializable"] += 1
+                self.last_error = str(e)
+            return
+        with self._lock:
+            self._remember(key, text)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO diagnoses (key, namespace, diagnosis, created) VALUES (?, ?, ?, ?)",
+                        (key, self.namespace, text, time.time()),
+                    )
+                    self._db.commit()
+                except (sqlite3.Error, OSError) as e:
+                    self._disk_error(e)
+
+    def _disk_error(self, error):
+        self.stats["disk_errors"] += 1
+        self.last_error = str(error)
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM diagnoses")
+                    self._db.commit()
+                except (sqlite3.Error, OSError) as e:
+                    self._disk_error(e)
+
+    def get_stats(self):
+        """Hit/miss/eviction counters and tier sizes, for the server's health output"""
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            stats["max_entries"] = self.max_entries
+            stats["disk_entries"] = None
+            if self._db is not None:
+                try:
+                    stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM diagnoses").fetchone()[0]
+                except (sqlite3.Error, OSError) as e:
+                    self._disk_error(e)
+            stats["namespace"] = self.namespace
+            if self.last_error:
+                stats["last_error"] = self.last_error
+            return stats
+
+def cache_namespace(analyzer_version, **settings):
+    """Namespace string for a given analyzer version and its result-affecting settings"""
+    payload = json.dumps({"analyzer_version": analyzer_version, **settings}, sort_keys=True)
+    return f"v{analyzer_version}-{hashlib.sha1(payload.encode()).hexdigest()[:12]}"
@@ -134,13 +134,75 @@
 
 
 import numpy as np
-from PIL import Image, ImageStat
+from PIL import Image
 import base64
 import io
 import cv2
-from sklearn.cluster import KMeans
 from scipy import stats
 from langchain.tools import tool
+from models.color_quantizer import quantize_colors, count_unique_colors, DEFAULT_MODE as DEFAULT_COLOR_QUANTIZER
+from models.diagnosis_cache import DiagnosisCache, cache_namespace
+from models.histogram_stats import HistogramStats, batch_channel_histograms, batch_image_stat
+from models.image_context import ImageContext, as_image_context
+from models.lesion_engine import lesion_features
+from models.quality_gate import QualityGate, rejection_diagnosis
+from models.resolution_policy import ResolutionPolicy
+from models.stage_profiler import NULL_PROFILER, StageHistograms, StageProfiler
+from tools.config_loader import get_tool_config
+
+PREDICTOR_CONFIG = get_tool_config("disease_predictor")
+
+# Bump whenever a change to the analyzers alters their results
+ANALYZER_VERSION = "1.3"
+
+# Color quantizer used for dominant colors, selectable in config.json
+COLOR_QUANTIZER = PREDICTOR_CONFIG.get("color_quantizer", DEFAULT_COLOR_QUANTIZER)
+
+# Feature thresholds used by generate_diagnosis
+DIAGNOSIS_THRESHOLDS = {
+    'discoloration': 0.3,
+    'texture_roughness': 500,
+    'spot_count': 10,
+    'anomaly_score': 0.1,
+    'brightness_mean': 100,
+}
+
+# Rules applied by generate_diagnosis, in order: (feature, comparison, penalty,
+# indicator, recommendation). A rule fires when the feature compares against
+# its DIAGNOSIS_THRESHOLDS entry; indicators are formatted with the value.
+DIAGNOSIS_RULES = [
+    ('discoloration', '>', 20, "Significant discoloration detected ({value:.1%})",
+     "Monitor for nutrient deficiencies or fungal infections"),
+    ('texture_roughness', '>', 15, "Abnormal leaf texture detected",
+     "Check for pest damage or disease lesions"),
+    ('spot_count', '>', 25, "Multiple spots/lesions found ({value} detected)",
+     "Apply appropriate fungicides and remove affected leaves"),
+    ('anomaly_score', '>', 10, "Tissue damage indicators present",
+     "Improve growing conditions and air circulation"),
+    ('brightness_mean', '<', 10, "Low leaf brightness indicating possible stress",
+     "Check watering schedule and light conditions"),
+]
+
+# Health score cut-offs between the diagnosis grades
+HEALTH_GRADE_BOUNDARIES = (80, 60, 40)
+
+# Working resolution for uploaded images, configurable in config.json
+RESOLUTION_POLICY = ResolutionPolicy.from_config(PREDICTOR_CONFIG.get("resolution", {}))
+
+# Diagnoses of previously seen images, keyed on the image content
+_cache_config = PREDICTOR_CONFIG.get("cache", {})
+DIAGNOSIS_CACHE = DiagnosisCache.from_config(_cache_config) if _cache_config.get("enabled", True) else None
+
+# Opt-in per-stage profiling; finished profiles feed the in-process histograms
+PROFILING_CONFIG = PREDICTOR_CONFIG.get("profiling", {})
+STAGE_HISTOGRAMS = StageHistograms()
+
+# Rejects blurry, badly exposed, tiny or leafless photos before analysis
+_quality_config = PREDICTOR_CONFIG.get("quality_gate", {})
+QUALITY_GATE = QualityGate.from_config(_quality_config) if _quality_config.get("enabled", True) else None
+
+# Index of past cases for similarity search; attached with set_case_index()
+CASE_INDEX = None
 
 @tool
 def analyze_plant_image(image_data: str) -> dict:
@@ -156,91 +218,417 @@ def analyze_plant_image(image_data: str) -> dict:
             "recommendations": "Invalid image data provided. Please upload a valid image."
         }
 
+    profiler = new_profiler()
+    with profiler.stage('decode'):
+        image_bytes, error = decode_base64_image(image_data)
+    if error:
+        return finish_profile(profiler, error)
+    return analyze_plant_image_bytes(image_bytes, profiler)
+
+def analyze_plant_image_bytes(image_bytes, profiler=None) -> dict:
+    """
+    Diagnose an encoded image held as bytes, bytearray or memoryview.
+    Callers that already have the file contents skip the base64 round-trip.
+    'profiler' records per-stage timings (defaults to new_profiler()).
+    Returns a dictionary with 'disease' and 'recommendations' keys.
+    """
+    profiler = profiler or new_profiler()
     try:
-        # Handle different base64 formats
-        if image_data.startswith('data:image/'):
-            image_data = image_data.split(',')[1]
+        # Resubmitted photos are answered from the cache
+        image_key = DiagnosisCache.image_key(image_bytes)
+        cached = get_cached_diagnosis(image_key)
+        if cached is not None:
+            return finish_profile(profiler, cached)
         
-        # Decode base64 image
-        try:
-            image_bytes = base64.b64decode(image_data)
-        except Exception as e:
-            return {
-                "disease": "Error",
-                "recommendations": f"Invalid base64 image data: {str(e)}"
-            }
+        with profiler.stage('decode'):
+            decoded, error = open_for_analysis(image_bytes)
+        if error:
+            return finish_profile(profiler, error)
+        context, source_size = decoded
+        profiler.set_resolution('decode', context.shape)
         
-        # Open and process image
+        # Unusable photos are turned away before the expensive analyzers run
+        with profiler.stage('quality', context.shape):
+            rejection = check_image_quality(context, source_size)
+        if rejection:
+            return finish_profile(profiler, rejection)
+
+        # Dynamic analysis and diagnosis at the policy's working resolution
+        diagnosis = diagnose_with_resolution_policy(image_bytes, context, source_size, profiler=profiler,
+                                                    image_key=image_key)
+        store_cached_diagnosis(image_key, diagnosis)
+        
+        return finish_profile(profiler, diagnosis)
+
+    except Exception as e:
+        profiler.finish()
+        return {
+            "disease": "Analysis Error",
+            "recommendations": f"Error during image analysis: {str(e)}"
+        }
+
+def analyze_plant_images_batch(images_data: list) -> list:
+    """
+    Analyze a batch of plant leaf images (base64 strings or raw bytes) in one call.
+    Same-size images are stacked so pixel-wise features are computed across the
+    whole stack at once. Returns one diagnosis dict per input image, in input order;
+    an image that fails to decode gets its own error dict without affecting the rest.
+    """
+    diagnoses = [None] * len(images_data)
+    groups = {}
+    
+    for index, image_data in enumerate(images_data):
         try:
-            pil_image = Image.open(io.BytesIO(image_bytes))
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
-            
-            # Convert to OpenCV format
-            cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            
+            image_bytes, error = image_input_bytes(image_data)
+            if error:
+                diagnoses[index] = error
+                continue
+            image_key = DiagnosisCache.image_key(image_bytes)
+            cached = get_cached_diagnosis(image_key)
+            if cached is not None:
+                diagnoses[index] = cached
+                continue
+            decoded, error = open_for_analysis(image_bytes)
+            if error:
+                diagnoses[index] = error
+                continue
+            rejection = check_image_quality(*decoded)
+            if rejection:
+                diagnoses[index] = rejection
+                continue
         except Exception as e:
-            return {
-                "disease": "Error",
-                "recommendations": f"Unable to process the uploaded image: {str(e)}"
+            # Whatever goes wrong with one image is that image's error
+            diagnoses[index] = {
+                "disease": "Analysis Error",
+                "recommendations": f"Error during image analysis: {str(e)}"
             }
+            continue
+        groups.setdefault(decoded[0].shape, []).append((index, image_key, image_bytes, decoded))
+    
+    for members in groups.values():
+        try:
+            rgb_batch = np.stack([context.rgb for _, _, _, (context, _) in members])
+            batch_results = perform_batch_analysis(rgb_batch)
+        except Exception:
+            # Fall back to one-by-one analysis so a single bad image only fails itself
+            batch_results = [None] * len(members)
+        
+        for (index, image_key, image_bytes, (context, source_size)), analysis_results in zip(members, batch_results):
+            try:
+                diagnoses[index] = diagnose_with_resolution_policy(image_bytes, context, source_size, analysis_results,
+                                                                   image_key=image_key)
+                store_cached_diagnosis(image_key, diagnoses[index])
+            except Exception as e:
+                diagnoses[index] = {
+                    "disease": "Analysis Error",
+                    "recommendations": f"Error during image analysis: {str(e)}"
+                }
+    
+    return diagnoses
+
+def decode_image_data(image_data):
+    """
+    Decode a base64 image string into PIL (RGB) and OpenCV (BGR) images.
+    Returns ((pil_image, cv_image), None) on success or (None, error_dict) on failure.
+    """
+    image_bytes, error = decode_base64_image(image_data)
+    if error:
+        return None, error
+    return open_image_bytes(image_bytes)
+
+def image_input_bytes(image_data):
+    """
+    Accept raw image bytes (bytes, bytearray, memoryview) or a base64 string.
+    Returns (image_bytes, None) on success or (None, error_dict) on failure.
+    """
+    if isinstance(image_data, (bytes, bytearray, memoryview)):
+        return image_data, None
+    if isinstance(image_data, str):
+        return decode_base64_image(image_data)
+    return None, {
+        "disease": "Error",
+        "recommendations": "Invalid image data provided. Please upload a valid image."
+    }
+
+def decode_base64_image(image_data):
+    """
+    Decode a (optionally data-URL prefixed) base64 string into raw image bytes.
+    Returns (image_bytes, None) on success or (None, error_dict) on failure.
+    """
+    try:
+        # Handle different base64 formats
+        if image_data.startswith('data:image/'):
+            _, comma, image_data = image_data.partition(',')
+            if not comma:
+                raise ValueError("data URL has no image data after the header")
 
-        # Dynamic analysis starts here
-        analysis_results = perform_dynamic_analysis(pil_image, cv_image)
+        # Decode base64 image
+        return base64.b64decode(image_data), None
+    except Exception as e:
+        return None, {
+            "disease": "Error",
+            "recommendations": f"Invalid base64 image data: {str(e)}"
+        }
+
+def open_image_bytes(image_bytes):
+    """
+    Open encoded image bytes as PIL (RGB) and OpenCV (BGR) images.
+    Returns ((pil_image, cv_image), None) on success or (None, error_dict) on failure.
+    """
+    try:
+        pil_image = Image.open(io.BytesIO(image_bytes))
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
         
-        # Generate diagnosis based on analysis
-        diagnosis = generate_diagnosis(analysis_results)
+        # Convert to OpenCV format
+        cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
         
-        return diagnosis
+    except Exception as e:
+        return None, {
+            "disease": "Error",
+            "recommendations": f"Unable to process the uploaded image: {str(e)}"
+        }
+    
+    return (pil_image, cv_image), None
 
+def open_for_analysis(image_bytes):
+    """
+    Decode image bytes at the working resolution of RESOLUTION_POLICY into a
+    single BGR buffer wrapped in an ImageContext.
+    Returns ((context, source_size), None) on success or (None, error_dict) on failure.
+    """
+    try:
+        return RESOLUTION_POLICY.open(image_bytes), None
     except Exception as e:
-        return {
-            "disease": "Analysis Error",
-            "recommendations": f"Error during image analysis: {str(e)}"
+        return None, {
+            "disease": "Error",
+            "recommendations": f"Unable to process the uploaded image: {str(e)}"
         }
 
-def perform_dynamic_analysis(pil_image, cv_image):
-    """Perform comprehensive dynamic analysis of the plant image"""
+def check_image_quality(context, source_size):
+    """Rejection diagnosis if QUALITY_GATE turns the image away, else None"""
+    if QUALITY_GATE is None:
+        return None
+    report = QUALITY_GATE.check(context.bgr, source_size)
+    return None if report['passed'] else rejection_diagnosis(report)
+
+def analyze_with_resolution_policy(image_bytes, context, source_size, analysis_results=None, profiler=NULL_PROFILER):
+    """
+    Analyze an image opened by open_for_analysis.
+    In coarse-to-fine mode a reduced-resolution result that lies near a decision
+    threshold is re-analyzed at full resolution.
+    Returns (analysis_results, resolution) where resolution reports the
+    resolution that was actually analyzed.
+    """
+    if analysis_results is None:
+        analysis_results = perform_dynamic_analysis(context, profiler=profiler)
+    
+    height, width = context.shape
+    escalated = False
+    if (RESOLUTION_POLICY.can_escalate(source_size, (width, height))
+            and near_decision_boundary(analysis_results, RESOLUTION_POLICY.decision_margin)):
+        with profiler.stage('decode', source_size[::-1]):
+            context, _ = RESOLUTION_POLICY.open(image_bytes, full_resolution=True)
+        analysis_results = perform_dynamic_analysis(context, profiler=profiler)
+        height, width = context.shape
+        escalated = True
+    
+    return analysis_results, RESOLUTION_POLICY.describe(source_size, (width, height), escalated)
+
+def diagnose_with_resolution_policy(image_bytes, context, source_size, analysis_results=None, profiler=NULL_PROFILER,
+                                    image_key=None):
+    """
+    Diagnose an image opened by open_for_analysis (see analyze_with_resolution_policy).
+    With an image_key the case is also added to CASE_INDEX.
+    """
+    analysis_results, resolution = analyze_with_resolution_policy(
+        image_bytes, context, source_size, analysis_results, profiler
+    )
+    with profiler.stage('diagnosis'):
+        diagnosis = generate_diagnosis(analysis_results)
+    diagnosis['resolution'] = resolution
+    if image_key is not None:
+        record_case(image_key, analysis_results, diagnosis)
+    return diagnosis
+
+def set_case_index(index):
+    """Attach a models.similarity_index.CaseIndex (or None) that records every diagnosed image"""
+    global CASE_INDEX
+    CASE_INDEX = index
+
+def record_case(image_key, analysis_results, diagnosis):
+    if CASE_INDEX is None:
+        return
+    try:
+        CASE_INDEX.add_analysis(image_key, analysis_results, diagnosis)
+    except Exception:
+        # The index is best-effort; a full disk or a bad record must not fail the diagnosis
+        pass
+
+def new_profiler(enabled=None):
+    """
+    A StageProfiler if profiling is enabled (argument, or tools.disease_predictor.profiling
+    in config.json), otherwise the no-op NULL_PROFILER.
+    """
+    if enabled is None:
+        enabled = PROFILING_CONFIG.get("enabled", False)
+    if not enabled:
+        return NULL_PROFILER
+    return StageProfiler(track_memory=PROFILING_CONFIG.get("track_memory", True))
+
+def finish_profile(profiler, diagnosis):
+    """Record a finished profile in STAGE_HISTOGRAMS and attach it to the result if configured"""
+    if not profiler.enabled:
+        return diagnosis
+    report = profiler.finish()
+    STAGE_HISTOGRAMS.observe(report)
+    if PROFILING_CONFIG.get("include_in_result", True):
+        diagnosis = {**diagnosis, 'profile': report}
+    return diagnosis
+
+def get_profile_stats():
+    """Stage timing histograms for the server's health output"""
+    return {"enabled": PROFILING_CONFIG.get("enabled", False), "stages": STAGE_HISTOGRAMS.snapshot()}
+
+def diagnosis_cache_namespace():
+    """Cache namespace for the current analyzer version, quantizer, thresholds and resolution"""
+    return cache_namespace(ANALYZER_VERSION, color_quantizer=COLOR_QUANTIZER, thresholds=DIAGNOSIS_THRESHOLDS,
+                           resolution=RESOLUTION_POLICY.settings())
+
+def get_cached_diagnosis(image_key):
+    """Look up a cached diagnosis, dropping entries made under other settings"""
+    if DIAGNOSIS_CACHE is None:
+        return None
+    DIAGNOSIS_CACHE.set_namespace(diagnosis_cache_namespace())
+    return DIAGNOSIS_CACHE.get(image_key)
+
+def store_cached_diagnosis(image_key, diagnosis):
+    """Cache a diagnosis; best-effort, as put() counts storage failures instead of raising"""
+    if DIAGNOSIS_CACHE is not None:
+        DIAGNOSIS_CACHE.set_namespace(diagnosis_cache_namespace())
+        DIAGNOSIS_CACHE.put(image_key, diagnosis)
+
+def get_cache_stats():
+    """Diagnosis cache counters for the server's health output"""
+    if DIAGNOSIS_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **DIAGNOSIS_CACHE.get_stats()}
+
+def perform_dynamic_analysis(image, cv_image=None, profiler=NULL_PROFILER):
+    """
+    Perform comprehensive dynamic analysis of the plant image.
+    'image' is an ImageContext or a PIL image (optionally with its OpenCV BGR copy);
+    every analyzer shares the same context so derived planes are computed once.
+    Each analyzer runs as a stage of 'profiler'.
+    """
+    if isinstance(image, ImageContext):
+        context = image
+    else:
+        context = ImageContext(pil_image=image, bgr=cv_image)
+    
     results = {}
+    resolution = context.shape
     
     # 1. Color distribution analysis
-    results['colors'] = analyze_color_distribution(pil_image)
+    with profiler.stage('colors', resolution):
+        results['colors'] = analyze_color_distribution(context)
     
     # 2. Texture analysis
-    results['texture'] = analyze_texture_patterns(cv_image)
+    with profiler.stage('texture', resolution):
+        results['texture'] = analyze_texture_patterns(context)
     
     # 3. Shape and contour analysis
-    results['shapes'] = analyze_shapes_and_contours(cv_image)
+    with profiler.stage('shapes', resolution):
+        results['shapes'] = analyze_shapes_and_contours(context)
     
     # 4. Statistical analysis
-    results['stats'] = analyze_image_statistics(pil_image)
+    with profiler.stage('stats', resolution):
+        results['stats'] = analyze_image_statistics(context)
     
     # 5. Spot and lesion detection
-    results['anomalies'] = detect_anomalies(cv_image)
+    with profiler.stage('anomalies', resolution):
+        results['anomalies'] = detect_anomalies(context)
     
     return results
 
-def analyze_color_distribution(image):
-    """Analyze color distribution to detect discoloration patterns"""
-    hsv_image = image.convert('HSV')
-    pixels = np.array(hsv_image)
+def perform_batch_analysis(rgb_batch):
+    """
+    Perform the dynamic analysis on a stack of same-size RGB images (N, H, W, 3).
+    The pixel-wise HSV and gray conversions run once over the whole stack, and
+    the colour, channel and percentile statistics come from the stack's
+    (N, C, 256) histograms; neighbourhood filters and clustering run per image.
+    Returns one results dict per image, shaped like perform_dynamic_analysis.
+    """
+    n_images, height, width, _ = rgb_batch.shape
     
-    hue_values = pixels[:, :, 0].flatten()
-    sat_values = pixels[:, :, 1].flatten()
-    val_values = pixels[:, :, 2].flatten()
+    # Pixel-wise conversions on the stack viewed as one tall image
+    tall_rgb = np.ascontiguousarray(rgb_batch).reshape(n_images * height, width, 3)
+    hsv_batch = np.array(Image.fromarray(tall_rgb).convert('HSV')).reshape(n_images, height, width, 3)
+    gray_batch = cv2.cvtColor(tall_rgb, cv2.COLOR_RGB2GRAY).reshape(n_images, height, width)
     
-    rgb_pixels = np.array(image).reshape(-1, 3)
+    # Per-image contexts start with the planes already computed for the stack
+    contexts = [
+        ImageContext(rgb=tall_rgb[i * height:(i + 1) * height],
+                     planes={'gray': gray_batch[i], 'hsv': hsv_batch[i]})
+        for i in range(n_images)
+    ]
     
-    # Fix: Better way to count unique colors
-    unique_pixels = np.unique(rgb_pixels.view(np.dtype((np.void, rgb_pixels.dtype.itemsize*3))))
-    n_colors = min(5, len(unique_pixels))
+    # 1. Color distribution analysis
+    colors = batch_color_distribution(contexts, batch_channel_histograms(hsv_batch))
+    
+    # 2 & 3. Texture and shape analysis are neighbourhood operations
+    textures = [analyze_texture_patterns(context) for context in contexts]
+    shapes = [analyze_shapes_and_contours(context) for context in contexts]
+    
+    # 4. Statistical analysis
+    image_stats = batch_image_statistics(batch_channel_histograms(tall_rgb.reshape(n_images, height, width, 3)))
+    
+    # 5. Spot and lesion detection
+    anomalies = batch_detect_anomalies(contexts, batch_channel_histograms(gray_batch))
+    
+    return [
+        {
+            'colors': colors[i],
+            'texture': textures[i],
+            'shapes': shapes[i],
+            'stats': image_stats[i],
+            'anomalies': anomalies[i]
+        }
+        for i in range(n_images)
+    ]
+
+def analyze_color_distribution(image, quantizer=None):
+    """Analyze color distribution to detect discoloration patterns"""
+    context = as_image_context(image)
+    return color_distribution_features(context, context.histogram('hsv'), quantizer)
+
+def batch_color_distribution(contexts, hsv_counts):
+    """Color distribution features for a stack of images from its HSV histograms (N, 3, 256)"""
+    return [color_distribution_features(context, HistogramStats(counts))
+            for context, counts in zip(contexts, hsv_counts)]
+
+def color_distribution_features(context, hsv_stats, quantizer=None):
+    rgb_pixels = context.rgb.reshape(-1, 3)
+    
+    return {
+        **dominant_color_features(rgb_pixels, quantizer),
+        'hue_variance': float(hsv_stats.var(0)),
+        'saturation_mean': float(hsv_stats.mean(1)),
+        'brightness_mean': float(hsv_stats.mean(2))
+    }
+
+def dominant_color_features(rgb_pixels, quantizer=None):
+    """
+    Cluster RGB pixels into dominant colors and score green dominance / discoloration.
+    'quantizer' picks a mode from models.color_quantizer (defaults to COLOR_QUANTIZER).
+    """
+    # Only need to know whether there are at least 5 distinct colors
+    n_colors = count_unique_colors(rgb_pixels, limit=5)
     
     if n_colors > 1:
-        kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
-        kmeans.fit(rgb_pixels)
-        dominant_colors = kmeans.cluster_centers_
+        dominant_colors = quantize_colors(rgb_pixels, n_colors, mode=quantizer or COLOR_QUANTIZER)
     else:
-        dominant_colors = [np.mean(rgb_pixels, axis=0)]
+        dominant_colors = np.array([np.mean(rgb_pixels, axis=0)])
     
     green_dominance = np.mean([color[1] for color in dominant_colors]) / 255
     brown_yellow_presence = sum(1 for color in dominant_colors 
@@ -249,21 +637,19 @@ def analyze_color_distribution(image):
     return {
         'dominant_colors': dominant_colors.tolist(),
         'green_dominance': float(green_dominance),
-        'discoloration_index': float(brown_yellow_presence),
-        'hue_variance': float(np.var(hue_values)),
-        'saturation_mean': float(np.mean(sat_values)),
-        'brightness_mean': float(np.mean(val_values))
+        'discoloration_index': float(brown_yellow_presence)
     }
 
-def analyze_texture_patterns(cv_image):
+def analyze_texture_patterns(image):
     """Analyze texture to detect disease patterns"""
-    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+    context = as_image_context(image)
+    gray = context.gray
     
     # Calculate texture measures
     variance = cv2.Laplacian(gray, cv2.CV_64F).var()
     
     # Edge density
-    edges = cv2.Canny(gray, 50, 150)
+    edges = context.canny(50, 150)
     edge_density = np.sum(edges > 0) / edges.size
     
     # Local binary pattern approximation
@@ -278,46 +664,47 @@ def analyze_texture_patterns(cv_image):
         'roughness_index': float(variance * edge_density)
     }
 
-def analyze_shapes_and_contours(cv_image):
+def analyze_shapes_and_contours(image):
     """Analyze shapes to detect lesions, spots, and abnormal structures"""
-    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-    _, thresholded = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    contours, _ = cv2.findContours(thresholded, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    areas = [cv2.contourArea(c) for c in contours if cv2.contourArea(c) > 10]
-    perimeters = [cv2.arcLength(c, True) for c in contours if cv2.contourArea(c) > 10]
-    
-    circularities = []
-    for i, contour in enumerate(contours):
-        if len(areas) > i and areas[i] > 10:
-            circularity = 4 * np.pi * areas[i] / (perimeters[i] ** 2) if perimeters[i] > 0 else 0
-            circularities.append(circularity)
+    context = as_image_context(image)
     
-    return {
-        'spot_count': len(areas),
-        'avg_spot_size': float(np.mean(areas)) if areas else 0,
-        'shape_irregularity': float(1 - np.mean(circularities)) if circularities else 0,
-        'size_variance': float(np.var(areas)) if len(areas) > 1 else 0
-    }
+    # Connected components of the Otsu mask, one record per lesion
+    return lesion_features(context.get('lesions'))
 
 def analyze_image_statistics(image):
     """Perform statistical analysis of image properties"""
-    stat = ImageStat.Stat(image)
+    return image_statistics_features(as_image_context(image).histogram('rgb').image_stat())
+
+def batch_image_statistics(rgb_counts):
+    """Per-image channel statistics for a stack of images from its RGB histograms (N, 3, 256)"""
+    return [image_statistics_features(stat) for stat in batch_image_stat(rgb_counts)]
+
+def image_statistics_features(stat):
+    mean = stat['mean']
     
     return {
-        'mean_rgb': stat.mean,
-        'std_rgb': stat.stddev,
-        'extrema': stat.extrema,
-        'brightness_uniformity': float(np.std(stat.mean)),
-        'color_balance': float(max(stat.mean) - min(stat.mean))
+        'mean_rgb': mean,
+        'std_rgb': stat['stddev'],
+        'extrema': stat['extrema'],
+        'brightness_uniformity': float(np.std(mean)),
+        'color_balance': float(max(mean) - min(mean))
     }
 
-def detect_anomalies(cv_image):
+def detect_anomalies(image):
     """Detect anomalous regions that might indicate disease"""
-    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+    context = as_image_context(image)
+    return anomaly_features(context, context.histogram('gray'))
+
+def batch_detect_anomalies(contexts, gray_counts):
+    """Anomaly features for a stack of images from its gray histograms (N, 1, 256)"""
+    return [anomaly_features(context, HistogramStats(counts)) for context, counts in zip(contexts, gray_counts)]
+
+def anomaly_features(context, gray_stats):
+    low = gray_stats.percentile(20)
+    high = gray_stats.percentile(80)
     
     # Fix: Check if image has sufficient contrast
-    if np.percentile(gray, 20) == np.percentile(gray, 80):
+    if low == high:
         return {
             'dark_lesion_ratio': 0.0,
             'bright_discoloration_ratio': 0.0,
@@ -325,13 +712,12 @@ def detect_anomalies(cv_image):
             'anomaly_score': 0.0
         }
     
-    _, dark_spots = cv2.threshold(gray, np.percentile(gray, 20), 255, cv2.THRESH_BINARY_INV)
-    dark_spot_ratio = np.sum(dark_spots > 0) / dark_spots.size
-    
-    _, bright_spots = cv2.threshold(gray, np.percentile(gray, 80), 255, cv2.THRESH_BINARY)
-    bright_spot_ratio = np.sum(bright_spots > 0) / bright_spots.size
+    # cv2.threshold on 8-bit data compares against floor(threshold), so the
+    # thresholded pixel counts can be read straight off the histogram
+    dark_spot_ratio = gray_stats.count_at_most(np.floor(low)) / gray_stats.count
+    bright_spot_ratio = (gray_stats.count - gray_stats.count_at_most(np.floor(high))) / gray_stats.count
     
-    edges = cv2.Canny(gray, 30, 100)
+    edges = context.canny(30, 100)
     edge_intensity = np.sum(edges > 0) / edges.size
     
     return {
@@ -341,63 +727,93 @@ def detect_anomalies(cv_image):
         'anomaly_score': float(dark_spot_ratio + bright_spot_ratio + edge_intensity)
     }
 
-def generate_diagnosis(analysis_results):
-    """Generate dynamic diagnosis based on analysis results"""
+def diagnosis_features(analysis_results):
+    """The analysis values generate_diagnosis decides on"""
     # Fix: Use .get() with default values to handle missing keys
     colors = analysis_results.get('colors', {})
     texture = analysis_results.get('texture', {})
     shapes = analysis_results.get('shapes', {})
     anomalies = analysis_results.get('anomalies', {})
     
-    green_dominance = colors.get('green_dominance', 0.5)
-    discoloration = colors.get('discoloration_index', 0)
-    texture_roughness = texture.get('roughness_index', 0)
-    spot_count = shapes.get('spot_count', 0)
-    anomaly_score = anomalies.get('anomaly_score', 0)
-    brightness_mean = colors.get('brightness_mean', 128)
-    
-    health_score = green_dominance * 100
-    disease_indicators = []
-    recommendations = []
-    
-    if discoloration > 0.3:
-        disease_indicators.append(f"Significant discoloration detected ({discoloration:.1%})")
-        recommendations.append("Monitor for nutrient deficiencies or fungal infections")
-        health_score -= 20
+    return {
+        'green_dominance': colors.get('green_dominance', 0.5),
+        'discoloration': colors.get('discoloration_index', 0),
+        'texture_roughness': texture.get('roughness_index', 0),
+        'spot_count': shapes.get('spot_count', 0),
+        'anomaly_score': anomalies.get('anomaly_score', 0),
+        'brightness_mean': colors.get('brightness_mean', 128),
+    }
+
+def near_decision_boundary(analysis_results, margin, thresholds=None):
+    """
+    True if any diagnosis feature, or the green-dominance base of the health
+    score, lies within 'margin' (relative) of a threshold it is compared against.
+    """
+    limits = {**DIAGNOSIS_THRESHOLDS, **(thresholds or {})}
+    features = diagnosis_features(analysis_results)
     
-    if texture_roughness > 500:
-        disease_indicators.append("Abnormal leaf texture detected")
-        recommendations.append("Check for pest damage or disease lesions")
-        health_score -= 15
+    for name, limit in limits.items():
+        if abs(features[name] - limit) <= margin * abs(limit):
+            return True
     
-    if spot_count > 10:
-        disease_indicators.append(f"Multiple spots/lesions found ({spot_count} detected)")
-        recommendations.append("Apply appropriate fungicides and remove affected leaves")
-        health_score -= 25
+    base_score = features['green_dominance'] * 100
+    return any(abs(base_score - boundary) <= margin * boundary for boundary in HEALTH_GRADE_BOUNDARIES)
+
+def score_diagnosis(analysis_results, thresholds=None):
+    """
+    Apply the diagnosis rules to analysis results.
+    Returns (health_score, disease_indicators, recommendations).
+    """
+    limits = {**DIAGNOSIS_THRESHOLDS, **(thresholds or {})}
+    features = diagnosis_features(analysis_results)
     
-    if anomaly_score > 0.1:
-        disease_indicators.append("Tissue damage indicators present")
-        recommendations.append("Improve growing conditions and air circulation")
-        health_score -= 10
+    health_score = features['green_dominance'] * 100
+    disease_indicators = []
+    recommendations = []
     
-    if brightness_mean < 100:
-        disease_indicators.append("Low leaf brightness indicating possible stress")
-        recommendations.append("Check watering schedule and light conditions")
-        health_score -= 10
+    for name, comparison, penalty, indicator, recommendation in DIAGNOSIS_RULES:
+        value = features[name]
+        fired = value > limits[name] if comparison == '>' else value < limits[name]
+        if fired:
+            disease_indicators.append(indicator.format(value=value))
+            recommendations.append(recommendation)
+            health_score -= penalty
+    
+    return health_score, disease_indicators, recommendations
+
+def diagnosis_grade(health_score):
+    """Grade label for a health score"""
+    healthy, minor, moderate = HEALTH_GRADE_BOUNDARIES
+    if health_score >= healthy:
+        return "Plant Appears Healthy"
+    if health_score >= minor:
+        return "Minor Health Issues Detected"
+    if health_score >= moderate:
+        return "Moderate Disease Symptoms"
+    return "Severe Disease Indicators"
+
+def generate_diagnosis(analysis_results, thresholds=None):
+    """
+    Generate dynamic diagnosis based on analysis results.
+    'thresholds' overrides entries of DIAGNOSIS_THRESHOLDS.
+    """
+    return format_diagnosis(*score_diagnosis(analysis_results, thresholds))
+
+def format_diagnosis(health_score, disease_indicators, recommendations):
+    """Build the diagnosis dict from a health score and the rules that fired"""
+    recommendations = list(recommendations)
     
     # Generate final diagnosis
-    if health_score >= 80:
-        disease = "Plant Appears Healthy"
+    healthy, minor, moderate = HEALTH_GRADE_BOUNDARIES
+    disease = diagnosis_grade(health_score)
+    if health_score >= healthy:
         if not recommendations:
             recommendations = ["Continue current care routine", "Monitor regularly for changes"]
-    elif health_score >= 60:
-        disease = "Minor Health Issues Detected"
+    elif health_score >= minor:
         recommendations.insert(0, "Early intervention recommended")
-    elif health_score >= 40:
-        disease = "Moderate Disease Symptoms"
+    elif health_score >= moderate:
         recommendations.insert(0, "Immediate treatment advised")
     else:
-        disease = "Severe Disease Indicators"
         recommendations.insert(0, "Urgent intervention required")
     
     if disease_indicators:
@@ -0,0 +1,228 @@
+import json
+import os
+
+import numpy as np
+
+from models.diagnosis_cache import DiagnosisCache
+from models.disease_predictor import (
+    ANALYZER_VERSION,
+    DIAGNOSIS_RULES,
+    DIAGNOSIS_THRESHOLDS,
+    HEALTH_GRADE_BOUNDARIES,
+    diagnosis_grade,
+    analyze_with_resolution_policy,
+    check_image_quality,
+    format_diagnosis,
+    generate_diagnosis,
+    open_for_analysis,
+)
+
+# Bump whenever FEATURE_DTYPE changes; files written under another version are rejected
+FEATURE_RECORD_VERSION = 1
+
+MAX_DOMINANT_COLORS = 5
+
+# One fixed-size record per analyzed image, flattening perform_dynamic_analysis output
+FEATURE_DTYPE = np.dtype([
+    ('version', np.uint16),
+    ('image_key', np.uint8, (32,)),
+    # colors
+    ('dominant_colors', np.float32, (MAX_DOMINANT_COLORS, 3)),
+    ('n_dominant_colors', np.uint8),
+    ('green_dominance', np.float64),
+    ('discoloration_index', np.float64),
+    ('hue_variance', np.float64),
+    ('saturation_mean', np.float64),
+    ('brightness_mean', np.float64),
+    # texture
+    ('variance', np.float64),
+    ('edge_density', np.float64),
+    ('texture_contrast', np.float64),
+    ('roughness_index', np.float64),
+    # shapes
+    ('spot_count', np.int32),
+    ('avg_spot_size', np.float64),
+    ('shape_irregularity', np.float64),
+    ('size_variance', np.float64),
+    # stats
+    ('mean_rgb', np.float64, (3,)),
+    ('std_rgb', np.float64, (3,)),
+    ('extrema', np.uint8, (3, 2)),
+    ('brightness_uniformity', np.float64),
+    ('color_balance', np.float64),
+    # anomalies
+    ('dark_lesion_ratio', np.float64),
+    ('bright_discoloration_ratio', np.float64),
+    ('edge_damage_intensity', np.float64),
+    ('anomaly_score', np.float64),
+])
+
+# perform_dynamic_analysis section -> record fields
+RECORD_LAYOUT = {
+    'colors': ['dominant_colors', 'green_dominance', 'discoloration_index', 'hue_variance',
+               'saturation_mean', 'brightness_mean'],
+    'texture': ['variance', 'edge_density', 'texture_contrast', 'roughness_index'],
+    'shapes': ['spot_count', 'avg_spot_size', 'shape_irregularity', 'size_variance'],
+    'stats': ['mean_rgb', 'std_rgb', 'extrema', 'brightness_uniformity', 'color_balance'],
+    'anomalies': ['dark_lesion_ratio', 'bright_discoloration_ratio', 'edge_damage_intensity', 'anomaly_score'],
+}
+
+# diagnosis_features name -> record field
+DIAGNOSIS_FIELDS = {
+    'green_dominance': 'green_dominance',
+    'discoloration': 'discoloration_index',
+    'texture_roughness': 'roughness_index',
+    'spot_count': 'spot_count',
+    'anomaly_score': 'anomaly_score',
+    'brightness_mean': 'brightness_mean',
+}
+
+GRADE_LABELS = tuple(diagnosis_grade(score) for score in (*HEALTH_GRADE_BOUNDARIES, -np.inf))
+
+_MAGIC = b"PLANTFEAT\n"
+HEADER_SIZE = 4096
+
+def to_feature_records(analysis_results_list, image_keys=None):
+    """
+    Pack perform_dynamic_analysis results into a FEATURE_DTYPE array.
+    'image_keys' are optional DiagnosisCache.image_key hex digests, one per result.
+    """
+    records = np.zeros(len(analysis_results_list), dtype=FEATURE_DTYPE)
+    records['version'] = FEATURE_RECORD_VERSION
+    for index, results in enumerate(analysis_results_list):
+        for section, fields in RECORD_LAYOUT.items():
+            features = results[section]
+            for name in fields:
+                if name == 'dominant_colors':
+                    colors = np.asarray(features[name], dtype=np.float32).reshape(-1, 3)[:MAX_DOMINANT_COLORS]
+                    records['dominant_colors'][index, :len(colors)] = colors
+                    records['n_dominant_colors'][index] = len(colors)
+                else:
+                    records[name][index] = features[name]
+        if image_keys is not None and image_keys[index]:
+            records['image_key'][index] = np.frombuffer(bytes.fromhex(image_keys[index]), dtype=np.uint8)
+    return records
+
+def analyze_to_record(image_bytes):
+    """
+    Diagnose encoded image bytes and keep the features behind the diagnosis.
+    Returns (diagnosis, record) where record is a one-element FEATURE_DTYPE
+    array, or None when the image could not be decoded or failed the quality
+    gate. The diagnosis cache is bypassed since a cached diagnosis has no
+    features.
+    """
+    decoded, error = open_for_analysis(image_bytes)
+    if error:
+        return error, None
+    context, source_size = decoded
+    rejection = check_image_quality(context, source_size)
+    if rejection:
+        return rejection, None
+    analysis_results, resolution = analyze_with_resolution_policy(image_bytes, context, source_size)
+    diagnosis = generate_diagnosis(analysis_results)
+    diagnosis['resolution'] = resolution
+    return diagnosis, to_feature_records([analysis_results], [DiagnosisCache.image_key(image_bytes)])
+
+def from_feature_record(record):
+    """Rebuild the perform_dynamic_analysis dict for one record"""
+    results = {}
+    for section, fields in RECORD_LAYOUT.items():
+        features = {}
+        for name in fields:
+            value = record[name]
+            if name == 'dominant_colors':
+                features[name] = value[:int(record['n_dominant_colors'])].astype(np.float64).tolist()
+            elif name == 'extrema':
+                features[name] = [tuple(int(v) for v in pair) for pair in value]
+            elif name == 'spot_count':
+                features[name] = int(value)
+            elif np.ndim(value):
+                features[name] = value.tolist()
+            else:
+                features[name] = float(value)
+        results[section] = features
+    return results
+
+def _header_bytes():
+    header = json.dumps({
+        'version': FEATURE_RECORD_VERSION,
+        'analyzer_version': ANALYZER_VERSION,
+        'descr': np.lib.format.dtype_to_descr(FEATURE_DTYPE),
+    }).encode()
+    assert len(_MAGIC) + len(header) <= HEADER_SIZE, "feature record header overflow"
+    return (_MAGIC + header).ljust(HEADER_SIZE, b" ")
+
+def _check_header(path, header):
+    if not header.startswith(_MAGIC):
+        raise ValueError(f"{path} is not a feature record file")
+    meta = json.loads(header[len(_MAGIC):].decode())
+    if meta.get('version') != FEATURE_RECORD_VERSION:
+        raise ValueError(
+            f"{path} holds feature records version {meta.get('version')}, expected {FEATURE_RECORD_VERSION}"
+        )
+
+def append_feature_records(path, records):
+    """
+    Append records to a feature file, creating it with a versioned header.
+    The file is a fixed header followed by raw FEATURE_DTYPE records.
+    """
+    records = np.ascontiguousarray(records, dtype=FEATURE_DTYPE)
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            _check_header(path, f.read(HEADER_SIZE))
+        with open(path, "ab") as f:
+            f.write(records.tobytes())
+    else:
+        with open(path, "wb") as f:
+            f.write(_header_bytes())
+            f.write(records.tobytes())
+
+def load_feature_records(path):
+    """Memory-map the records of a feature file (a torn trailing record is ignored)"""
+    with open(path, "rb") as f:
+        _check_header(path, f.read(HEADER_SIZE))
+    count = (os.path.getsize(path) - HEADER_SIZE) // FEATURE_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=FEATURE_DTYPE)
+    return np.memmap(path, dtype=FEATURE_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+def diagnose_records(records, thresholds=None):
+    """
+    Vectorized generate_diagnosis over stored records.
+    Applies DIAGNOSIS_RULES with DIAGNOSIS_THRESHOLDS (overridden by
+    'thresholds') one rule at a time across all records. Returns arrays
+    'health_score', 'grade' (index into GRADE_LABELS) and 'rule_flags'
+    (bit i set when DIAGNOSIS_RULES[i] fired).
+    """
+    limits = {**DIAGNOSIS_THRESHOLDS, **(thresholds or {})}
+    health_score = records['green_dominance'] * 100
+    rule_flags = np.zeros(len(records), dtype=np.uint8)
+
+    for bit, (name, comparison, penalty, _, _) in enumerate(DIAGNOSIS_RULES):
+        values = records[DIAGNOSIS_FIELDS[name]]
+        fired = values > limits[name] if comparison == '>' else values < limits[name]
+        health_score = np.where(fired, health_score - penalty, health_score)
+        rule_flags |= fired.astype(np.uint8) << bit
+
+    grade = np.zeros(len(records), dtype=np.uint8)
+    for boundary in HEALTH_GRADE_BOUNDARIES:
+        grade += health_score < boundary
+    return {'health_score': health_score, 'grade': grade, 'rule_flags': rule_flags}
+
+def describe_diagnoses(records, outcome, rows=None):
+    """
+    generate_diagnosis-style dicts for selected rows of a diagnose_records outcome.
+    Text is only built for the rows asked for.
+    """
+    rows = range(len(records)) if rows is None else rows
+    diagnoses = []
+    for row in rows:
+        indicators, recommendations = [], []
+        for bit, (name, _, _, indicator, recommendation) in enumerate(DIAGNOSIS_RULES):
+            if outcome['rule_flags'][row] >> bit & 1:
+                value = records[DIAGNOSIS_FIELDS[name]][row]
+                value = int(value) if name == 'spot_count' else float(value)
+                indicators.append(indicator.format(value=value))
+                recommendations.append(recommendation)
+        diagnoses.append(format_diagnosis(float(outcome['health_score'][row]), indicators, recommendations))
+    return diagnoses
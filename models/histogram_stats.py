@@ -0,0 +1,152 @@
+import math
+from fractions import Fraction
+
+import numpy as np
+import cv2
+
+# cv2.calcHist counts in float32, which is exact only up to 2**24 per bin
+MAX_CALCHIST_PIXELS = 1 << 24
+
+_LEVELS = np.arange(256, dtype=np.int64)
+
+def channel_histograms(image):
+    """
+    Build 256-bin histograms for every channel of an 8-bit image.
+    Accepts (H, W) or (H, W, C) uint8 arrays; returns int64 counts of shape (C, 256).
+    """
+    image = np.asarray(image)
+    if image.dtype != np.uint8:
+        raise ValueError(f"Histogram statistics need 8-bit data, got {image.dtype}")
+    if image.ndim == 2:
+        image = image[:, :, None]
+    height, width, channels = image.shape
+
+    counts = np.zeros((channels, 256), dtype=np.int64)
+    if height == 0 or width == 0:
+        return counts
+    rows_per_band = max(1, MAX_CALCHIST_PIXELS // width)
+    for top in range(0, height, rows_per_band):
+        band = np.ascontiguousarray(image[top:top + rows_per_band])
+        for channel in range(channels):
+            hist = cv2.calcHist([band], [channel], None, [256], [0, 256])
+            counts[channel] += hist.reshape(-1).astype(np.int64)
+    return counts
+
+def batch_channel_histograms(stack):
+    """
+    Histograms for a stack of same-size 8-bit images, (N, H, W) or (N, H, W, C).
+    Returns int64 counts of shape (N, C, 256); each image is counted from a
+    view of the stack, so nothing is copied.
+    """
+    stack = np.asarray(stack)
+    channels = stack.shape[3] if stack.ndim == 4 else 1
+    counts = np.zeros((stack.shape[0], channels, 256), dtype=np.int64)
+    for index, image in enumerate(stack):
+        counts[index] = channel_histograms(image)
+    return counts
+
+def batch_image_stat(counts):
+    """
+    HistogramStats.image_stat() for a stack of histograms (N, C, 256), with
+    the same float operations applied to whole arrays. Returns one
+    {'mean', 'stddev', 'extrema'} dict per image.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    pixels = counts[:, 0].sum(axis=1, keepdims=True).astype(np.float64)
+    layer_sum = (counts @ _LEVELS).astype(np.float64)
+    layer_sum2 = (counts @ (_LEVELS * _LEVELS)).astype(np.float64)
+    means = layer_sum / pixels
+    stddevs = np.sqrt((layer_sum2 - (layer_sum ** 2.0) / pixels) / pixels)
+    occupied = counts > 0
+    minima = occupied.argmax(axis=2)
+    maxima = 255 - occupied[:, :, ::-1].argmax(axis=2)
+    return [
+        {'mean': means[i].tolist(), 'stddev': stddevs[i].tolist(),
+         'extrema': [(int(low), int(high)) for low, high in zip(minima[i], maxima[i])]}
+        for i in range(len(counts))
+    ]
+
+class HistogramStats:
+    """
+    Exact per-channel statistics of an 8-bit image derived from its histograms.
+    Percentiles and means reproduce np.percentile / np.mean bit for bit and
+    image_stat() reproduces PIL's ImageStat.Stat.
+    """
+
+    def __init__(self, counts):
+        self.counts = np.asarray(counts, dtype=np.int64)
+        if self.counts.ndim == 1:
+            self.counts = self.counts[None, :]
+        self.count = int(self.counts[0].sum())
+        self.sums = [int(s) for s in self.counts @ _LEVELS]
+        self.sums2 = [int(s) for s in self.counts @ (_LEVELS * _LEVELS)]
+        self._cumulative = np.cumsum(self.counts, axis=1)
+
+    @classmethod
+    def from_image(cls, image):
+        return cls(channel_histograms(image))
+
+    @property
+    def channels(self):
+        return self.counts.shape[0]
+
+    def mean(self, channel=0):
+        """Same value as np.mean: the integer sum is exact, so only the division rounds"""
+        return self.sums[channel] / self.count
+
+    def var(self, channel=0):
+        """
+        Population variance, computed exactly and rounded once.
+        np.var accumulates squared deviations in floating point, so the two
+        can differ in the last bit.
+        """
+        exact = Fraction(self.count * self.sums2[channel] - self.sums[channel] ** 2, self.count ** 2)
+        return float(exact)
+
+    def std(self, channel=0):
+        return math.sqrt(self.var(channel))
+
+    def order_statistic(self, k, channel=0):
+        """The k-th smallest value (0-based) of a channel"""
+        return int(np.searchsorted(self._cumulative[channel], k, side='right'))
+
+    def count_at_most(self, value, channel=0):
+        """Number of pixels <= value"""
+        if value < 0:
+            return 0
+        return int(self._cumulative[channel][min(int(value), 255)])
+
+    def percentile(self, q, channel=0):
+        """
+        np.percentile(channel, q) with the default 'linear' method, reproducing
+        numpy's index and interpolation arithmetic so results are bit-identical.
+        """
+        n = self.count
+        quantile = np.true_divide(q, 100)
+        virtual_index = (n - 1) * quantile
+        if virtual_index >= n - 1:
+            return float(self.order_statistic(n - 1, channel))
+        previous_index = np.floor(virtual_index)
+        gamma = virtual_index - previous_index
+        below = self.order_statistic(int(previous_index), channel)
+        above = self.order_statistic(int(previous_index) + 1, channel)
+        diff = above - below
+        if gamma >= 0.5:
+            return float(above - diff * (1 - gamma))
+        return float(below + diff * gamma)
+
+    def extrema(self, channel=0):
+        occupied = np.nonzero(self.counts[channel])[0]
+        return int(occupied[0]), int(occupied[-1])
+
+    def image_stat(self):
+        """mean, stddev and extrema per channel, as PIL's ImageStat.Stat computes them"""
+        means, stddevs, extrema = [], [], []
+        for channel in range(self.channels):
+            layer_sum = float(self.sums[channel])
+            layer_sum2 = float(self.sums2[channel])
+            means.append(layer_sum / self.count)
+            variance = (layer_sum2 - (layer_sum ** 2.0) / self.count) / self.count
+            stddevs.append(math.sqrt(variance))
+            extrema.append(self.extrema(channel))
+        return {'mean': means, 'stddev': stddevs, 'extrema': extrema}
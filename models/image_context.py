@@ -0,0 +1,155 @@
+import numpy as np
+from PIL import Image
+import cv2
+from models.histogram_stats import HistogramStats
+
+class ImageContext:
+    """
+    Lazily evaluated, memoized views of a single image shared by every analyzer.
+    Derived planes (gray, HSV, Canny edges, Otsu mask, ...) are built on first
+    use and reused afterwards. Analyzers can register their own planes with
+    ImageContext.register_plane so they are cached the same way.
+    """
+
+    # Plane name -> builder(context, *params), shared by all contexts
+    _builders = {}
+
+    def __init__(self, rgb=None, bgr=None, pil_image=None, planes=None):
+        if rgb is None and bgr is None and pil_image is None:
+            raise ValueError("ImageContext needs an RGB array, a BGR array or a PIL image")
+        self._planes = {}
+        for name, value in (('rgb', rgb), ('bgr', bgr), ('pil', pil_image)):
+            if value is not None:
+                self._store((name,), value)
+        for name, value in (planes or {}).items():
+            self._store((name,), value)
+
+    @classmethod
+    def register_plane(cls, name, builder):
+        """
+        Register a derived plane. 'builder' is called as builder(context, *params)
+        the first time context.get(name, *params) is requested.
+        """
+        cls._builders[name] = builder
+        return builder
+
+    def get(self, name, *params):
+        """Return a derived plane, building and caching it on first use"""
+        key = (name,) + params
+        if key not in self._planes:
+            if name not in self._builders:
+                raise KeyError(f"Unknown image plane '{name}'. Registered: {sorted(self._builders)}")
+            self._store(key, self._builders[name](self, *params))
+        return self._planes[key]
+
+    def has(self, name, *params):
+        """True if the plane has already been computed"""
+        return (name,) + params in self._planes
+
+    def _store(self, key, value):
+        # Shared planes must not be modified in place by one analyzer; a view
+        # keeps the caller's own array writeable
+        if isinstance(value, np.ndarray):
+            value = value.view()
+            value.flags.writeable = False
+        self._planes[key] = value
+
+    # --- Convenience accessors for the built-in planes ---
+
+    @property
+    def rgb(self):
+        return self.get('rgb')
+
+    @property
+    def bgr(self):
+        return self.get('bgr')
+
+    @property
+    def pil(self):
+        return self.get('pil')
+
+    @property
+    def gray(self):
+        return self.get('gray')
+
+    @property
+    def hsv(self):
+        return self.get('hsv')
+
+    @property
+    def otsu_mask(self):
+        return self.get('otsu_mask')
+
+    def canny(self, low, high):
+        return self.get('canny', low, high)
+
+    def histogram(self, plane):
+        """HistogramStats of an 8-bit plane ('rgb', 'hsv', 'gray', ...)"""
+        return self.get('histogram', plane)
+
+    @property
+    def shape(self):
+        """(height, width) of the image, without building any new plane"""
+        for name in ('rgb', 'bgr', 'gray'):
+            if self.has(name):
+                return self.get(name).shape[:2]
+        width, height = self.pil.size
+        return height, width
+
+def as_image_context(image):
+    """
+    Wrap an analyzer input in an ImageContext.
+    Accepts an existing context, a PIL image or an OpenCV (BGR) array.
+    """
+    if isinstance(image, ImageContext):
+        return image
+    if isinstance(image, Image.Image):
+        return ImageContext(pil_image=image if image.mode == 'RGB' else image.convert('RGB'))
+    return ImageContext(bgr=np.asarray(image))
+
+def _build_rgb(context):
+    if context.has('bgr'):
+        # Channel-reversed view of the BGR buffer, no copy
+        return context.bgr[:, :, ::-1]
+    return np.asarray(context.pil)
+
+def _build_bgr(context):
+    return cv2.cvtColor(context.rgb, cv2.COLOR_RGB2BGR)
+
+def _build_pil(context):
+    if context.has('bgr') and context.bgr.flags.c_contiguous:
+        # Pillow unpacks BGR rows itself, so no RGB copy is made first
+        height, width = context.bgr.shape[:2]
+        return Image.frombuffer('RGB', (width, height), context.bgr, 'raw', 'BGR', 0, 1)
+    return Image.fromarray(np.ascontiguousarray(context.rgb))
+
+def _build_gray(context):
+    if context.has('bgr'):
+        return cv2.cvtColor(context.bgr, cv2.COLOR_BGR2GRAY)
+    return cv2.cvtColor(context.rgb, cv2.COLOR_RGB2GRAY)
+
+def _build_hsv(context):
+    # PIL's HSV (hue scaled to 0-255) is what the color analysis was tuned on
+    return np.array(context.pil.convert('HSV'))
+
+def _build_canny(context, low, high):
+    return cv2.Canny(context.gray, low, high)
+
+def _build_otsu_mask(context):
+    _, thresholded = cv2.threshold(context.gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return thresholded
+
+def _build_histogram(context, plane):
+    if plane == 'rgb' and context.has('bgr'):
+        # Same counts as the BGR buffer, in reversed channel order
+        return HistogramStats(context.histogram('bgr').counts[::-1])
+    return HistogramStats.from_image(context.get(plane))
+
+ImageContext.register_plane('rgb', _build_rgb)
+ImageContext.register_plane('bgr', _build_bgr)
+ImageContext.register_plane('pil', _build_pil)
+ImageContext.register_plane('gray', _build_gray)
+ImageContext.register_plane('hsv', _build_hsv)
+ImageContext.register_plane('canny', _build_canny)
+ImageContext.register_plane('otsu_mask', _build_otsu_mask)
+ImageContext.register_plane('histogram', _build_histogram)
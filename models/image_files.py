@@ -0,0 +1,22 @@
+import glob
+import os
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff'}
+
+def find_images(inputs, extensions=IMAGE_EXTENSIONS):
+    """
+    Expand directories (recursively) and glob patterns into a sorted,
+    de-duplicated list of image paths.
+    """
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in files:
+                    if os.path.splitext(name)[1].lower() in extensions:
+                        found.add(os.path.abspath(os.path.join(root, name)))
+        else:
+            for path in glob.glob(item, recursive=True):
+                if os.path.isfile(path) and os.path.splitext(path)[1].lower() in extensions:
+                    found.add(os.path.abspath(path))
+    return sorted(found)
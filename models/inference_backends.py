@@ -0,0 +1,201 @@
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from models.model_loader import resident_memory_mb
+
+# torch is needed for the eager and TorchScript backends and for exporting
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    torch = None
+    TORCH_AVAILABLE = False
+
+# ONNX Runtime runs the exported, int8-quantized model without torch
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNXRUNTIME_AVAILABLE = False
+
+BACKEND_NAMES = ("eager", "torchscript", "onnx-int8")
+
+# Exported models live in <cache_dir>/exports/models--<org>--<name>/
+TORCHSCRIPT_FILE = "model.torchscript.pt"
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+LABELS_FILE = "labels.json"
+
+def export_directory(cache_dir, repo_id):
+    return Path(cache_dir) / "exports" / f"models--{repo_id.replace('/', '--')}"
+
+def _logits_and_embeddings(model):
+    """
+    Wrap a Hugging Face image classifier as a module mapping pixel_values to
+    (logits, pooled embeddings), the shape every backend exposes.
+    """
+    class LogitsAndEmbeddings(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values):
+            pooled = self.model.base_model(pixel_values=pixel_values).pooler_output
+            return self.model.classifier(self.model.dropout(pooled)), pooled
+
+    return LogitsAndEmbeddings().eval()
+
+class EagerBackend:
+    """fp32 PyTorch in eager mode, the reference every other backend is checked against"""
+
+    name = "eager"
+
+    def __init__(self, model):
+        if not TORCH_AVAILABLE:
+            raise ImportError("torch is required for the eager backend")
+        self.labels = dict(model.config.id2label)
+        self.module = _logits_and_embeddings(model)
+
+    def run(self, pixel_values):
+        """(logits, embeddings) as float32 arrays for an NCHW float32 batch"""
+        with torch.inference_mode():
+            logits, embeddings = self.module(torch.from_numpy(np.ascontiguousarray(pixel_values)))
+        return logits.numpy(), embeddings.numpy()
+
+class TorchScriptBackend(EagerBackend):
+    """Traced, frozen and inference-optimized TorchScript (conv/batch-norm folding, fused activations)"""
+
+    name = "torchscript"
+
+    def __init__(self, module, labels):
+        if not TORCH_AVAILABLE:
+            raise ImportError("torch is required for the TorchScript backend")
+        self.labels = labels
+        self.module = torch.jit.optimize_for_inference(module)
+
+    @staticmethod
+    def trace(model):
+        example = torch.zeros(1, 3, 224, 224)
+        with torch.no_grad():
+            traced = torch.jit.trace(_logits_and_embeddings(model), example)
+        return torch.jit.freeze(traced)
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(cls.trace(model), dict(model.config.id2label))
+
+    @classmethod
+    def from_file(cls, path, labels):
+        return cls(torch.jit.load(str(path)).eval(), labels)
+
+class OnnxBackend:
+    """An exported ONNX model on ONNX Runtime's CPU provider"""
+
+    name = "onnx-int8"
+
+    def __init__(self, path, labels, threads=None):
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("onnxruntime is required for the ONNX backend")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.path = Path(path)
+        self.labels = labels
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+    def run(self, pixel_values):
+        logits, embeddings = self.session.run(
+            ["logits", "embeddings"], {"pixel_values": np.ascontiguousarray(pixel_values, dtype=np.float32)}
+        )
+        return logits, embeddings
+
+def load_labels(directory):
+    with open(Path(directory) / LABELS_FILE) as f:
+        return {int(class_id): label for class_id, label in json.load(f).items()}
+
+def export_model(model, directory, opset=17):
+    """
+    Export a classifier next to its cache: a frozen TorchScript module, an
+    fp32 ONNX graph with a dynamic batch axis, its dynamically int8-quantized
+    copy, and the label map. Returns {name: path} of the written files.
+    """
+    if not TORCH_AVAILABLE:
+        raise ImportError("torch is required to export the model")
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = {
+        "torchscript": directory / TORCHSCRIPT_FILE,
+        "onnx": directory / ONNX_FILE,
+        "onnx-int8": directory / ONNX_INT8_FILE,
+        "labels": directory / LABELS_FILE,
+    }
+    torch.jit.save(TorchScriptBackend.trace(model), str(paths["torchscript"]))
+    torch.onnx.export(
+        _logits_and_embeddings(model), torch.zeros(1, 3, 224, 224), str(paths["onnx"]),
+        input_names=["pixel_values"], output_names=["logits", "embeddings"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}, "embeddings": {0: "batch"}},
+        opset_version=opset,
+    )
+    quantize_dynamic(str(paths["onnx"]), str(paths["onnx-int8"]), weight_type=QuantType.QInt8)
+    with open(paths["labels"], "w") as f:
+        json.dump({str(class_id): label for class_id, label in model.config.id2label.items()}, f, indent=2)
+    return paths
+
+def create_backend(name, model=None, directory=None, threads=None):
+    """
+    Backend 'name' for a loaded fp32 model and/or an export directory.
+    'eager' needs the model; 'torchscript' uses the exported module when
+    present and traces the model otherwise; 'onnx-int8' needs the export
+    (see export_model.py) but not the torch model.
+    """
+    if name == "eager":
+        return EagerBackend(model)
+    if name == "torchscript":
+        if directory is not None and (Path(directory) / TORCHSCRIPT_FILE).is_file():
+            return TorchScriptBackend.from_file(Path(directory) / TORCHSCRIPT_FILE, load_labels(directory))
+        if model is None:
+            raise FileNotFoundError(f"No exported TorchScript model in {directory}; run export_model.py")
+        return TorchScriptBackend.from_model(model)
+    if name == "onnx-int8":
+        path = Path(directory) / ONNX_INT8_FILE if directory is not None else None
+        if path is None or not path.is_file():
+            raise FileNotFoundError(f"No quantized ONNX model in {directory}; run export_model.py")
+        return OnnxBackend(path, load_labels(directory), threads)
+    raise ValueError(f"Unknown inference backend '{name}' (expected one of {', '.join(BACKEND_NAMES)})")
+
+def top1_agreement(reference, candidate, pixel_values, batch_size=16):
+    """Share of images on which two backends predict the same class, plus the largest logit difference"""
+    agree = 0
+    max_difference = 0.0
+    for start in range(0, len(pixel_values), batch_size):
+        batch = pixel_values[start:start + batch_size]
+        expected, _ = reference.run(batch)
+        actual, _ = candidate.run(batch)
+        agree += int((expected.argmax(axis=1) == actual.argmax(axis=1)).sum())
+        max_difference = max(max_difference, float(np.abs(expected - actual).max()))
+    return {"agreement": round(agree / len(pixel_values), 4), "images": len(pixel_values),
+            "max_logit_difference": round(max_difference, 4)}
+
+def measure_backend(backend, pixel_values, repeats=20):
+    """Latency per batch (p50/p99, ms), images/sec and resident memory after running a backend"""
+    backend.run(pixel_values)  # warm-up
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.run(pixel_values)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies)
+    return {
+        "batch_size": len(pixel_values),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+        "images_per_second": round(len(pixel_values) / float(latencies.mean()), 1),
+        "resident_mb": resident_memory_mb(),
+    }
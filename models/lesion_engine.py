@@ -0,0 +1,83 @@
+import numpy as np
+import cv2
+from models.image_context import ImageContext
+
+# Components smaller than this (in pixels) are treated as noise
+MIN_LESION_AREA = 10
+
+# One record per lesion; bbox is (x, y, width, height), centroid is (x, y)
+LESION_DTYPE = np.dtype([
+    ('area', np.int32),
+    ('bbox', np.int32, (4,)),
+    ('centroid', np.float32, (2,)),
+    ('perimeter', np.float32),
+    ('circularity', np.float32),
+])
+
+# Border-pixel weights indexed by the 3x3 neighbourhood code below: straight
+# runs count 1, diagonal steps sqrt(2), corners (1 + sqrt(2)) / 2
+_NEIGHBOURHOOD_KERNEL = np.array([[10, 2, 10], [2, 1, 2], [10, 2, 10]], dtype=np.float32)
+_PERIMETER_WEIGHTS = np.zeros(50, dtype=np.float64)
+_PERIMETER_WEIGHTS[[5, 7, 15, 17, 25, 27]] = 1
+_PERIMETER_WEIGHTS[[21, 33]] = np.sqrt(2)
+_PERIMETER_WEIGHTS[[13, 23]] = (1 + np.sqrt(2)) / 2
+
+_CROSS = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+
+def component_perimeters(labels, n_labels, foreground):
+    """
+    Perimeter of every labelled component, estimated from border-pixel
+    configurations (the same weighting as skimage.measure.perimeter) and
+    summed per label with one bincount. 'foreground' is the 0/255 mask the
+    labels were computed from.
+    """
+    eroded = cv2.erode(foreground, _CROSS, borderType=cv2.BORDER_CONSTANT, borderValue=0)
+    border = cv2.bitwise_and(cv2.subtract(foreground, eroded), 1)
+    codes = cv2.filter2D(border, cv2.CV_8U, _NEIGHBOURHOOD_KERNEL, borderType=cv2.BORDER_CONSTANT)
+    points = cv2.findNonZero(border)
+    if points is None:
+        return np.zeros(n_labels, dtype=np.float64)
+    points = points.reshape(-1, 2)
+    x, y = points[:, 0], points[:, 1]
+    return np.bincount(labels[y, x], weights=_PERIMETER_WEIGHTS[codes[y, x]], minlength=n_labels)
+
+def detect_lesions(mask, min_area=MIN_LESION_AREA):
+    """
+    Find lesions in a binary mask with 8-connected component labelling.
+    Returns a LESION_DTYPE structured array with one record per component of
+    at least min_area pixels.
+    """
+    foreground = cv2.compare(np.ascontiguousarray(mask), 0, cv2.CMP_GT)
+    n_labels, labels, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+        foreground, 8, cv2.CV_32S, cv2.CCL_GRANA
+    )
+    perimeters = component_perimeters(labels, n_labels, foreground)
+
+    # Label 0 is the background
+    keep = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] >= min_area) + 1
+    lesions = np.zeros(len(keep), dtype=LESION_DTYPE)
+    lesions['area'] = stats[keep, cv2.CC_STAT_AREA]
+    lesions['bbox'] = stats[keep, :4]
+    lesions['centroid'] = centroids[keep]
+    lesions['perimeter'] = perimeters[keep]
+
+    areas = stats[keep, cv2.CC_STAT_AREA].astype(np.float64)
+    perimeter = perimeters[keep]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lesions['circularity'] = np.where(perimeter > 0, 4 * np.pi * areas / perimeter ** 2, 0)
+    return lesions
+
+def lesion_features(lesions):
+    """spot_count, avg_spot_size, shape_irregularity and size_variance of a lesion array"""
+    areas = lesions['area'].astype(np.float64)
+    return {
+        'spot_count': int(len(lesions)),
+        'avg_spot_size': float(areas.mean()) if len(areas) else 0,
+        'shape_irregularity': float(1 - lesions['circularity'].astype(np.float64).mean()) if len(lesions) else 0,
+        'size_variance': float(areas.var()) if len(areas) > 1 else 0
+    }
+
+def _build_lesions(context):
+    return detect_lesions(context.otsu_mask)
+
+ImageContext.register_plane('lesions', _build_lesions)
@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into batches for one batched call.
+    A worker thread takes the first waiting request, then keeps collecting
+    until max_batch_size requests are held or max_wait_ms has passed since
+    the first arrived, and calls process_batch(items), which must return one
+    result per item in order. Each caller gets its own result (or the
+    batch's exception) through the Future returned by submit().
+    """
+
+    def __init__(self, process_batch, max_batch_size=8, max_wait_ms=10, name="micro-batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"requests": 0, "batches": 0, "failed_batches": 0, "batch_sizes": {}}
+
+    @classmethod
+    def from_config(cls, process_batch, config, name="micro-batcher"):
+        """Build a batcher from the 'inference' block of the disease_predictor config"""
+        return cls(
+            process_batch,
+            max_batch_size=config.get("max_batch_size", 8),
+            max_wait_ms=config.get("max_wait_ms", 10),
+            name=name,
+        )
+
+    def submit(self, item):
+        """Queue one request; returns a Future for its result"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+            self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit one request and wait for its result"""
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            items = [item for item, _ in batch]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"process_batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                with self._lock:
+                    self.stats["failed_batches"] += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                sizes = self.stats["batch_sizes"]
+                sizes[len(batch)] = sizes.get(len(batch), 0) + 1
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def close(self):
+        """Finish queued requests and stop the worker"""
+        with self._lock:
+            self._closed = True
+            worker = self._worker
+        if worker is not None:
+            self._queue.put(None)
+            worker.join()
+
+    def get_stats(self):
+        """Request and batch counters, for the server's health output"""
+        with self._lock:
+            stats = {**self.stats, "batch_sizes": dict(sorted(self.stats["batch_sizes"].items()))}
+        stats["mean_batch_size"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000
+        return stats
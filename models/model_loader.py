@@ -0,0 +1,173 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    # Windows: no getrusage, and no /proc either, so resident memory is not reported
+    RESOURCE_AVAILABLE = False
+
+# Config files an offline snapshot must hold
+SNAPSHOT_FILES = ("config.json", "preprocessor_config.json")
+
+# Weight files in order of preference, either one is enough. The main revision
+# of the plant disease model ships only pytorch_model.bin (its safetensors
+# conversion lives on refs/pr/2, hence the cache's .no_exist marker for it)
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+def resident_memory_mb():
+    """
+    Current resident set size of this process in MB (peak RSS where /proc
+    is unavailable), or None where neither is available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        if not RESOURCE_AVAILABLE:
+            return None
+        # ru_maxrss is in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+def resolve_snapshot(cache_dir, repo_id, revision="main", files=SNAPSHOT_FILES, weights=WEIGHT_FILES):
+    """
+    Directory of a model snapshot inside a Hugging Face cache, resolved
+    without the hub: models--<org>--<name>/refs/<revision> names the commit
+    whose snapshots/<commit> folder holds the files; a commit hash may be
+    given as the revision directly. Raises FileNotFoundError naming what is
+    missing (of 'files', and one of 'weights' unless empty), so an offline
+    server fails at once with a clear status.
+    """
+    repo_dir = Path(cache_dir) / f"models--{repo_id.replace('/', '--')}"
+    if not repo_dir.is_dir():
+        raise FileNotFoundError(f"Model {repo_id} is not in the offline cache {cache_dir} ({repo_dir} missing)")
+    ref = repo_dir / "refs" / revision
+    commit = ref.read_text().strip() if ref.is_file() else revision
+    snapshot = repo_dir / "snapshots" / commit
+    if not snapshot.is_dir():
+        raise FileNotFoundError(f"No snapshot for revision '{revision}' of {repo_id} in {repo_dir / 'snapshots'}")
+    missing = [name for name in files if not (snapshot / name).is_file()]
+    if weights and not any((snapshot / name).is_file() for name in weights):
+        missing.append(" or ".join(weights))
+    if missing:
+        raise FileNotFoundError(f"Offline snapshot {snapshot} is missing {', '.join(missing)}")
+    return snapshot
+
+def snapshot_weights(snapshot, weights=WEIGHT_FILES):
+    """Path of the preferred weight file present in a snapshot"""
+    for name in weights:
+        if (Path(snapshot) / name).is_file():
+            return Path(snapshot) / name
+    raise FileNotFoundError(f"Offline snapshot {snapshot} is missing {' or '.join(weights)}")
+
+def load_offline_model(cache_dir, repo_id, revision="main"):
+    """
+    Load an image classifier (processor, model) straight from its cached
+    snapshot, with no hub resolution. The model is built from config.json
+    and its parameters are assigned from the memory-mapped weights
+    (model.safetensors, else pytorch_model.bin) instead of being copied into
+    freshly allocated ones. Missing or unexpected parameters raise, so a
+    mismatched checkpoint never serves randomly initialized layers.
+    """
+    snapshot = resolve_snapshot(cache_dir, repo_id, revision)
+    weights_path = snapshot_weights(snapshot)
+    from transformers import AutoConfig, AutoImageProcessor, AutoModelForImageClassification
+
+    processor = AutoImageProcessor.from_pretrained(snapshot, local_files_only=True)
+    model = AutoModelForImageClassification.from_config(AutoConfig.from_pretrained(snapshot, local_files_only=True))
+    if weights_path.suffix == ".safetensors":
+        from safetensors import safe_open
+        with safe_open(weights_path, framework="pt") as weights:
+            state_dict = {name: weights.get_tensor(name) for name in weights.keys()}
+    else:
+        import torch
+        state_dict = torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
+    model.load_state_dict(state_dict, strict=True, assign=True)
+    model.tie_weights()
+    model.eval()
+    return processor, model
+
+class ModelLoader:
+    """
+    Runs a slow model load once, in a background thread, behind a readiness
+    future. 'load' is a callable returning the loaded model (any object).
+    In 'background' mode the server calls start() once its transport is up;
+    in 'lazy' mode the first wait() starts the load. Either way, callers
+    that need the model block in wait() until it is ready or failed.
+    """
+
+    def __init__(self, load, mode="background", timeout=300, name="model-loader"):
+        if mode not in ("background", "lazy"):
+            raise ValueError(f"Unknown model loading mode '{mode}' (expected 'background' or 'lazy')")
+        self._load = load
+        self.mode = mode
+        self.timeout = timeout
+        self.name = name
+        self._future = Future()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.load_seconds = None
+        self.resident_mb = None
+
+    @classmethod
+    def from_config(cls, load, config, name="model-loader"):
+        """Build a loader from the 'model_loading' block of the disease_predictor config"""
+        return cls(
+            load,
+            mode=config.get("mode", "background"),
+            timeout=config.get("timeout_seconds", 300),
+            name=name,
+        )
+
+    def start(self):
+        """Start loading in the background if not already started; returns the readiness future"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return self._future
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            model = self._load()
+        except Exception as e:
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            self._future.set_exception(e)
+        else:
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            self.resident_mb = resident_memory_mb()
+            self._future.set_result(model)
+
+    def wait(self, timeout=None):
+        """
+        The loaded model, starting the load if needed. Raises the load's
+        exception, or TimeoutError after 'timeout' seconds (default: the
+        configured timeout).
+        """
+        return self.start().result(self.timeout if timeout is None else timeout)
+
+    @property
+    def ready(self):
+        return self._future.done() and self._future.exception() is None
+
+    @property
+    def status(self):
+        """'not_loaded', 'loading', 'loaded' or 'error: <reason>'"""
+        if self._thread is None:
+            return "not_loaded"
+        if not self._future.done():
+            return "loading"
+        error = self._future.exception()
+        return f"error: {error}" if error is not None else "loaded"
+
+    def get_stats(self):
+        """Loading status, time and resident memory after loading, for the server's health output"""
+        return {"status": self.status, "mode": self.mode, "load_seconds": self.load_seconds,
+                "resident_mb": self.resident_mb}
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Bits per hash are HASH_SIZE ** 2; NearDuplicateIndex stores 64-bit hashes
+HASH_SIZE = 8
+
+def _thumbnail(image, width, height):
+    """
+    Grayscale (height, width) float32 thumbnail of a PIL image, path or file
+    object. JPEGs are decoded at reduced scale, which is most of the saving.
+    """
+    if isinstance(image, str) or hasattr(image, "read"):
+        image = Image.open(image)
+    if image.format == "JPEG":
+        image.draft("L", (width * 4, height * 4))
+    return np.asarray(image.convert("L").resize((width, height), Image.Resampling.BOX), dtype=np.float32)
+
+def _pack_bits(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+def dhash(image, hash_size=HASH_SIZE):
+    """
+    Difference hash: whether each pixel of a (hash_size + 1)-wide grayscale
+    thumbnail is brighter than its right-hand neighbour.
+    'image' is a PIL image, a path or a file object.
+    """
+    pixels = _thumbnail(image, hash_size + 1, hash_size)
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+def phash(image, hash_size=HASH_SIZE, highfreq_factor=4):
+    """
+    DCT perceptual hash: the lowest hash_size x hash_size DCT coefficients
+    of a grayscale thumbnail compared against their median.
+    More robust to re-compression and small crops than dhash, and a little slower.
+    """
+    size = hash_size * highfreq_factor
+    pixels = _thumbnail(image, size, size)
+    low = cv2.dct(pixels)[:hash_size, :hash_size]
+    return _pack_bits(low > np.median(low.ravel()[1:]))
+
+HASH_METHODS = {'dhash': dhash, 'phash': phash}
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+class NearDuplicateIndex:
+    """
+    Bounded index of recent perceptual hashes and the results computed for them.
+    lookup() returns the stored result of the closest recent image within
+    max_distance bits, so a burst of near-identical shots is processed once.
+    Entries older than max_age seconds are ignored; the oldest entry is
+    replaced once max_entries are held.
+    """
+
+    def __init__(self, max_entries=256, max_distance=6, max_age=600, method='dhash'):
+        if method not in HASH_METHODS:
+            raise ValueError(f"Unknown perceptual hash method '{method}' (expected one of {sorted(HASH_METHODS)})")
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.method = method
+        self._hashes = np.zeros(max_entries, dtype=np.uint64)
+        self._added = np.full(max_entries, -np.inf)
+        self._entries = [None] * max_entries
+        self._next = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "inserts": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an index from the 'dedup' block of the disease_predictor config"""
+        return cls(
+            max_entries=config.get("max_entries", 256),
+            max_distance=config.get("max_distance", 6),
+            max_age=config.get("max_age_seconds", 600),
+            method=config.get("method", 'dhash'),
+        )
+
+    def hash(self, image):
+        return HASH_METHODS[self.method](image)
+
+    def lookup(self, image_hash):
+        """
+        (result, source, distance) of the nearest recent entry within
+        max_distance, or None. 'source' is whatever was stored with it.
+        """
+        with self._lock:
+            fresh = self._added >= time.monotonic() - self.max_age
+            if fresh.any():
+                differing = np.bitwise_xor(self._hashes, np.uint64(image_hash))
+                distances = np.unpackbits(differing.view(np.uint8)).reshape(self.max_entries, 64).sum(axis=1)
+                distances = np.where(fresh, distances, 65)
+                nearest = int(np.argmin(distances))
+                if distances[nearest] <= self.max_distance:
+                    self.stats["hits"] += 1
+                    result, source = self._entries[nearest]
+                    return result, source, int(distances[nearest])
+            self.stats["misses"] += 1
+            return None
+
+    def add(self, image_hash, result, source=None):
+        with self._lock:
+            slot = self._next
+            self._hashes[slot] = np.uint64(image_hash)
+            self._added[slot] = time.monotonic()
+            self._entries[slot] = (result, source)
+            self._next = (slot + 1) % self.max_entries
+            self.stats["inserts"] += 1
+
+    def get_stats(self):
+        """Hit/miss counters and the dedup hit rate, for the server's health output"""
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+            stats["entries"] = int(np.count_nonzero(self._added > -np.inf))
+            stats["max_entries"] = self.max_entries
+            stats["max_distance"] = self.max_distance
+            stats["method"] = self.method
+            return stats
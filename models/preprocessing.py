@@ -0,0 +1,96 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+class ImagePreprocessor:
+    """
+    Numpy replacement for a Hugging Face image processor's resize /
+    center-crop / rescale / normalize pipeline, with parameters read once
+    from its preprocessor_config.json. Batches are written into one
+    preallocated NCHW float32 buffer, and rescale and normalize are fused
+    into a single in-place multiply-add per channel. The array returned by
+    __call__ is a view of that buffer, valid until the next call; the
+    server's single micro-batcher worker consumes it before preprocessing
+    the next batch.
+    """
+
+    def __init__(self, shortest_edge=256, crop_size=(224, 224), resample=Image.Resampling.BILINEAR,
+                 rescale_factor=1 / 255, image_mean=(0.5, 0.5, 0.5), image_std=(0.5, 0.5, 0.5),
+                 do_resize=True, do_center_crop=True, do_rescale=True, do_normalize=True, max_batch_size=8):
+        self.shortest_edge = shortest_edge
+        self.crop_height, self.crop_width = crop_size
+        self.resample = Image.Resampling(resample)
+        self.do_resize = do_resize
+        self.do_center_crop = do_center_crop
+        if not do_center_crop:
+            raise ValueError("Batched preprocessing needs a fixed output size (do_center_crop)")
+        mean = np.asarray(image_mean if do_normalize else (0.0, 0.0, 0.0), dtype=np.float64)
+        std = np.asarray(image_std if do_normalize else (1.0, 1.0, 1.0), dtype=np.float64)
+        scale = rescale_factor if do_rescale else 1.0
+        # (x * scale - mean) / std == x * (scale / std) + (-mean / std)
+        self._multiplier = (scale / std).astype(np.float32).reshape(1, 3, 1, 1)
+        self._offset = (-mean / std).astype(np.float32).reshape(1, 3, 1, 1)
+        self._buffer = np.empty((max_batch_size, 3, self.crop_height, self.crop_width), dtype=np.float32)
+
+    @classmethod
+    def from_config(cls, config, max_batch_size=8):
+        """Build from a preprocessor config dict, a preprocessor_config.json path or a snapshot directory"""
+        if isinstance(config, (str, Path)):
+            path = Path(config)
+            with open(path / "preprocessor_config.json" if path.is_dir() else path) as f:
+                config = json.load(f)
+        size = config.get("size", {"shortest_edge": 256})
+        crop = config.get("crop_size", {"height": 224, "width": 224})
+        if isinstance(size, int):
+            size = {"shortest_edge": size}
+        if isinstance(crop, int):
+            crop = {"height": crop, "width": crop}
+        return cls(
+            shortest_edge=size["shortest_edge"],
+            crop_size=(crop["height"], crop["width"]),
+            resample=config.get("resample", Image.Resampling.BILINEAR),
+            rescale_factor=config.get("rescale_factor", 1 / 255),
+            image_mean=config.get("image_mean", (0.5, 0.5, 0.5)),
+            image_std=config.get("image_std", (0.5, 0.5, 0.5)),
+            do_resize=config.get("do_resize", True),
+            do_center_crop=config.get("do_center_crop", True),
+            do_rescale=config.get("do_rescale", True),
+            do_normalize=config.get("do_normalize", True),
+            max_batch_size=max_batch_size,
+        )
+
+    def resize_size(self, width, height):
+        """(width, height) with the shortest edge scaled to shortest_edge, as the processor computes it"""
+        short, long = (width, height) if width <= height else (height, width)
+        new_short, new_long = self.shortest_edge, int(self.shortest_edge * long / short)
+        return (new_short, new_long) if width <= height else (new_long, new_short)
+
+    def crop(self, image):
+        """Resized and center-cropped HWC uint8 array of an RGB PIL image"""
+        if self.do_resize:
+            image = image.resize(self.resize_size(*image.size), resample=self.resample)
+        pixels = np.asarray(image)
+        height, width = pixels.shape[:2]
+        top = (height - self.crop_height) // 2
+        left = (width - self.crop_width) // 2
+        if top < 0 or left < 0:
+            # Smaller than the crop: zero-pad around the image, like the processor
+            padded_height, padded_width = max(height, self.crop_height), max(width, self.crop_width)
+            pad_top, pad_left = -(-(padded_height - height) // 2), -(-(padded_width - width) // 2)
+            padded = np.zeros((padded_height, padded_width, 3), dtype=np.uint8)
+            padded[pad_top:pad_top + height, pad_left:pad_left + width] = pixels
+            pixels, top, left = padded, max(top + pad_top, 0), max(left + pad_left, 0)
+        return pixels[top:top + self.crop_height, left:left + self.crop_width]
+
+    def __call__(self, images):
+        """NCHW float32 pixel_values for a list of RGB PIL images (a view of the reused buffer)"""
+        if len(images) > len(self._buffer):
+            self._buffer = np.empty((len(images), *self._buffer.shape[1:]), dtype=np.float32)
+        batch = self._buffer[:len(images)]
+        for out, image in zip(batch, images):
+            np.copyto(out, self.crop(image.convert("RGB")).transpose(2, 0, 1), casting="unsafe")
+        np.multiply(batch, self._multiplier, out=batch)
+        np.add(batch, self._offset, out=batch)
+        return batch
@@ -0,0 +1,115 @@
+import cv2
+import numpy as np
+
+from models.resolution_policy import ResolutionPolicy
+
+# OpenCV hue range (0-180) counted as leaf tissue: brown and orange (necrotic or
+# scorched tissue) through yellow to green
+LEAF_HUE_RANGE = (5, 95)
+
+# Minimum HSV saturation and value for a leaf pixel; low enough for dry, tan lesions
+LEAF_MIN_SATURATION = 25
+LEAF_MIN_VALUE = 30
+
+class QualityGate:
+    """
+    Cheap pre-analysis checks that reject photos the analyzers cannot
+    diagnose: too small, blurry (variance of the Laplacian), badly exposed,
+    or showing too little leaf (share of brown-to-green coloured pixels).
+    Checks run on a thumbnail of at most thumbnail_size pixels on the
+    longest side, so metrics do not depend on the upload resolution.
+    """
+
+    def __init__(self, min_side=128, min_sharpness=20.0, min_brightness=40, max_brightness=225,
+                 max_clipped_fraction=0.6, min_leaf_coverage=0.15, thumbnail_size=256):
+        self.min_side = min_side
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped_fraction = max_clipped_fraction
+        self.min_leaf_coverage = min_leaf_coverage
+        self.thumbnail_size = thumbnail_size
+        self._thumbnail_policy = ResolutionPolicy(working_size=thumbnail_size)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a gate from the 'quality_gate' block of the disease_predictor config"""
+        return cls(
+            min_side=config.get("min_side", 128),
+            min_sharpness=config.get("min_sharpness", 20.0),
+            min_brightness=config.get("min_brightness", 40),
+            max_brightness=config.get("max_brightness", 225),
+            max_clipped_fraction=config.get("max_clipped_fraction", 0.6),
+            min_leaf_coverage=config.get("min_leaf_coverage", 0.15),
+            thumbnail_size=config.get("thumbnail_size", 256),
+        )
+
+    def thumbnail(self, bgr):
+        height, width = bgr.shape[:2]
+        scale = self.thumbnail_size / max(height, width)
+        if scale >= 1:
+            return bgr
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+
+    def measure(self, bgr):
+        """Sharpness, exposure and leaf-coverage metrics of a BGR image's thumbnail"""
+        thumbnail = self.thumbnail(bgr)
+        gray = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+        hsv = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2HSV)
+        leaf = cv2.inRange(hsv, (LEAF_HUE_RANGE[0], LEAF_MIN_SATURATION, LEAF_MIN_VALUE), (LEAF_HUE_RANGE[1], 255, 255))
+        histogram = np.bincount(gray.ravel(), minlength=256)
+        return {
+            'sharpness': float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+            'brightness': float(gray.mean()),
+            'dark_fraction': float(histogram[:10].sum() / gray.size),
+            'bright_fraction': float(histogram[246:].sum() / gray.size),
+            'leaf_coverage': float(np.count_nonzero(leaf) / leaf.size),
+        }
+
+    def check(self, bgr, source_size=None):
+        """
+        Run every check on a decoded BGR image. 'source_size' is the (width,
+        height) stored in the file when bgr was decoded at reduced size.
+        Returns {'passed', 'reasons', 'metrics'}; each reason has a 'code'
+        and a user-facing 'message'.
+        """
+        width, height = source_size or (bgr.shape[1], bgr.shape[0])
+        metrics = self.measure(bgr)
+        reasons = []
+
+        def reject(code, message):
+            reasons.append({'code': code, 'message': message})
+
+        if min(width, height) < self.min_side:
+            reject('too_small', f"Image is too small ({width}x{height}); use at least {self.min_side} pixels "
+                                f"on the short side")
+        if metrics['sharpness'] < self.min_sharpness:
+            reject('blurry', f"Image is too blurry (sharpness {metrics['sharpness']:.1f}, need {self.min_sharpness}); "
+                             f"hold the camera steady and focus on the leaf")
+        if metrics['brightness'] < self.min_brightness or metrics['dark_fraction'] > self.max_clipped_fraction:
+            reject('underexposed', "Image is too dark; retake it in daylight or with more light on the leaf")
+        if metrics['brightness'] > self.max_brightness or metrics['bright_fraction'] > self.max_clipped_fraction:
+            reject('overexposed', "Image is overexposed; avoid direct glare and retake it in shade")
+        if metrics['leaf_coverage'] < self.min_leaf_coverage:
+            reject('no_leaf', f"Too little leaf visible ({metrics['leaf_coverage']:.0%} of the image); "
+                              f"fill the frame with the affected leaf")
+
+        return {
+            'passed': not reasons,
+            'reasons': reasons,
+            'metrics': {name: round(value, 4) for name, value in metrics.items()},
+        }
+
+    def check_bytes(self, image_bytes):
+        """Decode encoded image bytes straight to a thumbnail and check it"""
+        context, source_size = self._thumbnail_policy.open(image_bytes)
+        return self.check(context.bgr, source_size)
+
+def rejection_diagnosis(report):
+    """Diagnosis dict returned for an image the gate rejected"""
+    return {
+        "disease": "Image Rejected",
+        "recommendations": " ".join(reason['message'] for reason in report['reasons']),
+        "quality": report,
+    }
@@ -0,0 +1,100 @@
+import io
+import math
+
+import numpy as np
+from PIL import Image
+import cv2
+from models.image_context import ImageContext
+
+# EXIF orientation is ignored to match what Pillow decodes
+_IMDECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION,
+    2: cv2.IMREAD_REDUCED_COLOR_2 | cv2.IMREAD_IGNORE_ORIENTATION,
+    4: cv2.IMREAD_REDUCED_COLOR_4 | cv2.IMREAD_IGNORE_ORIENTATION,
+    8: cv2.IMREAD_REDUCED_COLOR_8 | cv2.IMREAD_IGNORE_ORIENTATION,
+}
+
+class ResolutionPolicy:
+    """
+    Decides the resolution an uploaded image is analyzed at.
+    Images are decoded by OpenCV straight into one BGR buffer. Images larger
+    than working_size (longest side, in pixels) are reduced; JPEGs are reduced
+    at decode time (1/2, 1/4 or 1/8 scale DCT decoding) before a final resize,
+    so the full-size frame is never materialized. With coarse_to_fine enabled,
+    callers re-run the analysis at full resolution when the coarse result lies
+    close to a decision threshold.
+    """
+
+    def __init__(self, working_size=1024, jpeg_draft=True, coarse_to_fine=False, decision_margin=0.1):
+        self.working_size = working_size
+        self.jpeg_draft = jpeg_draft
+        self.coarse_to_fine = coarse_to_fine
+        self.decision_margin = decision_margin
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a policy from the 'resolution' block of the disease_predictor config"""
+        return cls(
+            working_size=config.get("working_size", 1024),
+            jpeg_draft=config.get("jpeg_draft", True),
+            coarse_to_fine=config.get("coarse_to_fine", False),
+            decision_margin=config.get("decision_margin", 0.1),
+        )
+
+    def settings(self):
+        """Settings that affect analysis results (used for cache namespacing)"""
+        return {
+            "working_size": self.working_size,
+            "jpeg_draft": self.jpeg_draft,
+            "coarse_to_fine": self.coarse_to_fine,
+            "decision_margin": self.decision_margin,
+        }
+
+    def open(self, image_bytes, full_resolution=False):
+        """
+        Decode encoded image bytes (bytes, bytearray or memoryview) under this policy.
+        Returns (context, source_size): an ImageContext over a single BGR buffer
+        and the (width, height) stored in the file.
+        """
+        buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+        header = Image.open(io.BytesIO(image_bytes))
+        source_size = header.size
+        max_side = None if full_resolution else self.working_size
+
+        reduction = 1
+        target = source_size
+        if max_side and max(source_size) > max_side:
+            scale = max_side / max(source_size)
+            target = (max(1, math.ceil(source_size[0] * scale)), max(1, math.ceil(source_size[1] * scale)))
+            if self.jpeg_draft and header.format == 'JPEG':
+                # Largest DCT reduction that still decodes to at least the target size
+                for factor in (8, 4, 2):
+                    if source_size[0] // factor >= target[0] and source_size[1] // factor >= target[1]:
+                        reduction = factor
+                        break
+
+        bgr = cv2.imdecode(buffer, _IMDECODE_FLAGS[reduction])
+        if bgr is None:
+            # Formats OpenCV cannot decode go through Pillow
+            rgb = np.asarray(header.convert('RGB'))
+            if max(rgb.shape[:2]) > (max_side or max(rgb.shape[:2])):
+                rgb = cv2.resize(rgb, target, interpolation=cv2.INTER_AREA)
+            return ImageContext(rgb=rgb), source_size
+
+        if max(bgr.shape[:2]) > (max_side or max(bgr.shape[:2])):
+            bgr = cv2.resize(bgr, target, interpolation=cv2.INTER_AREA)
+        return ImageContext(bgr=bgr), source_size
+
+    def can_escalate(self, source_size, analyzed_size):
+        """True if coarse-to-fine is on and the analysis ran below source resolution"""
+        return self.coarse_to_fine and tuple(analyzed_size) != tuple(source_size)
+
+    @staticmethod
+    def describe(source_size, analyzed_size, escalated=False):
+        """Resolution report attached to a diagnosis"""
+        return {
+            "source": list(source_size),
+            "analyzed": list(analyzed_size),
+            "scale": round(analyzed_size[0] / source_size[0], 4) if source_size[0] else 1.0,
+            "escalated": escalated,
+        }
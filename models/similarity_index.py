@@ -0,0 +1,400 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from models.feature_records import MAX_DOMINANT_COLORS, to_feature_records
+
+# Approximate nearest-neighbour search; without it search is exact brute force
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    faiss = None
+    FAISS_AVAILABLE = False
+
+# (record field, scale, log) - heavy-tailed features are log1p'd before scaling
+VECTOR_FEATURES = [
+    ('green_dominance', 1, False),
+    ('discoloration_index', 1, False),
+    ('hue_variance', 10, True),
+    ('saturation_mean', 255, False),
+    ('brightness_mean', 255, False),
+    ('variance', 10, True),
+    ('edge_density', 1, False),
+    ('texture_contrast', 5, True),
+    ('roughness_index', 10, True),
+    ('spot_count', 5, True),
+    ('avg_spot_size', 15, True),
+    ('shape_irregularity', 1, False),
+    ('size_variance', 25, True),
+    ('brightness_uniformity', 100, False),
+    ('color_balance', 100, False),
+    ('dark_lesion_ratio', 1, False),
+    ('bright_discoloration_ratio', 1, False),
+    ('edge_damage_intensity', 1, False),
+    ('anomaly_score', 1, False),
+]
+
+# Scalars, mean and std RGB, then the dominant colors
+FEATURE_VECTOR_DIM = len(VECTOR_FEATURES) + 6 + 3 * MAX_DOMINANT_COLORS
+
+def feature_vectors(records):
+    """
+    (n, FEATURE_VECTOR_DIM) float32 similarity vectors for FEATURE_DTYPE records.
+    Features are brought to comparable ranges; dominant colors are ordered by
+    brightness and missing ones are filled with the mean color.
+    """
+    columns = []
+    for name, scale, log in VECTOR_FEATURES:
+        values = records[name].astype(np.float64)
+        if log:
+            values = np.log1p(np.maximum(values, 0))
+        columns.append(values / scale)
+
+    mean_rgb = records['mean_rgb'].astype(np.float64)
+    colors = records['dominant_colors'].astype(np.float64)
+    missing = np.arange(MAX_DOMINANT_COLORS)[None, :] >= records['n_dominant_colors'][:, None]
+    colors = np.where(missing[:, :, None], mean_rgb[:, None, :], colors)
+    order = np.argsort(colors.sum(axis=2), axis=1, kind='stable')
+    colors = np.take_along_axis(colors, order[:, :, None], axis=1)
+
+    vectors = np.column_stack(columns + [
+        mean_rgb / 255,
+        records['std_rgb'] / 128,
+        colors.reshape(len(records), -1) / 255,
+    ])
+    return vectors.astype(np.float32)
+
+class _NumpyFlatIndex:
+    """Exact L2 search with the faiss.IndexFlatL2 interface, used without faiss"""
+
+    def __init__(self, dim, vectors=None):
+        self.d = dim
+        self._vectors = np.zeros((0, dim), dtype=np.float32) if vectors is None else vectors
+        self._norms = None
+        self._pending = []
+
+    @property
+    def ntotal(self):
+        return len(self._vectors) + sum(len(block) for block in self._pending)
+
+    def add(self, vectors):
+        self._pending.append(np.array(vectors, dtype=np.float32).reshape(-1, self.d))
+
+    def search(self, queries, k):
+        if self._pending:
+            self._vectors = np.concatenate([self._vectors] + self._pending)
+            self._pending = []
+            self._norms = None
+        if self._norms is None:
+            self._norms = np.einsum('ij,ij->i', self._vectors, self._vectors)
+        distances = np.maximum(
+            self._norms[None, :] - 2 * queries @ self._vectors.T + (queries ** 2).sum(axis=1)[:, None], 0
+        )
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < len(self._vectors) else \
+            np.tile(np.arange(len(self._vectors)), (len(queries), 1))
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1, kind='stable')
+        return np.take_along_axis(nearest_distances, order, axis=1), np.take_along_axis(nearest, order, axis=1)
+
+class SimilarityIndex:
+    """
+    Persistent nearest-neighbour index of past cases.
+
+    A directory holds vectors.f32 (append-only float32 rows), cases.jsonl
+    (one case dict per row, same order) and, with faiss, base.faiss: the
+    index over all rows as of the last compact(). Rows added since then are
+    searched in an in-memory delta index, so adds are cheap and the base is
+    memory-mapped on startup. A newer case for the same image_key supersedes
+    the old row until compaction drops it. Without faiss the memory-mapped
+    vectors are searched exactly.
+
+    Once compact_every rows are pending, add() starts compact() in a
+    background thread, so neither rewriting the files nor building the HNSW
+    base (from hnsw_threshold rows) runs on the caller's request.
+    """
+
+    def __init__(self, directory, dim, compact_every=1000, hnsw_threshold=50000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.compact_every = compact_every
+        self.hnsw_threshold = hnsw_threshold
+        self._vectors_path = self.directory / "vectors.f32"
+        self._cases_path = self.directory / "cases.jsonl"
+        self._base_path = self.directory / "base.faiss"
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compaction_thread = None
+        self._compact_at = compact_every
+        self.compaction_stats = {"compactions": 0, "errors": 0, "last_seconds": None}
+        self.last_error = None
+        self._load()
+
+    @classmethod
+    def from_config(cls, config, dim=FEATURE_VECTOR_DIM, name="features"):
+        """Build an index from the 'similarity' block of the disease_predictor config"""
+        return cls(
+            os.path.join(config.get("directory", "temp/similarity_index"), name),
+            dim,
+            compact_every=config.get("compact_every", 1000),
+            hnsw_threshold=config.get("hnsw_threshold", 50000),
+        )
+
+    def _read_cases(self):
+        cases = []
+        if self._cases_path.exists():
+            with open(self._cases_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        cases.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A torn final line from an interrupted write
+                        break
+        return cases
+
+    def _load(self):
+        cases = self._read_cases()
+        row_bytes = 4 * self.dim
+        rows = self._vectors_path.stat().st_size // row_bytes if self._vectors_path.exists() else 0
+
+        # Keep vectors and cases aligned after an interrupted add
+        count = min(rows, len(cases))
+        if self._vectors_path.exists() and self._vectors_path.stat().st_size != count * row_bytes:
+            os.truncate(self._vectors_path, count * row_bytes)
+        if len(cases) != count:
+            cases = cases[:count]
+            self._write_cases(self._cases_path, cases)
+
+        self.cases = []
+        self._latest = {}
+        self._superseded = set()
+        self._remember(cases)
+
+        vectors = self._map_vectors(count)
+        if FAISS_AVAILABLE:
+            self._base = self._read_base(count)
+            self._delta = faiss.IndexFlatL2(self.dim)
+            if self._base.ntotal < count:
+                self._delta.add(np.ascontiguousarray(vectors[self._base.ntotal:]))
+        else:
+            self._base = _NumpyFlatIndex(self.dim, vectors)
+            self._delta = _NumpyFlatIndex(self.dim)
+        self._base_count = self._base.ntotal
+
+    def _map_vectors(self, count):
+        if not count:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+
+    def _read_base(self, count):
+        if self._base_path.exists():
+            try:
+                base = faiss.read_index(str(self._base_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                base = faiss.read_index(str(self._base_path))
+            if base.d == self.dim and base.ntotal <= count:
+                return base
+        return faiss.IndexFlatL2(self.dim)
+
+    def _remember(self, cases):
+        for case in cases:
+            row = len(self.cases)
+            key = case.get("image_key")
+            if key is not None:
+                if key in self._latest:
+                    self._superseded.add(self._latest[key])
+                self._latest[key] = row
+            self.cases.append(case)
+
+    @staticmethod
+    def _write_cases(path, cases):
+        with open(path, "w", encoding="utf-8") as f:
+            for case in cases:
+                f.write(json.dumps(case) + "\n")
+
+    def __contains__(self, image_key):
+        return image_key in self._latest
+
+    def __len__(self):
+        return len(self.cases) - len(self._superseded)
+
+    def add(self, vectors, cases):
+        """Append cases with their vectors; returns the new row ids"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) != len(cases):
+            raise ValueError(f"{len(vectors)} vectors for {len(cases)} cases")
+        with self._lock:
+            first = len(self.cases)
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._cases_path, "a", encoding="utf-8") as f:
+                for case in cases:
+                    f.write(json.dumps(case) + "\n")
+            self._remember(cases)
+            self._delta.add(vectors)
+            due = self.compact_every and self._delta.ntotal >= self._compact_at
+        if due:
+            self.compact_in_background()
+        return list(range(first, first + len(cases)))
+
+    def search(self, vector, k=5, exclude_key=None):
+        """
+        The k nearest live cases to 'vector', nearest first. Each is the stored
+        case plus its row 'id' and L2 'distance'. Cases with image_key
+        'exclude_key' (typically the query image itself) are skipped.
+        """
+        query = np.ascontiguousarray(vector, dtype=np.float32).reshape(1, self.dim)
+        with self._lock:
+            fetch = k + len(self._superseded) + (exclude_key in self._latest)
+            hits = []
+            for index, offset in ((self._base, 0), (self._delta, self._base_count)):
+                if index.ntotal:
+                    distances, rows = index.search(query, min(fetch, index.ntotal))
+                    hits.extend((float(d), int(row) + offset) for d, row in zip(distances[0], rows[0]) if row >= 0)
+            hits.sort()
+
+            matches = []
+            for distance, row in hits:
+                case = self.cases[row]
+                if row in self._superseded or (exclude_key is not None and case.get("image_key") == exclude_key):
+                    continue
+                matches.append({**case, "id": row, "distance": round(float(np.sqrt(max(distance, 0))), 6)})
+                if len(matches) == k:
+                    break
+            return matches
+
+    def compact(self):
+        """
+        Drop superseded rows and rebuild the base index over everything else.
+        The new files and base are built without holding the search lock;
+        cases added meanwhile are carried over, and the in-memory index is
+        only swapped once the new files are in place.
+        """
+        with self._compact_lock:
+            start = time.perf_counter()
+            with self._lock:
+                count = len(self.cases)
+                keep = [row for row in range(count) if row not in self._superseded]
+                cases = [self.cases[row] for row in keep]
+            vectors = np.fromfile(self._vectors_path, dtype=np.float32, count=count * self.dim)
+            vectors = vectors.reshape(-1, self.dim)[keep]
+
+            vectors_tmp = self._vectors_path.with_suffix(".tmp")
+            cases_tmp = self._cases_path.with_suffix(".tmp")
+            base_tmp = self._base_path.with_suffix(".tmp")
+            try:
+                vectors.tofile(vectors_tmp)
+                self._write_cases(cases_tmp, cases)
+                base = None
+                if FAISS_AVAILABLE:
+                    if len(vectors) >= self.hnsw_threshold:
+                        base = faiss.IndexHNSWFlat(self.dim, 32)
+                    else:
+                        base = faiss.IndexFlatL2(self.dim)
+                    base.add(vectors)
+                    faiss.write_index(base, str(base_tmp))
+
+                with self._lock:
+                    # Rows added while the base was built go to the new delta
+                    added_cases = self.cases[count:]
+                    added = np.fromfile(self._vectors_path, dtype=np.float32, offset=4 * self.dim * count,
+                                        count=len(added_cases) * self.dim).reshape(-1, self.dim)
+                    with open(vectors_tmp, "ab") as f:
+                        f.write(added.tobytes())
+                    with open(cases_tmp, "a", encoding="utf-8") as f:
+                        for case in added_cases:
+                            f.write(json.dumps(case) + "\n")
+                    if base is not None:
+                        os.replace(base_tmp, self._base_path)
+                    os.replace(vectors_tmp, self._vectors_path)
+                    os.replace(cases_tmp, self._cases_path)
+                    self._swap(base, len(vectors), cases + added_cases, added)
+                    self._compact_at = self.compact_every
+            except Exception:
+                for path in (vectors_tmp, cases_tmp, base_tmp):
+                    path.unlink(missing_ok=True)
+                raise
+            self.compaction_stats["compactions"] += 1
+            self.compaction_stats["last_seconds"] = round(time.perf_counter() - start, 3)
+
+    def _swap(self, base, base_rows, cases, added):
+        self.cases = []
+        self._latest = {}
+        self._superseded = set()
+        self._remember(cases)
+        if FAISS_AVAILABLE:
+            self._base = base
+            self._delta = faiss.IndexFlatL2(self.dim)
+        else:
+            self._base = _NumpyFlatIndex(self.dim, self._map_vectors(base_rows))
+            self._delta = _NumpyFlatIndex(self.dim)
+        if len(added):
+            self._delta.add(added)
+        self._base_count = self._base.ntotal
+
+    def compact_in_background(self):
+        """Start compact() in a daemon thread unless one is already running; returns the thread or None"""
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return None
+            self._compaction_thread = threading.Thread(target=self._compact_logged, name="similarity-compact",
+                                                       daemon=True)
+            self._compaction_thread.start()
+            return self._compaction_thread
+
+    def _compact_logged(self):
+        try:
+            self.compact()
+        except Exception as e:
+            # The current files and index stay in use; retry after another compact_every adds
+            with self._lock:
+                self._compact_at = self._delta.ntotal + self.compact_every
+            self.compaction_stats["errors"] += 1
+            self.last_error = str(e)
+
+    def wait_for_compaction(self, timeout=None):
+        """Block until a background compaction (if any) has finished"""
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "backend": "faiss" if FAISS_AVAILABLE else "numpy",
+                "dim": self.dim,
+                "cases": len(self),
+                "rows": len(self.cases),
+                "superseded": len(self._superseded),
+                "indexed": self._base_count,
+                "pending": self._delta.ntotal,
+                "compacting": self._compaction_thread is not None and self._compaction_thread.is_alive(),
+                **self.compaction_stats,
+                **({"last_error": self.last_error} if self.last_error else {}),
+            }
+
+class CaseIndex(SimilarityIndex):
+    """SimilarityIndex over feature_vectors of perform_dynamic_analysis results"""
+
+    def __init__(self, directory, dim=FEATURE_VECTOR_DIM, compact_every=1000, hnsw_threshold=50000):
+        super().__init__(directory, dim, compact_every, hnsw_threshold)
+
+    def add_analysis(self, image_key, analysis_results, diagnosis, **extra):
+        """Index one diagnosed image"""
+        case = {
+            "image_key": image_key,
+            "disease": diagnosis.get("disease"),
+            "recommendations": diagnosis.get("recommendations"),
+            "added_at": time.time(),
+            **extra,
+        }
+        return self.add(feature_vectors(to_feature_records([analysis_results])), [case])[0]
+
+    def similar_to(self, analysis_results, k=5, exclude_key=None):
+        """Past cases whose features are nearest to 'analysis_results'"""
+        return self.search(feature_vectors(to_feature_records([analysis_results]))[0], k, exclude_key)
@@ -0,0 +1,183 @@
+import bisect
+import contextlib
+import threading
+import time
+import tracemalloc
+
+# Upper bounds (seconds) of the wall-time histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# tracemalloc and its peak are process-global, so profilers share one tracing
+# session: the first memory-tracking profiler starts it, the last one to finish
+# stops it (unless it was already running), and a stage only resets and reads
+# the peak when no other stage runs at the same time.
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+_active_stages = 0
+_stages_started = 0
+
+def _acquire_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owned = True
+        _tracing_users += 1
+
+def _release_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+def _enter_stage():
+    """Start a memory-tracked stage; returns (stage sequence number, start bytes or None if shared)"""
+    global _active_stages, _stages_started
+    with _tracing_lock:
+        _active_stages += 1
+        _stages_started += 1
+        if _active_stages > 1:
+            return _stages_started, None
+        tracemalloc.reset_peak()
+        return _stages_started, tracemalloc.get_traced_memory()[0]
+
+def _exit_stage(sequence, start_bytes):
+    """Peak bytes of a stage, or None if another stage overlapped it"""
+    global _active_stages
+    with _tracing_lock:
+        _active_stages -= 1
+        if start_bytes is None or _stages_started != sequence:
+            return None
+        return max(0, tracemalloc.get_traced_memory()[1] - start_bytes)
+
+class StageProfiler:
+    """
+    Records wall time, CPU time, peak allocated bytes and input resolution
+    (height, width) for each named stage of one analysis. CPU time is
+    process-wide, so it includes OpenCV worker threads. Peak bytes come from
+    tracemalloc, shared by all profilers in the process until the last one
+    finishes; the peak is only attributed to stages that ran while no other
+    stage did (others count under 'memory_overlapped'). Stages must not be
+    nested.
+    """
+
+    enabled = True
+
+    def __init__(self, track_memory=True):
+        self.stages = {}
+        self.track_memory = track_memory
+        self._tracing = False
+        if track_memory:
+            _acquire_tracing()
+            self._tracing = True
+
+    @contextlib.contextmanager
+    def stage(self, name, resolution=None):
+        """Measure the enclosed block as stage 'name'; repeated stages accumulate"""
+        if self._tracing:
+            sequence, start_bytes = _enter_stage()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {
+                'wall_time': 0.0, 'cpu_time': 0.0, 'peak_bytes': None, 'resolution': None, 'calls': 0
+            })
+            entry['wall_time'] += time.perf_counter() - start_wall
+            entry['cpu_time'] += time.process_time() - start_cpu
+            entry['calls'] += 1
+            if self._tracing:
+                peak = _exit_stage(sequence, start_bytes)
+                if peak is None:
+                    entry['memory_overlapped'] = entry.get('memory_overlapped', 0) + 1
+                else:
+                    entry['peak_bytes'] = max(entry['peak_bytes'] or 0, peak)
+            if resolution is not None:
+                entry['resolution'] = [int(side) for side in resolution]
+
+    def set_resolution(self, name, resolution):
+        """Record the resolution of a stage once it is known (e.g. after decoding)"""
+        if name in self.stages:
+            self.stages[name]['resolution'] = [int(side) for side in resolution]
+
+    def finish(self):
+        """Release tracemalloc (stopped once no profiler uses it) and return the report"""
+        if self._tracing:
+            _release_tracing()
+            self._tracing = False
+        return self.report()
+
+    def report(self):
+        """Per-stage measurements, in the order the stages first ran"""
+        return {
+            name: {**entry, 'wall_time': round(entry['wall_time'], 6), 'cpu_time': round(entry['cpu_time'], 6)}
+            for name, entry in self.stages.items()
+        }
+
+class _NullProfiler:
+    """Stand-in used when profiling is off: every stage is a shared no-op context"""
+
+    enabled = False
+    _context = contextlib.nullcontext()
+
+    def stage(self, name, resolution=None):
+        return self._context
+
+    def set_resolution(self, name, resolution):
+        pass
+
+    def finish(self):
+        return {}
+
+NULL_PROFILER = _NullProfiler()
+
+class StageHistograms:
+    """In-process histograms of stage timings, fed by finished profiles"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, report):
+        """Add one StageProfiler report"""
+        with self._lock:
+            for name, entry in report.items():
+                stats = self._stages.setdefault(name, {
+                    'count': 0,
+                    'wall_time_sum': 0.0,
+                    'cpu_time_sum': 0.0,
+                    'max_peak_bytes': 0,
+                    'bucket_counts': [0] * (len(self.buckets) + 1),
+                })
+                stats['count'] += 1
+                stats['wall_time_sum'] += entry['wall_time']
+                stats['cpu_time_sum'] += entry['cpu_time']
+                stats['max_peak_bytes'] = max(stats['max_peak_bytes'], entry.get('peak_bytes') or 0)
+                stats['bucket_counts'][bisect.bisect_left(self.buckets, entry['wall_time'])] += 1
+
+    def snapshot(self):
+        """Cumulative (Prometheus-style 'le') bucket counts plus sums per stage"""
+        with self._lock:
+            snapshot = {}
+            for name, stats in self._stages.items():
+                cumulative, running = {}, 0
+                for bound, count in zip(self.buckets + (float('inf'),), stats['bucket_counts']):
+                    running += count
+                    cumulative['+Inf' if bound == float('inf') else str(bound)] = running
+                snapshot[name] = {
+                    'count': stats['count'],
+                    'wall_time_sum': round(stats['wall_time_sum'], 6),
+                    'cpu_time_sum': round(stats['cpu_time_sum'], 6),
+                    'wall_time_mean': round(stats['wall_time_sum'] / stats['count'], 6),
+                    'max_peak_bytes': stats['max_peak_bytes'],
+                    'buckets': cumulative,
+                }
+            return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
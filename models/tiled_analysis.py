@@ -0,0 +1,304 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from models.disease_predictor import (
+    PREDICTOR_CONFIG,
+    diagnosis_grade,
+    generate_diagnosis,
+    perform_dynamic_analysis,
+    score_diagnosis,
+)
+from models.image_context import ImageContext
+
+# Windowed reads of GeoTIFF / large TIFF mosaics
+try:
+    import rasterio
+    from rasterio.enums import ColorInterp
+    from rasterio.windows import Window
+    RASTERIO_AVAILABLE = True
+except ImportError:
+    rasterio = None
+    ColorInterp = None
+    Window = None
+    RASTERIO_AVAILABLE = False
+
+TILING_CONFIG = PREDICTOR_CONFIG.get("tiling", {})
+DEFAULT_TILE_SIZE = TILING_CONFIG.get("tile_size", 1024)
+
+# Without rasterio Pillow decodes the whole file, so larger images are refused
+MAX_FULL_DECODE_PIXELS = TILING_CONFIG.get("max_full_decode_pixels", 64_000_000)
+
+# Data that is not 8-bit is mapped to 1-255 between these percentiles (0 is no-data)
+RESCALE_PERCENTILES = (2, 98)
+
+# Pixels sampled to find the rescaling range
+RANGE_SAMPLE_PIXELS = 1_000_000
+
+# Pillow modes decoded as another mode: palette and other colour spaces to RGB(A)
+_PILLOW_CONVERSIONS = {'P': 'RGB', 'PA': 'RGBA', 'LA': 'RGBA', '1': 'L', 'CMYK': 'RGB', 'YCbCr': 'RGB',
+                       'LAB': 'RGB', 'HSV': 'RGB'}
+
+# Features that are totals rather than per-pixel averages
+_SUMMED_FEATURES = {'spot_count'}
+
+def value_range(sample, percentiles=RESCALE_PERCENTILES):
+    """
+    Per-band (low, high) rescaling range of an (H, W, C) sample of non-8-bit
+    data, over its valid pixels; None for 8-bit data, which is used as is.
+    """
+    if sample.dtype == np.uint8:
+        return None
+    if sample.dtype == np.bool_ or sample.dtype.kind not in 'uif':
+        raise ValueError(f"Tiled analysis needs integer or float image data, got {sample.dtype}")
+    sample = sample.reshape(-1, sample.shape[-1]).astype(np.float64)
+    colour = sample[:, :3] if sample.shape[1] == 4 else sample
+    values = colour[_valid_pixels(colour)]
+    if len(values) == 0:
+        return np.zeros(colour.shape[1]), np.ones(colour.shape[1])
+    low, high = np.percentile(values, percentiles, axis=0)
+    return low, np.maximum(high, low + np.finfo(np.float32).eps * np.maximum(np.abs(low), 1))
+
+def _valid_pixels(colour):
+    """Pixels that are not no-data: some band non-zero and no band NaN"""
+    return colour.any(axis=-1) & ~np.isnan(colour).any(axis=-1)
+
+def to_uint8(tile, scale):
+    """
+    8-bit (H, W, C) tile from raw data: colour bands are mapped from the
+    'scale' range (see value_range) to 1-255 with no-data pixels kept at 0,
+    and an alpha band becomes 0 / 255.
+    """
+    if scale is None:
+        return tile
+    low, high = scale
+    tile = tile.astype(np.float64)
+    colour = tile[:, :, :3] if tile.shape[2] == 4 else tile
+    scaled = np.clip(1 + (colour - low) * (254 / (high - low)), 1, 255)
+    scaled = np.where(_valid_pixels(colour)[:, :, None], np.rint(scaled), 0).astype(np.uint8)
+    if tile.shape[2] == 4:
+        alpha = np.where(tile[:, :, 3] > 0, 255, 0).astype(np.uint8)
+        scaled = np.dstack([scaled, alpha])
+    return scaled
+
+class ArrayTileSource:
+    """
+    Windowed reads from an (H, W), (H, W, 3) or (H, W, 4) array. np.memmap
+    arrays (and .npy files opened with mmap_mode='r') are paged in one window
+    at a time, so only the current tile is resident. 16-bit and float data
+    are rescaled to 8-bit with one range for the whole mosaic.
+    """
+
+    def __init__(self, array):
+        if array.ndim not in (2, 3):
+            raise ValueError(f"Expected an (H, W) or (H, W, C) array, got shape {array.shape}")
+        self.array = array
+        self.height, self.width = array.shape[:2]
+        step = max(1, int(np.sqrt(self.height * self.width / RANGE_SAMPLE_PIXELS)))
+        self.scale = value_range(self._bands(array[::step, ::step]))
+
+    @staticmethod
+    def _bands(array):
+        return array[:, :, None] if array.ndim == 2 else array
+
+    def read(self, left, top, width, height):
+        tile = self._bands(self.array[top:top + height, left:left + width])
+        return np.ascontiguousarray(to_uint8(tile, self.scale))
+
+    def close(self):
+        pass
+
+class RasterioTileSource:
+    """
+    Windowed reads from any raster rasterio can open (GeoTIFF orthomosaics).
+    Palette rasters are expanded through their colour map; 16-bit and float
+    rasters are rescaled to 8-bit with a range taken from a decimated read.
+    """
+
+    def __init__(self, path):
+        self.dataset = rasterio.open(path)
+        self.height, self.width = self.dataset.height, self.dataset.width
+        self.bands = list(range(1, min(self.dataset.count, 4) + 1))
+        self.palette = None
+        if self.dataset.count == 1 and self.dataset.colorinterp[0] == ColorInterp.palette:
+            self.palette = np.zeros((256, 4), dtype=np.uint8)
+            for index, colour in self.dataset.colormap(1).items():
+                if index < 256:
+                    self.palette[index] = colour
+            self.scale = None
+        else:
+            step = max(1, int(np.sqrt(self.height * self.width / RANGE_SAMPLE_PIXELS)))
+            sample = self.dataset.read(self.bands, out_shape=(
+                len(self.bands), max(1, self.height // step), max(1, self.width // step)))
+            self.scale = value_range(np.moveaxis(sample, 0, -1))
+
+    def read(self, left, top, width, height):
+        tile = np.moveaxis(self.dataset.read(self.bands, window=Window(left, top, width, height)), 0, -1)
+        if self.palette is not None:
+            return self.palette[tile[:, :, 0]]
+        return np.ascontiguousarray(to_uint8(tile, self.scale))
+
+    def close(self):
+        self.dataset.close()
+
+def open_tile_source(source):
+    """
+    Open a mosaic for windowed reading.
+    Accepts an array (including np.memmap), a .npy file (memory-mapped), or
+    an image path. Paths are read through rasterio when it is installed;
+    otherwise Pillow decodes the whole file once, which is refused above
+    MAX_FULL_DECODE_PIXELS.
+    """
+    if isinstance(source, np.ndarray):
+        return ArrayTileSource(source)
+    path = os.fspath(source)
+    if path.lower().endswith('.npy'):
+        return ArrayTileSource(np.load(path, mmap_mode='r'))
+    if RASTERIO_AVAILABLE:
+        return RasterioTileSource(path)
+    return ArrayTileSource(decode_with_pillow(path))
+
+def decode_with_pillow(path, max_pixels=None):
+    """
+    Whole-file decode for when rasterio is missing, as an array of raw
+    values. Palette and other colour modes are converted to RGB(A).
+    """
+    max_pixels = max_pixels or MAX_FULL_DECODE_PIXELS
+    with Image.open(path) as image:
+        width, height = image.size
+        if width * height > max_pixels:
+            raise RuntimeError(
+                f"{path} is {width}x{height} pixels; without rasterio it would be decoded whole "
+                f"(limit {max_pixels} pixels). Install rasterio for windowed reads (pip install rasterio)"
+            )
+        mode = _PILLOW_CONVERSIONS.get(image.mode)
+        if image.mode == 'P' and 'transparency' in image.info:
+            mode = 'RGBA'
+        return np.asarray(image.convert(mode) if mode else image)
+
+def tile_edges(length, tile_size):
+    """
+    Tile start/stop offsets along one axis. A remainder shorter than half a
+    tile is folded into the last tile instead of being analyzed on its own.
+    """
+    starts = list(range(0, length, tile_size))
+    if len(starts) > 1 and length - starts[-1] < tile_size // 2:
+        starts.pop()
+    stops = starts[1:] + [length]
+    return list(zip(starts, stops))
+
+def tile_to_rgb(tile):
+    """
+    Convert a raw tile to RGB. Returns (rgb, valid_fraction) where
+    valid_fraction is the share of pixels that are not no-data (alpha 0, or
+    all-zero pixels for sources without alpha). A partly empty tile is
+    cropped to the bounding box of its valid pixels, and the no-data pixels
+    left inside it take the valid pixels' median colour, so the black fill
+    does not read as dark, necrotic or spotted leaf.
+    """
+    if tile.ndim == 2:
+        tile = tile[:, :, None]
+    channels = tile.shape[2]
+    if channels == 4:
+        valid = tile[:, :, 3] > 0
+        rgb = tile[:, :, :3]
+    else:
+        rgb = tile if channels == 3 else np.repeat(tile[:, :, :1], 3, axis=2)
+        valid = rgb.any(axis=2)
+    valid_count = np.count_nonzero(valid)
+    if 0 < valid_count < valid.size:
+        rows, cols = np.flatnonzero(valid.any(axis=1)), np.flatnonzero(valid.any(axis=0))
+        box = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+        rgb, box_valid = rgb[box].copy(), valid[box]
+        rgb[~box_valid] = np.median(rgb[box_valid], axis=0).astype(rgb.dtype)
+    return np.ascontiguousarray(rgb), float(valid_count) / valid.size
+
+def aggregate_tile_results(tile_results):
+    """
+    Combine per-tile analysis results into whole-image features. Scalar
+    features are averaged weighted by tile pixel count; totals such as
+    spot_count are averaged too (so thresholds keep their per-image meaning)
+    and their sums are reported separately.
+    """
+    total_weight = sum(weight for weight, _ in tile_results)
+    aggregated, totals = {}, {}
+    for weight, results in tile_results:
+        for section, features in results.items():
+            target = aggregated.setdefault(section, {})
+            for name, value in features.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float, np.number)):
+                    continue
+                target[name] = target.get(name, 0.0) + float(value) * weight / total_weight
+                if name in _SUMMED_FEATURES:
+                    totals[name] = totals.get(name, 0) + value
+    for features in aggregated.values():
+        for name in _SUMMED_FEATURES & features.keys():
+            features[name] = int(round(features[name]))
+    return aggregated, totals
+
+def analyze_tiled(source, tile_size=None, thresholds=None, min_valid_fraction=0.05):
+    """
+    Analyze a large mosaic tile by tile with memory bounded by the tile size.
+    Each tile runs the regular feature extractors and diagnosis rules.
+    Returns the per-tile health heatmap (NaN where a tile is mostly no-data),
+    per-tile diagnoses and a whole-image summary.
+    """
+    tile_size = tile_size or DEFAULT_TILE_SIZE
+    tile_source = open_tile_source(source)
+    try:
+        rows = tile_edges(tile_source.height, tile_size)
+        cols = tile_edges(tile_source.width, tile_size)
+        heatmap = np.full((len(rows), len(cols)), np.nan, dtype=np.float32)
+        tiles = []
+        tile_results = []
+
+        for row, (top, bottom) in enumerate(rows):
+            for col, (left, right) in enumerate(cols):
+                rgb, valid_fraction = tile_to_rgb(tile_source.read(left, top, right - left, bottom - top))
+                tile = {'row': row, 'col': col, 'window': [left, top, right - left, bottom - top]}
+                if valid_fraction < min_valid_fraction:
+                    tile['disease'] = "No Data"
+                    tiles.append(tile)
+                    continue
+
+                analysis_results = perform_dynamic_analysis(ImageContext(rgb=rgb))
+                health_score, _, _ = score_diagnosis(analysis_results, thresholds)
+                heatmap[row, col] = health_score
+                tile['health_score'] = float(health_score)
+                tile['disease'] = generate_diagnosis(analysis_results, thresholds)['disease']
+                tiles.append(tile)
+                tile_results.append(((bottom - top) * (right - left) * valid_fraction, analysis_results))
+    finally:
+        tile_source.close()
+
+    summary = {
+        'tiles_total': len(tiles),
+        'tiles_analyzed': len(tile_results),
+        'grade_counts': {},
+    }
+    for tile in tiles:
+        if 'health_score' in tile:
+            grade = diagnosis_grade(tile['health_score'])
+            summary['grade_counts'][grade] = summary['grade_counts'].get(grade, 0) + 1
+
+    if tile_results:
+        aggregated, totals = aggregate_tile_results(tile_results)
+        summary.update(generate_diagnosis(aggregated, thresholds))
+        summary['health_score'] = float(score_diagnosis(aggregated, thresholds)[0])
+        summary['mean_tile_health'] = float(np.nanmean(heatmap))
+        summary['total_spot_count'] = int(totals.get('spot_count', 0))
+    else:
+        summary.update({
+            'disease': "No Data",
+            'recommendations': "The mosaic contains no analyzable pixels."
+        })
+
+    return {
+        'image_size': [tile_source.width, tile_source.height],
+        'tile_size': tile_size,
+        'grid_shape': [len(rows), len(cols)],
+        'health_heatmap': heatmap,
+        'tiles': tiles,
+        'summary': summary,
+    }
@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 
-from fastmcp import FastMCP
+from fastmcp import FastMCP, Context
+from contextlib import asynccontextmanager
 import logging
 from pathlib import Path
 import os
 import sys
 import time
-import torch
-from transformers import AutoImageProcessor, AutoModelForImageClassification
+import numpy as np
 from PIL import Image
 
 # --- Setup Logging ---
@@ -22,23 +22,78 @@ if project_root not in sys.path:
 # --- Dynamic Import System ---
 # Import weather tool
 try:
-    from tools.weather_tool import get_weather_data
+    from tools.weather_tool import (
+        get_weather_data_async, get_weather_cache_stats, get_weather_history_stats, get_weather_upstream_stats,
+        query_weather_history,
+    )
+    from tools.bulk_weather import BULK_CONFIG, get_bulk_weather, get_bulk_weather_stats
     WEATHER_AVAILABLE = True
     logger.info("✅ Weather tool imported successfully")
 except ImportError as e:
     logger.warning(f"❌ Weather tool not available: {e}")
     WEATHER_AVAILABLE = False
-    get_weather_data = None
+    get_weather_data_async = None
+    get_weather_cache_stats = None
+    get_weather_upstream_stats = None
+    query_weather_history = None
+    get_weather_history_stats = None
+    get_bulk_weather = None
+    get_bulk_weather_stats = None
 
 # Import disease predictor
 try:
-    from models.disease_predictor import analyze_plant_image
+    from models.disease_predictor import analyze_plant_image, get_cache_stats, get_profile_stats, QUALITY_GATE
     DISEASE_PREDICTOR_AVAILABLE = True
     logger.info("✅ Disease predictor imported successfully")
 except ImportError as e:
     logger.warning(f"❌ Disease predictor not available: {e}")
     DISEASE_PREDICTOR_AVAILABLE = False
     analyze_plant_image = None
+    get_cache_stats = None
+    get_profile_stats = None
+    QUALITY_GATE = None
+
+# Import tiled mosaic analysis
+try:
+    from models.tiled_analysis import analyze_tiled
+    TILED_ANALYSIS_AVAILABLE = True
+    logger.info("✅ Tiled mosaic analysis imported successfully")
+except ImportError as e:
+    logger.warning(f"❌ Tiled mosaic analysis not available: {e}")
+    TILED_ANALYSIS_AVAILABLE = False
+    analyze_tiled = None
+
+# Import similarity search over past cases
+try:
+    from models.disease_predictor import PREDICTOR_CONFIG, set_case_index
+    from models.diagnosis_cache import DiagnosisCache
+    from models.feature_records import analyze_to_record
+    from models.similarity_index import CaseIndex, SimilarityIndex, feature_vectors
+    SIMILARITY_CONFIG = PREDICTOR_CONFIG.get("similarity", {})
+    CASE_INDEX = CaseIndex.from_config(SIMILARITY_CONFIG) if SIMILARITY_CONFIG.get("enabled", True) else None
+    set_case_index(CASE_INDEX)
+    SIMILARITY_AVAILABLE = CASE_INDEX is not None
+    if SIMILARITY_AVAILABLE:
+        logger.info(f"✅ Similarity index loaded ({len(CASE_INDEX)} past cases)")
+except (ImportError, OSError) as e:
+    logger.warning(f"❌ Similarity index not available: {e}")
+    SIMILARITY_AVAILABLE = False
+    SIMILARITY_CONFIG = {}
+    CASE_INDEX = None
+
+# MobileNetV2 embeddings index, created once the embedding size is known
+EMBEDDING_INDEX = None
+
+# Near-duplicate detection for bursts of shots of the same leaf
+try:
+    from models.perceptual_hash import NearDuplicateIndex
+    from tools.config_loader import get_tool_config
+    DEDUP_CONFIG = get_tool_config("disease_predictor").get("dedup", {})
+    NEAR_DUPLICATES = NearDuplicateIndex.from_config(DEDUP_CONFIG) if DEDUP_CONFIG.get("enabled", True) else None
+    logger.info("✅ Near-duplicate detection imported successfully")
+except (ImportError, ValueError) as e:
+    logger.warning(f"❌ Near-duplicate detection not available: {e}")
+    NEAR_DUPLICATES = None
 
 # Import agent creator
 CREATE_AND_RUN_AVAILABLE = False
@@ -80,19 +135,26 @@ except ImportError as e:
     logger.warning(f"❌ Agent creator not available: {e}")
 
 # --- Initialize MCP Server ---
-mcp = FastMCP(name="Smart Farming MCP Server")
+@asynccontextmanager
+async def server_lifespan(server):
+    """Start the background model load whenever the server starts (also under 'fastmcp run' / 'mcp dev')"""
+    if MODEL_LOADER.mode == "background":
+        MODEL_LOADER.start()
+    yield {}
+
+mcp = FastMCP(name="Smart Farming MCP Server", lifespan=server_lifespan)
 
 # --- TOOLS ---
 
 @mcp.tool()
-def get_weather(location: str) -> dict:
+async def get_weather(location: str) -> dict:
     """Fetch weather data for a given location."""
     if not WEATHER_AVAILABLE:
         return {"error": "Weather tool not available - please check tools/weather_tool.py"}
     
     try:
         logger.info(f"Fetching weather for: {location}")
-        result = get_weather_data(location)
+        result = await get_weather_data_async(location)
         logger.info(f"Weather data retrieved successfully for {location}")
         return result
     except Exception as e:
@@ -100,6 +162,61 @@ def get_weather(location: str) -> dict:
         return {"error": f"Failed to fetch weather data: {str(e)}"}
 
 
+@mcp.tool()
+async def get_weather_bulk(locations: list[str], ctx: Context = None) -> dict:
+    """
+    Fetch weather for many farm locations at once. Each location is a place
+    name ("Guntur, IN") or "lat,lon" coordinates. Results are streamed as
+    progress messages while they arrive; the return value holds every
+    location's result in input order and a summary (status counts, failed
+    locations, temperature and humidity spread). Locations that fail do not
+    fail the call.
+    """
+    if not WEATHER_AVAILABLE:
+        return {"error": "Weather tool not available - please check tools/weather_tool.py"}
+    max_locations = BULK_CONFIG.get("max_locations", 500)
+    if len(locations) > max_locations:
+        return {"error": f"Too many locations: {len(locations)} (limit {max_locations})"}
+
+    async def report(result, done, total):
+        if ctx is None:
+            return
+        if result.get("status") == "success":
+            await ctx.info(f"{result['query']}: {result['temperature']}, {result['humidity']} humidity, {result['description']}")
+        else:
+            await ctx.info(f"{result['query']}: {result.get('status')} - {result.get('error')}")
+        await ctx.report_progress(done, total)
+
+    try:
+        logger.info(f"Fetching weather for {len(locations)} locations")
+        result = await get_bulk_weather(locations, on_result=report)
+        summary = result["summary"]
+        logger.info(f"Bulk weather: {summary['succeeded']}/{summary['locations']} succeeded in {summary['elapsed_seconds']}s")
+        return result
+    except Exception as e:
+        logger.error(f"Bulk weather failed: {e}")
+        return {"error": f"Failed to fetch weather data: {str(e)}"}
+
+@mcp.tool()
+def get_weather_history(location: str, field: str = "humidity", days: float = 30, interval_hours: float = 1) -> dict:
+    """
+    Past weather for a location from the local observation store, without
+    calling the weather API: one field (temperature, feels_like, humidity,
+    pressure, wind_speed or visibility) averaged per interval over the last
+    'days' days. Only locations previously fetched with get_weather or
+    get_weather_bulk have history.
+    """
+    if not WEATHER_AVAILABLE:
+        return {"error": "Weather tool not available - please check tools/weather_tool.py"}
+    try:
+        start = time.perf_counter()
+        result = query_weather_history(location, field, days, int(interval_hours * 3600))
+        result["query_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+    except Exception as e:
+        logger.error(f"Weather history failed for {location}: {e}")
+        return {"error": f"Failed to read weather history: {str(e)}"}
+
 @mcp.tool()
 def run_agent(prompt: str) -> str:
     """Run an agent with the given prompt."""
@@ -115,32 +232,134 @@ def run_agent(prompt: str) -> str:
         logger.error(f"Agent tool failed: {e}")
         return f"Agent execution failed: {str(e)}"
 
-# --- Model Preloading (Keep only this block) ---
-try:
-    logger.info("Loading MobileNetV2 plant disease model...")
-    processor = AutoImageProcessor.from_pretrained(
-        "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification",
-        cache_dir="./model_cache"  # Cache locally to avoid re-downloads
-    )
-    model = AutoModelForImageClassification.from_pretrained(
-        "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification",
-        cache_dir="./model_cache"
-    )
-    model.eval()
-    MODEL_STATUS = "loaded"
-    logger.info("✅ Model loaded successfully")
-except Exception as e:
-    processor = None
-    model = None
-    MODEL_STATUS = f"error: {e}"
-    logger.error(f"❌ Failed to load model: {e}")
+# --- Model Loading ---
+# torch and transformers are imported by the loader, so startup and tools
+# that do not need the model never pay for them
+from models.model_loader import ModelLoader, load_offline_model, resident_memory_mb, resolve_snapshot
+from models.preprocessing import ImagePreprocessor
+from tools.config_loader import get_tool_config
+
+MODEL_REPO = "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification"
+MODEL_LOADING_CONFIG = get_tool_config("disease_predictor").get("model_loading", {})
+MODEL_CACHE_DIR = MODEL_LOADING_CONFIG.get("cache_dir", "./model_cache")
+
+INFERENCE_CONFIG = get_tool_config("disease_predictor").get("inference", {})
+
+def load_mobilenet():
+    """
+    Load the MobileNetV2 preprocessing pipeline and the configured inference backend;
+    runs once, in the loader thread. The fp32 torch model is only loaded for
+    the backends that are built from it.
+    """
+    from models.inference_backends import create_backend, export_directory
+    offline = MODEL_LOADING_CONFIG.get("offline", False)
+    revision = MODEL_LOADING_CONFIG.get("revision", "main")
+    backend_name = INFERENCE_CONFIG.get("backend", "eager")
+    max_batch_size = INFERENCE_CONFIG.get("max_batch_size", 8)
+    exports = export_directory(MODEL_CACHE_DIR, MODEL_REPO)
+    logger.info(f"Loading MobileNetV2 plant disease model ({backend_name}{', offline' if offline else ''})...")
+    start = time.perf_counter()
+    try:
+        model = None
+        if offline:
+            # Straight from the cached snapshot: no hub round-trips, weights memory-mapped
+            if backend_name == "onnx-int8":
+                snapshot = resolve_snapshot(MODEL_CACHE_DIR, MODEL_REPO, revision,
+                                            files=("preprocessor_config.json",), weights=())
+            else:
+                snapshot = resolve_snapshot(MODEL_CACHE_DIR, MODEL_REPO, revision)
+                _, model = load_offline_model(MODEL_CACHE_DIR, MODEL_REPO, revision)
+            preprocess = ImagePreprocessor.from_config(snapshot, max_batch_size)
+        else:
+            from transformers import AutoImageProcessor, AutoModelForImageClassification
+            processor = AutoImageProcessor.from_pretrained(
+                MODEL_REPO,
+                cache_dir=MODEL_CACHE_DIR  # Cache locally to avoid re-downloads
+            )
+            preprocess = ImagePreprocessor.from_config(processor.to_dict(), max_batch_size)
+            if backend_name != "onnx-int8":
+                model = AutoModelForImageClassification.from_pretrained(
+                    MODEL_REPO,
+                    cache_dir=MODEL_CACHE_DIR
+                )
+                model.eval()
+        backend = create_backend(backend_name, model, exports, INFERENCE_CONFIG.get("threads"))
+    except Exception as e:
+        logger.error(f"❌ Failed to load model: {e}")
+        raise
+    resident = resident_memory_mb()
+    logger.info(f"✅ Model loaded successfully in {time.perf_counter() - start:.2f}s"
+                + (f" ({resident} MB resident)" if resident is not None else ""))
+    return preprocess, backend
+
+MODEL_LOADER = ModelLoader.from_config(load_mobilenet, MODEL_LOADING_CONFIG, name="mobilenet-loader")
+
+def __getattr__(name):
+    # server.MODEL_STATUS predates the background loader and was only ever "loaded" or
+    # "error: <reason>", because importing the module blocked on the load. It still does
+    # both: reading it waits for the load (up to the configured timeout).
+    if name == "MODEL_STATUS":
+        try:
+            MODEL_LOADER.wait()
+        except TimeoutError:
+            return f"error: model still loading after {MODEL_LOADER.timeout}s"
+        except Exception:
+            pass
+        return MODEL_LOADER.status
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def softmax(logits):
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+def classify_images(images):
+    """
+    Classify a batch of RGB PIL images with one forward pass of the inference backend.
+    Returns one {'class_id', 'confidence', 'embedding'} dict per image.
+    """
+    preprocess, backend = MODEL_LOADER.wait()
+    logits, embeddings = backend.run(preprocess(images))
+    probabilities = softmax(logits)
+    class_ids = probabilities.argmax(axis=-1)
+    return [
+        {"class_id": int(class_id), "confidence": float(row[class_id]), "embedding": embedding}
+        for class_id, row, embedding in zip(class_ids, probabilities, embeddings)
+    ]
+
+# Concurrent prediction requests share forward passes
+from models.micro_batcher import MicroBatcher
+PREDICTION_BATCHER = MicroBatcher.from_config(classify_images, INFERENCE_CONFIG, name="mobilenet-batcher")
+
+def get_embedding_index(dim):
+    """The MobileNetV2 embedding index, or None when disabled"""
+    global EMBEDDING_INDEX
+    if EMBEDDING_INDEX is None and SIMILARITY_AVAILABLE and SIMILARITY_CONFIG.get("embeddings", True):
+        EMBEDDING_INDEX = SimilarityIndex.from_config(SIMILARITY_CONFIG, dim=dim, name="embeddings")
+    return EMBEDDING_INDEX
+
+def normalized_embedding(embedding):
+    return embedding / max(float((embedding ** 2).sum()) ** 0.5, 1e-12)
+
+def index_embedding(image_path, embedding, case):
+    """Add a classified image to the embedding index (once per image content)"""
+    index = get_embedding_index(len(embedding))
+    if index is None:
+        return
+    try:
+        with open(image_path, "rb") as f:
+            image_key = DiagnosisCache.image_key(f.read())
+        if image_key not in index:
+            index.add(normalized_embedding(embedding), [{**case, "image_key": image_key, "added_at": time.time()}])
+    except OSError as e:
+        logger.warning(f"Could not index embedding for {image_path}: {e}")
+
 
 @mcp.tool()
 def test_analysis_setup(image_path: str) -> dict:
     """
     Test the analysis setup with a given image path.
     Returns diagnostic information about file access, ML model availability,
-    and actual disease prediction using preloaded MobileNetV2.
+    and actual disease prediction using MobileNetV2 (waiting for it to load).
     """
     logger.info(f"Testing analysis setup for: {image_path}")
     
@@ -150,7 +369,8 @@ def test_analysis_setup(image_path: str) -> dict:
         "ml_model": {
             "name": "MobileNetV2 Plant Disease",
             "version": "1.0",
-            "status": MODEL_STATUS
+            "backend": INFERENCE_CONFIG.get("backend", "eager"),
+            "status": MODEL_LOADER.status
         },
         "prediction_results": {}
     }
@@ -186,42 +406,62 @@ def test_analysis_setup(image_path: str) -> dict:
     results["file_access"] = file_status
 
     # --- 2. Model Status Check ---
-    if MODEL_STATUS != "loaded":
+    try:
+        _, backend = MODEL_LOADER.wait()
+    except Exception:
+        pass
+    results["ml_model"]["status"] = MODEL_LOADER.status
+    if not MODEL_LOADER.ready:
         results["prediction_results"] = {
-            "error": f"Model not available: {MODEL_STATUS}"
+            "error": f"Model not available: {MODEL_LOADER.status}"
         }
-        logger.error(f"Model not loaded: {MODEL_STATUS}")
+        logger.error(f"Model not loaded: {MODEL_LOADER.status}")
         return results
 
-    # --- 3. Prediction using Preloaded Model ---
+    # --- 3. Prediction using the Loaded Model ---
     if target_path:
         try:
             logger.info(f"Processing image: {target_path}")
             
+            # Unusable photos are rejected before any model work
+            if QUALITY_GATE is not None:
+                with open(target_path, "rb") as f:
+                    quality = QUALITY_GATE.check_bytes(f.read())
+                if not quality["passed"]:
+                    results["prediction_results"] = {
+                        "status": "rejected",
+                        "error": " ".join(reason["message"] for reason in quality["reasons"]),
+                        "quality": quality
+                    }
+                    logger.info(f"🚫 Rejected {target_path}: {[reason['code'] for reason in quality['reasons']]}")
+                    return results
+            
+            # Near-duplicates of a recent shot reuse its prediction
+            image_hash = NEAR_DUPLICATES.hash(target_path) if NEAR_DUPLICATES is not None else None
+            duplicate = NEAR_DUPLICATES.lookup(image_hash) if image_hash is not None else None
+            if duplicate is not None:
+                prediction, source_path, distance = duplicate
+                results["prediction_results"] = {
+                    **prediction,
+                    "deduplicated": True,
+                    "duplicate_of": source_path,
+                    "hash_distance": distance
+                }
+                logger.info(f"♻️ Near-duplicate of {source_path} (distance {distance}), reusing its prediction")
+                return results
+            
             # Load and preprocess image
             img = Image.open(target_path).convert("RGB")
             logger.info(f"Image loaded successfully: {img.size}")
             
-            # Process with the model
-            inputs = processor(images=img, return_tensors="pt")
-            logger.info("Image preprocessed successfully")
-
-            # Run inference
-            with torch.no_grad():
-                outputs = model(**inputs)
-                logits = outputs.logits
-            
-            # Get predictions
-            predicted_class_idx = logits.argmax(-1).item()
-            probabilities = torch.nn.functional.softmax(logits, dim=-1)
-            confidence_score = probabilities.max().item()
+            # Run inference, batched with any concurrent requests
+            prediction = PREDICTION_BATCHER(img)
+            predicted_class_idx = prediction["class_id"]
+            confidence_score = prediction["confidence"]
+            embedding = prediction["embedding"]
 
             # Get label mapping
-            if hasattr(model.config, 'id2label'):
-                labels = model.config.id2label
-                detected_disease = labels.get(predicted_class_idx, f"Class_{predicted_class_idx}")
-            else:
-                detected_disease = f"Class_{predicted_class_idx}"
+            detected_disease = backend.labels.get(predicted_class_idx, f"Class_{predicted_class_idx}")
 
             results["prediction_results"] = {
                 "detected_disease": detected_disease,
@@ -229,6 +469,12 @@ def test_analysis_setup(image_path: str) -> dict:
                 "predicted_class_id": predicted_class_idx,
                 "status": "success"
             }
+            if image_hash is not None:
+                NEAR_DUPLICATES.add(image_hash, results["prediction_results"], target_path)
+            results["prediction_results"] = {**results["prediction_results"], "deduplicated": False}
+            index_embedding(target_path, embedding, {
+                "disease": detected_disease, "confidence": round(confidence_score, 4)
+            })
             
             logger.info(f"Prediction successful: {detected_disease} (confidence: {confidence_score:.4f})")
 
@@ -243,6 +489,122 @@ def test_analysis_setup(image_path: str) -> dict:
     return results
 
 
+@mcp.tool()
+def analyze_field_mosaic(image_path: str, tile_size: int = 1024) -> dict:
+    """
+    Analyze a large drone orthomosaic tile by tile.
+    Accepts a GeoTIFF/image path or a .npy array file. Returns a health heatmap
+    (one score per tile, null for no-data tiles), per-tile diagnoses and a
+    whole-field summary.
+    """
+    if not TILED_ANALYSIS_AVAILABLE:
+        return {"error": "Tiled analysis not available - please check models/tiled_analysis.py"}
+    if not os.path.isfile(image_path):
+        return {"error": f"File not found: {image_path}"}
+    
+    try:
+        logger.info(f"🗺️ Tiled analysis of {image_path} (tile size {tile_size})")
+        result = analyze_tiled(image_path, tile_size=tile_size)
+        heatmap = result["health_heatmap"]
+        result["health_heatmap"] = [
+            [None if value != value else round(float(value), 2) for value in row] for row in heatmap
+        ]
+        logger.info(f"✅ Analyzed {result['summary']['tiles_analyzed']} tiles: {result['summary']['disease']}")
+        return result
+    except Exception as e:
+        logger.error(f"Tiled analysis failed for {image_path}: {e}")
+        return {"error": f"Tiled analysis failed: {str(e)}"}
+
+
+@mcp.tool()
+def find_similar_cases(image_path: str, k: int = 5) -> dict:
+    """
+    Find the k past cases most similar to an image.
+    Matches on the computer-vision features (colors, texture, lesions,
+    anomalies) and, once the MobileNetV2 model has loaded, also on its
+    embeddings. The image itself is then added to the index.
+    """
+    if not SIMILARITY_AVAILABLE:
+        return {"error": "Similarity index not available - please check models/similarity_index.py"}
+    if not os.path.isfile(image_path):
+        return {"error": f"File not found: {image_path}"}
+
+    try:
+        start = time.perf_counter()
+        with open(image_path, "rb") as f:
+            image_bytes = f.read()
+        image_key = DiagnosisCache.image_key(image_bytes)
+        diagnosis, record = analyze_to_record(image_bytes)
+        if record is None:
+            return {"error": diagnosis["recommendations"]}
+        analysis_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vector = feature_vectors(record)
+        result = {
+            "query": {"image_path": image_path, **diagnosis},
+            "matches": CASE_INDEX.search(vector[0], k, exclude_key=image_key),
+        }
+        MODEL_LOADER.start()
+        if MODEL_LOADER.ready:
+            embedding = PREDICTION_BATCHER(Image.open(image_path).convert("RGB"))["embedding"]
+            index = get_embedding_index(len(embedding))
+            if index is not None:
+                result["embedding_matches"] = index.search(normalized_embedding(embedding), k, exclude_key=image_key)
+        result["search_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        result["analysis_ms"] = round(analysis_time * 1000, 3)
+
+        if image_key not in CASE_INDEX:
+            CASE_INDEX.add(vector, [{
+                "image_key": image_key, "disease": diagnosis["disease"],
+                "recommendations": diagnosis["recommendations"], "added_at": time.time(),
+            }])
+        logger.info(f"🔎 {len(result['matches'])} similar cases for {image_path} in {result['search_ms']} ms")
+        return result
+    except Exception as e:
+        logger.error(f"Similarity search failed for {image_path}: {e}")
+        return {"error": f"Similarity search failed: {str(e)}"}
+
+
+@mcp.tool()
+def health_check() -> dict:
+    """
+    Report server health: which tools are available plus the counters of
+    each subsystem, one key per subsystem (ml_model, weather_cache,
+    weather_upstream, weather_history, weather_rate_limits,
+    diagnosis_cache, analysis_profile, near_duplicates, similarity_index).
+    """
+    return {
+        "status": "ok",
+        "timestamp": time.time(),
+        "tools": {
+            "weather": WEATHER_AVAILABLE,
+            "disease_predictor": DISEASE_PREDICTOR_AVAILABLE,
+            "tiled_analysis": TILED_ANALYSIS_AVAILABLE,
+            "similarity_search": SIMILARITY_AVAILABLE,
+            "agent": CREATE_AND_RUN_AVAILABLE
+        },
+        "ml_model": {
+            **MODEL_LOADER.get_stats(),
+            "backend": INFERENCE_CONFIG.get("backend", "eager"),
+            "batching": PREDICTION_BATCHER.get_stats()
+        },
+        "weather_cache": get_weather_cache_stats() if WEATHER_AVAILABLE else {"enabled": False},
+        "weather_upstream": get_weather_upstream_stats() if WEATHER_AVAILABLE else {"enabled": False},
+        "weather_history": get_weather_history_stats() if WEATHER_AVAILABLE else {"enabled": False},
+        "weather_rate_limits": get_bulk_weather_stats() if WEATHER_AVAILABLE else {},
+        "diagnosis_cache": get_cache_stats() if DISEASE_PREDICTOR_AVAILABLE else {"enabled": False},
+        "analysis_profile": get_profile_stats() if DISEASE_PREDICTOR_AVAILABLE else {"enabled": False},
+        "near_duplicates": (
+            {"enabled": True, **NEAR_DUPLICATES.get_stats()} if NEAR_DUPLICATES is not None else {"enabled": False}
+        ),
+        "similarity_index": {
+            "features": CASE_INDEX.get_stats() if CASE_INDEX is not None else {"enabled": False},
+            "embeddings": EMBEDDING_INDEX.get_stats() if EMBEDDING_INDEX is not None else {"enabled": False}
+        }
+    }
+
+
 
 # --- ENTRY POINT ---
 if __name__ == "__main__":
@@ -253,6 +615,11 @@ if __name__ == "__main__":
     logger.info(f"Disease Predictor: {'✅ Available' if DISEASE_PREDICTOR_AVAILABLE else '❌ Not Available'}")
     logger.info(f"Agent Creator: {'✅ Available' if CREATE_AND_RUN_AVAILABLE else '❌ Not Available'}")
     
+    # Warm the model while the transport starts (the lifespan hook would start it a little
+    # later); tools that need it wait for it
+    if MODEL_LOADER.mode == "background":
+        MODEL_LOADER.start()
+
     try:
         mcp.run(transport="stdio")
     except KeyboardInterrupt:
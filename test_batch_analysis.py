@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test the batch entry point of the disease predictor
+"""
+
+import base64
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models.disease_predictor as predictor
+from models.disease_predictor import (
+    analyze_plant_image,
+    analyze_plant_images_batch,
+    decode_image_data,
+    perform_batch_analysis,
+    perform_dynamic_analysis,
+)
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+
+
+def encode_image(image, fmt="PNG"):
+    """Encode a PIL image as a base64 string"""
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def make_variants(count=3):
+    """Colour-shifted copies of the sample leaf, all the same size"""
+    base = np.asarray(Image.open(SAMPLE_IMAGE).convert("RGB")).astype(np.int16)
+    rng = np.random.default_rng(0)
+    variants = []
+    for _ in range(count):
+        shifted = np.clip(base + rng.integers(-25, 25, size=(1, 1, 3)), 0, 255).astype(np.uint8)
+        variants.append(Image.fromarray(shifted))
+    return variants
+
+
+def test_batch_matches_single_image_analysis():
+    """Batch features should equal the per-image pipeline"""
+    print("\n📦 Testing batch features against single-image analysis...")
+    images = make_variants()
+    batch_results = perform_batch_analysis(np.stack([np.asarray(img) for img in images]))
+
+    for image, batch_result in zip(images, batch_results):
+        (pil_image, cv_image), error = decode_image_data(encode_image(image))
+        assert error is None
+        single_result = perform_dynamic_analysis(pil_image, cv_image)
+        for section, features in single_result.items():
+            for name, value in features.items():
+                assert np.allclose(value, batch_result[section][name]), (section, name)
+    print(f"✅ {len(images)} images match")
+
+
+def test_batch_preserves_order_and_isolates_errors():
+    """Bad inputs get their own error without failing the batch"""
+    print("\n📦 Testing batch ordering and per-image errors...")
+    images = make_variants(2)
+    small = images[0].resize((200, 150))
+    batch = [
+        encode_image(images[0]),
+        "!!! not base64 !!!",
+        encode_image(small),
+        base64.b64encode(b"not an image").decode(),
+        encode_image(images[1]),
+    ]
+
+    # Keep the diagnosis cache out of the comparison
+    original_cache = predictor.DIAGNOSIS_CACHE
+    predictor.DIAGNOSIS_CACHE = None
+    try:
+        diagnoses = analyze_plant_images_batch(batch)
+        assert len(diagnoses) == len(batch)
+        assert diagnoses[1]["disease"] == "Error"
+        assert diagnoses[3]["disease"] == "Error"
+        for index in (0, 2, 4):
+            expected = analyze_plant_image.invoke({"image_data": batch[index]})
+            assert diagnoses[index] == expected
+
+        # A data URL with nothing after the header, and a failure inside the quality gate
+        original_gate = predictor.check_image_quality
+        predictor.check_image_quality = lambda context, source_size: (
+            original_gate(context, source_size) if context.shape[1] != 200 else 1 / 0)
+        try:
+            mixed = analyze_plant_images_batch(["data:image/png;base64", batch[0], batch[2], batch[4]])
+        finally:
+            predictor.check_image_quality = original_gate
+        assert mixed[0]["disease"] == "Error" and "Invalid base64" in mixed[0]["recommendations"]
+        assert mixed[2]["disease"] == "Analysis Error"
+        assert mixed[1] == diagnoses[0] and mixed[3] == diagnoses[4]
+    finally:
+        predictor.DIAGNOSIS_CACHE = original_cache
+    print(f"✅ Diagnoses: {[d['disease'].split(' - ')[0] for d in diagnoses]}")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Batch Plant Image Analysis")
+    print("=" * 50)
+    tests = [
+        test_batch_matches_single_image_analysis,
+        test_batch_preserves_order_and_isolates_errors,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Test the bulk analysis CLI
+"""
+
+import io
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import bulk_analyze
+import models.disease_predictor as predictor
+from models.disease_predictor import analyze_plant_image_bytes
+from models.feature_records import load_feature_records
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+
+
+def make_archive(root):
+    """A nested folder of photos plus a corrupt file and a non-image"""
+    base = np.asarray(Image.open(SAMPLE_IMAGE).convert("RGB")).astype(np.int16)
+    rng = np.random.default_rng(1)
+    for index in range(4):
+        folder = root / f"field_{index % 2}"
+        folder.mkdir(exist_ok=True)
+        shifted = np.clip(base + rng.integers(-30, 30, size=(1, 1, 3)), 0, 255).astype(np.uint8)
+        Image.fromarray(shifted).save(folder / f"leaf_{index}.png")
+    shutil.copy(SAMPLE_IMAGE, root / "sample.jpeg")
+    (root / "corrupt.jpg").write_bytes(b"not really a jpeg")
+    (root / "notes.txt").write_text("scouting notes")
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_find_images():
+    """Directories are searched recursively, globs are expanded, non-images skipped"""
+    print("\n📂 Testing image discovery...")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_archive(root)
+        assert len(bulk_analyze.find_images([str(root)])) == 6
+        assert len(bulk_analyze.find_images([str(root / "**" / "*.png")])) == 4
+        assert len(bulk_analyze.find_images([str(root), str(root / "*.jpeg")])) == 6
+    print("✅ 6 images found, notes.txt skipped")
+
+
+def test_results_match_mcp_pipeline():
+    """Pool results equal in-process analyze_plant_image_bytes diagnoses"""
+    print("\n📂 Testing bulk results...")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "photos"
+        root.mkdir()
+        make_archive(root)
+        output = Path(tmp) / "results.jsonl"
+        assert bulk_analyze.main([str(root), "-o", str(output), "-j", "2", "--no-progress"]) == 0
+
+        records = read_jsonl(output)
+        assert len(records) == 6
+        by_name = {Path(record["path"]).name: record for record in records}
+        assert by_name["corrupt.jpg"]["status"] == "error"
+
+        original_cache = predictor.DIAGNOSIS_CACHE
+        predictor.DIAGNOSIS_CACHE = None
+        try:
+            for name, record in by_name.items():
+                expected = analyze_plant_image_bytes(Path(record["path"]).read_bytes())
+                if record["status"] == "error":
+                    # Error messages mention per-process object addresses
+                    assert record["disease"] == expected["disease"], name
+                    continue
+                assert {key: record[key] for key in expected} == expected, name
+        finally:
+            predictor.DIAGNOSIS_CACHE = original_cache
+    print(f"✅ {len(records)} records match the MCP pipeline")
+
+
+def test_resume_from_checkpoint():
+    """A rerun only analyzes images missing from the checkpoint"""
+    print("\n📂 Testing checkpoint resume...")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "photos"
+        root.mkdir()
+        make_archive(root)
+        output = Path(tmp) / "results.jsonl"
+        checkpoint = Path(f"{output}.checkpoint")
+
+        # Pretend an earlier run finished two images before being interrupted
+        paths = bulk_analyze.find_images([str(root)])
+        checkpoint.write_text("\n".join(paths[:2]) + "\n")
+        assert bulk_analyze.main([str(root), "-o", str(output), "-j", "1", "--no-progress"]) == 0
+        assert sorted(record["path"] for record in read_jsonl(output)) == paths[2:]
+        assert sorted(checkpoint.read_text().split()) == paths
+
+        assert bulk_analyze.main([str(root), "-o", str(output), "--no-progress"]) == 0
+        assert len(read_jsonl(output)) == len(paths) - 2
+    print("✅ Resumed run skipped finished images")
+
+
+class BufferingWriter:
+    """Writer that holds records until 'every' have arrived, like the Parquet writer's files"""
+
+    def __init__(self, checkpoint, every=2):
+        self.checkpoint = checkpoint
+        self.every = every
+        self.buffered = []
+        self.written = []
+        self.marked_at_write = []
+
+    def write(self, record):
+        self.marked_at_write.append(len(self.checkpoint.done))
+        self.buffered.append(record["path"])
+        return self.flush() if len(self.buffered) >= self.every else []
+
+    def flush(self):
+        flushed, self.buffered = self.buffered, []
+        self.written.extend(flushed)
+        return flushed
+
+
+def test_checkpoint_follows_writer():
+    """Images are checkpointed, and their features stored, only once the writer has written them"""
+    print("\n📂 Testing checkpoints against buffered output...")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "photos"
+        root.mkdir()
+        make_archive(root)
+        paths = bulk_analyze.find_images([str(root)])
+        checkpoint = bulk_analyze.Checkpoint(str(Path(tmp) / "results.checkpoint"))
+        writer = BufferingWriter(checkpoint)
+        features = Path(tmp) / "features.bin"
+        bulk_analyze.run(paths, writer, checkpoint, 1, bulk_analyze.Progress(len(paths), enabled=False),
+                         str(features))
+        checkpoint.close()
+        # Before each write, only the records of complete flushes were checkpointed
+        assert writer.marked_at_write == [index - index % 2 for index in range(len(paths))]
+        assert sorted(checkpoint.done) == sorted(writer.written) == paths
+        assert len(load_feature_records(str(features))) == len(paths) - 1  # the corrupt file has none
+    print(f"✅ {len(paths)} images checkpointed in flushes of {writer.every}")
+
+
+def test_parquet_output():
+    """Parquet output, when pyarrow is installed"""
+    print("\n📂 Testing Parquet output...")
+    part_path = bulk_analyze.ParquetWriter.part_path
+    assert part_path(Path("out/results.parquet"), 1) == Path("out/results.part1.parquet")
+    assert part_path(Path("results.2024-06.parquet"), 2) == Path("results.2024-06.part2.parquet")
+    assert part_path(Path("results.2024-07"), 1) == Path("results.2024-07.part1.parquet")
+    if not bulk_analyze.PYARROW_AVAILABLE:
+        raise unittest.SkipTest("pyarrow not installed")
+    import pyarrow.parquet as pq
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "results.parquet"
+        assert bulk_analyze.main([str(SAMPLE_IMAGE), "-o", str(output), "--no-progress"]) == 0
+        table = pq.read_table(output)
+        assert table.num_rows == 1
+        assert table.column("status").to_pylist() == ["ok"]
+    print("✅ Parquet written")
+
+
+def test_progress_display():
+    """Progress shows counts, errors and images/sec"""
+    print("\n📂 Testing progress display...")
+    stream = io.StringIO()
+    progress = bulk_analyze.Progress(2, stream=stream, interval=0)
+    progress.update({"status": "ok"})
+    progress.update({"status": "error"})
+    assert "2/2 images" in stream.getvalue() and "img/s" in stream.getvalue() and "1 errors" in stream.getvalue()
+    print("✅ Progress line rendered")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Bulk Analysis CLI")
+    print("=" * 50)
+    tests = [
+        test_find_images,
+        test_results_match_mcp_pipeline,
+        test_resume_from_checkpoint,
+        test_checkpoint_follows_writer,
+        test_parquet_output,
+        test_progress_display,
+    ]
+    passed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except unittest.SkipTest as e:
+            skipped += 1
+            print(f"⏭️  {test.__name__} skipped: {e}")
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"\n✅ Passed: {passed}/{len(tests)}, skipped: {skipped}")
+    return passed + skipped == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Test concurrent multi-location weather fetching
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import tools.weather_tool as weather_tool
+from tools.bulk_weather import (
+    TokenBucket, get_bulk_weather, iter_bulk_weather, location_query, rate_limiter_for, summarize_bulk_weather,
+)
+from tools.weather_cache import WeatherCache
+
+
+class FakeAsyncUpstream:
+    """Async stand-in for the OpenWeatherMap call: records calls and peak concurrency"""
+
+    def __init__(self, delay=0.01, statuses=None, raises=()):
+        self.delay = delay
+        self.statuses = statuses or {}
+        self.raises = set(raises)
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, location):
+        self.calls.append((location, time.perf_counter()))
+        call = len(self.calls)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if location in self.raises:
+            raise RuntimeError("connection reset")
+        status = self.statuses.get(location, "success")
+        if status != "success":
+            return {"location": location, "status": status, "error": f"{status} error"}
+        return {"location": location, "temperature": f"{20 + call}°C", "humidity": f"{40 + call}%",
+                "description": "Clear Sky", "observation": {"temperature": 20.0 + call, "humidity": 40.0 + call},
+                "status": "success"}
+
+
+def unlimited():
+    return TokenBucket(rate=1e6, burst=1e6)
+
+
+def test_location_query():
+    """Names, coordinate strings, pairs and dicts map to get_weather's location strings"""
+    print("\n🗺️  Testing location queries...")
+    assert location_query("  Guntur, IN ") == "Guntur, IN"
+    assert location_query("17.385, 78.4867") == location_query((17.385, 78.4867)) == "17.3850,78.4867"
+    assert location_query({"lat": 16.3, "lon": 80.45}) == "16.3000,80.4500"
+    assert weather_tool.parse_coordinates("95, 10") is None  # out of range: a name
+    os.environ.setdefault("OPENWEATHERMAP_API_KEY", "test-key")
+    params, _ = weather_tool._request_params("17.3850,78.4867")
+    assert params["lat"] == 17.385 and params["lon"] == 78.4867 and "q" not in params
+    assert weather_tool._request_params("Guntur")[0]["q"] == "Guntur"
+    print("✅ Locations formatted")
+
+
+def test_bulk_results_and_summary():
+    """Every input gets a result in order; failures give a partial result with a summary"""
+    print("\n🗺️  Testing bulk results...")
+    upstream = FakeAsyncUpstream(statuses={"Atlantis": "not_found", "Flaky": "timeout"}, raises={"Broken"})
+    locations = ["Hyderabad", "Atlantis", "Guntur", "Flaky", "Broken", (17.385, 78.4867), ("bad",)]
+    result = asyncio.run(get_bulk_weather(locations, fetch=upstream, cache=WeatherCache(), limiter=unlimited(),
+                                          breaker=False))
+    assert result["status"] == "partial"
+    assert [item["index"] for item in result["results"]] == list(range(len(locations)))
+    assert [item["status"] for item in result["results"]] == [
+        "success", "not_found", "success", "timeout", "unknown_error", "success", "error"]
+    summary = result["summary"]
+    assert summary["locations"] == 7 and summary["succeeded"] == 3 and summary["failed"] == 4
+    assert summary["by_status"]["success"] == 3 and len(summary["failures"]) == 4
+    assert summary["temperature"]["min"] < summary["temperature"]["max"]
+    assert summary["humidity"]["mean"] > 40
+
+    failing = FakeAsyncUpstream(statuses={"A": "timeout"})
+    assert asyncio.run(get_bulk_weather(["A"], fetch=failing, cache=False, limiter=unlimited(),
+                                        breaker=False))["status"] == "error"
+    print(f"✅ {summary['succeeded']}/{summary['locations']} succeeded, partial result returned")
+
+
+def test_duplicates_and_cache():
+    """Spellings of one place share a lookup, and cached places skip the upstream"""
+    print("\n🗺️  Testing de-duplication and caching...")
+    upstream, cache = FakeAsyncUpstream(), WeatherCache()
+    locations = ["Guntur, IN", "guntur,in", "GUNTUR , IN", "17.385,78.4867", (17.385, 78.4867)]
+    first = asyncio.run(get_bulk_weather(locations, fetch=upstream, cache=cache, limiter=unlimited()))
+    assert len(upstream.calls) == 2
+    assert len({item["temperature"] for item in first["results"][:3]}) == 1
+
+    second = asyncio.run(get_bulk_weather(locations + ["Eluru"], fetch=upstream, cache=cache, limiter=unlimited()))
+    assert len(upstream.calls) == 3 and second["summary"]["cache_hits"] == 5
+    print("✅ 5 inputs, 2 upstream calls; repeats served from the cache")
+
+
+def test_concurrency_and_streaming():
+    """At most max_concurrency lookups run at once and results arrive as they finish"""
+    print("\n🗺️  Testing bounded concurrency...")
+    upstream = FakeAsyncUpstream(delay=0.02)
+    locations = [f"Plot {i}" for i in range(20)]
+    arrivals = []
+
+    async def on_result(result, done, total):
+        arrivals.append((done, total, time.perf_counter()))
+
+    start = time.perf_counter()
+    result = asyncio.run(get_bulk_weather(locations, max_concurrency=4, fetch=upstream, cache=False,
+                                          limiter=unlimited(), on_result=on_result))
+    assert upstream.peak == 4 and result["status"] == "success"
+    assert [done for done, _, _ in arrivals] == list(range(1, 21)) and arrivals[0][1] == 20
+    assert arrivals[0][2] - start < 0.5 * (arrivals[-1][2] - start)  # streamed, not all at the end
+
+    async def first_three():
+        seen = []
+        async for item in iter_bulk_weather(locations, 4, fetch=upstream, cache=False, limiter=unlimited()):
+            seen.append(item)
+            if len(seen) == 3:
+                break
+        return seen
+
+    assert len(asyncio.run(first_three())) == 3
+    print(f"✅ Peak concurrency {upstream.peak}, {len(arrivals)} results streamed")
+
+
+def test_rate_limit():
+    """Upstream calls beyond the burst are spaced by the per-host rate"""
+    print("\n🗺️  Testing the rate limiter...")
+    upstream = FakeAsyncUpstream(delay=0.0)
+    limiter = TokenBucket(rate=50, burst=5)
+    locations = [f"Plot {i}" for i in range(15)]
+    asyncio.run(get_bulk_weather(locations, max_concurrency=15, fetch=upstream, cache=False, limiter=limiter))
+    times = sorted(call_time for _, call_time in upstream.calls)
+    # 5 at once, then 10 more at 50/s: about 0.2 s
+    assert 0.15 < times[-1] - times[0] < 0.6, times[-1] - times[0]
+    stats = limiter.get_stats()
+    assert stats["acquired"] == 15 and stats["waited"] >= 9
+
+    assert rate_limiter_for("http://api.openweathermap.org/a") is rate_limiter_for("http://api.openweathermap.org/b")
+    assert rate_limiter_for("http://127.0.0.1:1/a") is not rate_limiter_for("http://api.openweathermap.org/a")
+    print(f"✅ {len(times)} calls over {times[-1] - times[0]:.2f} s")
+
+
+def test_summary_of_empty_results():
+    """No locations gives an empty summary"""
+    print("\n🗺️  Testing an empty request...")
+    assert summarize_bulk_weather([]) == {
+        "locations": 0, "succeeded": 0, "failed": 0, "by_status": {}, "cache_hits": 0, "failures": []}
+    assert asyncio.run(get_bulk_weather([], limiter=unlimited()))["status"] == "success"
+    print("✅ Empty summary")
+
+
+def run_benchmark(locations=100, upstream_delay=0.02):
+    """Sequential get_weather calls against one bulk call"""
+    print("\n⏱️  Bulk weather...")
+    names = [f"Plot {i}" for i in range(locations)]
+    timings = {}
+
+    async def sequential():
+        upstream = FakeAsyncUpstream(delay=upstream_delay)
+        for name in names:
+            await upstream(name)
+
+    start = time.perf_counter()
+    asyncio.run(sequential())
+    timings["sequential"] = time.perf_counter() - start
+
+    for concurrency in (8, 32):
+        start = time.perf_counter()
+        asyncio.run(get_bulk_weather(names, max_concurrency=concurrency, fetch=FakeAsyncUpstream(delay=upstream_delay),
+                                     cache=False, limiter=unlimited()))
+        timings[f"bulk x{concurrency}"] = time.perf_counter() - start
+    for name, elapsed in timings.items():
+        print(f"   {name}: {elapsed * 1000:.0f} ms for {locations} locations")
+    return timings
+
+
+def main():
+    """Run all bulk weather tests"""
+    print("🧪 Bulk Weather Tests")
+    print("=" * 50)
+
+    tests = [
+        test_location_query,
+        test_bulk_results_and_summary,
+        test_duplicates_and_cache,
+        test_concurrency_and_streaming,
+        test_rate_limit,
+        test_summary_of_empty_results,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
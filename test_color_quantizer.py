@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test the colour quantization modes used by analyze_color_distribution
+and report how far each fast mode drifts from exact KMeans
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.color_quantizer import QUANTIZERS, count_unique_colors, quantize_colors
+from models.disease_predictor import dominant_color_features
+
+PROJECT_ROOT = Path(__file__).parent
+SAMPLE_IMAGES = [
+    PROJECT_ROOT / "images.jpeg",
+    PROJECT_ROOT / "rust_fungus-min_1024x1024.webp",
+    PROJECT_ROOT / "temp" / "36436805-d3fe-4e5f-bf08-e06837e1da9f.jpeg",
+]
+
+# Largest drift from the exact mode we accept for the fast modes
+MAX_GREEN_DRIFT = 0.05
+MAX_DISCOLORATION_DRIFT = 0.2
+
+
+def load_pixels(path, max_side=400):
+    """Load an image as an (N, 3) RGB array, shrunk so exact KMeans stays quick"""
+    image = Image.open(path).convert("RGB")
+    image.thumbnail((max_side, max_side))
+    return np.asarray(image).reshape(-1, 3)
+
+
+def test_count_unique_colors():
+    """Packed bincount counter agrees with np.unique"""
+    print("\n🎨 Testing unique colour counting...")
+    pixels = load_pixels(SAMPLE_IMAGES[0])
+    expected = len(np.unique(pixels, axis=0))
+    assert count_unique_colors(pixels) == expected
+    assert count_unique_colors(pixels, limit=5) == 5
+    assert count_unique_colors(np.zeros((100, 3), np.uint8), limit=5) == 1
+    # Flat image with a few other colours past the first sample and chunk
+    flat = np.full((1_000_000, 3), 120, np.uint8)
+    flat[500_000:500_003] = [[1, 2, 3], [4, 5, 6], [1, 2, 3]]
+    assert count_unique_colors(flat, limit=5) == 3
+    flat[900_000:900_003] = [[7, 8, 9], [10, 11, 12], [13, 14, 15]]
+    assert count_unique_colors(flat, limit=5) == 5
+    assert count_unique_colors(flat, limit=10) == count_unique_colors(flat) == 6
+    print(f"✅ {expected} unique colours")
+
+
+def test_every_mode_returns_requested_clusters():
+    """Each quantizer returns n_colors RGB centers inside the colour cube"""
+    print("\n🎨 Testing quantizer output shapes...")
+    pixels = load_pixels(SAMPLE_IMAGES[0])
+    for mode in QUANTIZERS:
+        centers = quantize_colors(pixels, 5, mode=mode)
+        assert centers.shape == (5, 3), mode
+        assert centers.min() >= 0 and centers.max() <= 255, mode
+    print(f"✅ Modes: {', '.join(QUANTIZERS)}")
+
+
+def test_drift_from_exact_mode():
+    """Report green_dominance / discoloration_index drift of each mode vs exact KMeans"""
+    print("\n🎨 Drift from exact KMeans (green_dominance, discoloration_index, seconds):")
+    worst = {mode: [0.0, 0.0] for mode in QUANTIZERS}
+    for path in SAMPLE_IMAGES:
+        pixels = load_pixels(path)
+        exact = dominant_color_features(pixels, "exact")
+        for mode in QUANTIZERS:
+            start = time.perf_counter()
+            features = dominant_color_features(pixels, mode)
+            elapsed = time.perf_counter() - start
+            green_drift = abs(features["green_dominance"] - exact["green_dominance"])
+            discoloration_drift = abs(features["discoloration_index"] - exact["discoloration_index"])
+            worst[mode][0] = max(worst[mode][0], green_drift)
+            worst[mode][1] = max(worst[mode][1], discoloration_drift)
+            print(f"   {path.name[:24]:<24} {mode:<11} {green_drift:.4f}  {discoloration_drift:.2f}  {elapsed:.3f}s")
+
+    for mode in ("subsample", "histogram"):
+        assert worst[mode][0] <= MAX_GREEN_DRIFT, (mode, worst[mode])
+        assert worst[mode][1] <= MAX_DISCOLORATION_DRIFT, (mode, worst[mode])
+    print(f"✅ Worst drift per mode: {worst}")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Colour Quantizers")
+    print("=" * 50)
+    tests = [
+        test_count_unique_colors,
+        test_every_mode_returns_requested_clusters,
+        test_drift_from_exact_mode,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
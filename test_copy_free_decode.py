@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test the copy-free decode path (encoded bytes -> one BGR buffer -> views)
+"""
+
+import base64
+import sys
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models.disease_predictor as predictor
+from models.disease_predictor import (
+    analyze_plant_image,
+    analyze_plant_image_bytes,
+    analyze_plant_images_batch,
+    open_image_bytes,
+    perform_dynamic_analysis,
+)
+from models.resolution_policy import ResolutionPolicy
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+
+
+def traced_allocations(func, *args):
+    """
+    Run func under tracemalloc. Returns (result, peak_bytes, live_blocks) where
+    live_blocks are the sizes of the traced blocks the result keeps alive.
+    """
+    tracemalloc.start()
+    result = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    live_blocks = sorted((trace.size for trace in tracemalloc.take_snapshot().traces), reverse=True)
+    tracemalloc.stop()
+    return result, peak, live_blocks
+
+
+def test_decode_makes_one_frame_buffer():
+    """Decoding allocates a single full-frame buffer; RGB is a view of it"""
+    print("\n🧮 Testing decode allocations...")
+    image_bytes = SAMPLE_IMAGE.read_bytes()
+    policy = ResolutionPolicy()
+    # Warm up so one-off import and plugin allocations are not counted
+    policy.open(image_bytes)
+    open_image_bytes(image_bytes)
+
+    (context, _), peak, live_blocks = traced_allocations(policy.open, image_bytes)
+    frame_bytes = context.bgr.nbytes
+    frames = [size for size in live_blocks if size >= frame_bytes]
+    assert len(frames) == 1, frames
+    assert peak < frame_bytes * 1.5, (peak, frame_bytes)
+
+    rgb = context.rgb
+    assert np.shares_memory(rgb, context.bgr)
+    assert not rgb.flags.writeable and not context.bgr.flags.writeable
+    assert np.array_equal(rgb, context.bgr[:, :, ::-1])
+
+    legacy, legacy_peak, legacy_blocks = traced_allocations(open_image_bytes, image_bytes)
+    legacy_frames = [size for size in legacy_blocks if size >= frame_bytes]
+    print(f"   copy-free: {len(frames)} frame buffer(s), peak {peak / frame_bytes:.2f} frames")
+    print(f"   legacy:    {len(legacy_frames)} frame buffer(s), peak {legacy_peak / frame_bytes:.2f} frames"
+          " (plus Pillow's own copies)")
+    print("✅ One frame buffer per decode")
+
+
+def test_views_give_the_same_features():
+    """Analysis on the BGR buffer matches the PIL + OpenCV pipeline exactly"""
+    print("\n🧮 Testing features on decoded views...")
+    image_bytes = SAMPLE_IMAGE.read_bytes()
+    context, _ = ResolutionPolicy().open(image_bytes)
+    (pil_image, cv_image), error = open_image_bytes(image_bytes)
+    assert error is None
+
+    copy_free = perform_dynamic_analysis(context)
+    legacy = perform_dynamic_analysis(pil_image, cv_image)
+    assert not context.has('rgb') or np.shares_memory(context.rgb, context.bgr)
+    for section, features in legacy.items():
+        for name, value in features.items():
+            assert np.array_equal(value, copy_free[section][name]), (section, name)
+    print("✅ Features identical")
+
+
+def test_raw_bytes_inputs():
+    """bytes, bytearray and memoryview skip base64 and give the same diagnosis"""
+    print("\n🧮 Testing raw byte inputs...")
+    image_bytes = SAMPLE_IMAGE.read_bytes()
+    original_cache = predictor.DIAGNOSIS_CACHE
+    predictor.DIAGNOSIS_CACHE = None
+    try:
+        expected = analyze_plant_image.invoke({"image_data": base64.b64encode(image_bytes).decode()})
+        for raw in (image_bytes, bytearray(image_bytes), memoryview(image_bytes)):
+            assert analyze_plant_image_bytes(raw) == expected
+        assert analyze_plant_images_batch([memoryview(image_bytes), base64.b64encode(image_bytes).decode()]) == [expected] * 2
+        assert analyze_plant_images_batch([42])[0]["disease"] == "Error"
+        truncated = analyze_plant_image.invoke({"image_data": "data:image/png;base64"})
+        assert truncated["disease"] == "Error" and "Invalid base64 image data" in truncated["recommendations"]
+        assert analyze_plant_image_bytes(b"not an image")["disease"] == "Error"
+    finally:
+        predictor.DIAGNOSIS_CACHE = original_cache
+    print(f"✅ {expected['disease']}")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Copy-Free Decode")
+    print("=" * 50)
+    tests = [
+        test_decode_makes_one_frame_buffer,
+        test_views_give_the_same_features,
+        test_raw_bytes_inputs,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test the content-addressed diagnosis cache
+"""
+
+import base64
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models.disease_predictor as predictor
+from models.diagnosis_cache import DiagnosisCache
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+DIAGNOSIS = {"disease": "Plant Appears Healthy", "recommendations": "Continue current care routine"}
+
+
+def test_lru_tier_evicts_oldest():
+    """The memory tier keeps the most recently used entries"""
+    print("\n🗄️ Testing LRU eviction...")
+    cache = DiagnosisCache(max_entries=2)
+    cache.put("a", DIAGNOSIS)
+    cache.put("b", DIAGNOSIS)
+    assert cache.get("a") == DIAGNOSIS
+    cache.put("c", DIAGNOSIS)
+    assert cache.get("b") is None
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1 and stats["memory_hits"] == 1 and stats["misses"] == 1
+
+    # Callers get their own copies, nested values included
+    cache.put("nested", {**DIAGNOSIS, "resolution": {"source": [640, 480]}})
+    cache.get("nested")["resolution"]["source"][0] = 1
+    assert cache.get("nested")["resolution"]["source"] == [640, 480]
+    print(f"✅ Stats: {stats}")
+
+
+def test_disk_tier_survives_restart_and_invalidates():
+    """SQLite entries are reused across instances but not across namespaces"""
+    print("\n🗄️ Testing disk tier...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "diagnoses.sqlite")
+        DiagnosisCache(disk_path=path, namespace="v1").put("leaf", DIAGNOSIS)
+
+        restarted = DiagnosisCache(disk_path=path, namespace="v1")
+        assert restarted.get("leaf") == DIAGNOSIS
+        assert restarted.get_stats()["disk_hits"] == 1
+
+        # Another process on a new version cannot see the entry, but does not delete it while it is recent
+        upgraded = DiagnosisCache(disk_path=path, namespace="v2")
+        assert upgraded.get("leaf") is None
+        assert upgraded.get_stats()["invalidations"] == 0
+        assert restarted.get("leaf") == DIAGNOSIS
+
+        # Entries of other namespaces are pruned once stale
+        pruned = DiagnosisCache(disk_path=path, namespace="v3", stale_namespace_seconds=0)
+        assert pruned.get_stats()["invalidations"] == 1 and pruned.get_stats()["disk_entries"] == 0
+    print("✅ Persisted and invalidated")
+
+
+def test_disk_errors_are_best_effort():
+    """A locked database or an unserializable diagnosis is counted, never raised"""
+    print("\n🗄️ Testing disk errors...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "diagnoses.sqlite")
+        cache = DiagnosisCache(disk_path=path, namespace="v1", busy_timeout=0.05)
+        other = sqlite3.connect(path)
+        other.execute("BEGIN EXCLUSIVE")
+        try:
+            cache.put("leaf", DIAGNOSIS)
+            assert cache.get("leaf") == DIAGNOSIS  # the memory tier still has it
+            assert cache.get("other") is None  # WAL readers are not blocked by the writer
+        finally:
+            other.rollback()
+            other.close()
+        stats = cache.get_stats()
+        assert stats["disk_errors"] == 1 and "locked" in stats["last_error"]
+        cache.put("leaf", DIAGNOSIS)
+        assert DiagnosisCache(disk_path=path, namespace="v1").get("leaf") == DIAGNOSIS
+
+        cache.put("odd", {"disease": object()})
+        assert cache.get("odd") is None and cache.get_stats()["unserializable"] == 1
+    print("✅ Errors counted")
+
+
+def test_resubmitted_image_hits_cache():
+    """analyze_plant_image answers a repeated photo from the cache"""
+    print("\n🗄️ Testing analyze_plant_image caching...")
+    image_data = base64.b64encode(SAMPLE_IMAGE.read_bytes()).decode()
+    original_cache = predictor.DIAGNOSIS_CACHE
+    predictor.DIAGNOSIS_CACHE = DiagnosisCache()
+    try:
+        first = predictor.analyze_plant_image.invoke({"image_data": image_data})
+        second = predictor.analyze_plant_image.invoke({"image_data": image_data})
+        assert first == second
+        assert predictor.get_cache_stats()["memory_hits"] == 1
+
+        # Changing a threshold must not serve the old diagnosis
+        predictor.DIAGNOSIS_THRESHOLDS["spot_count"] += 1000
+        try:
+            predictor.analyze_plant_image.invoke({"image_data": image_data})
+            stats = predictor.get_cache_stats()
+            assert stats["memory_hits"] == 1 and stats["misses"] == 2
+        finally:
+            predictor.DIAGNOSIS_THRESHOLDS["spot_count"] -= 1000
+    finally:
+        predictor.DIAGNOSIS_CACHE = original_cache
+    print("✅ Cache hit on resubmission, miss after threshold change")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Diagnosis Cache")
+    print("=" * 50)
+    tests = [
+        test_lru_tier_evicts_oldest,
+        test_disk_tier_survives_restart_and_invalidates,
+        test_disk_errors_are_best_effort,
+        test_resubmitted_image_hits_cache,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Test compact feature records and the vectorized rule engine
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import bulk_analyze
+import models.disease_predictor as predictor
+from models.disease_predictor import analyze_plant_image_bytes, generate_diagnosis
+from models.feature_records import (
+    FEATURE_DTYPE,
+    GRADE_LABELS,
+    HEADER_SIZE,
+    analyze_to_record,
+    append_feature_records,
+    describe_diagnoses,
+    diagnose_records,
+    from_feature_record,
+    load_feature_records,
+    to_feature_records,
+)
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+
+
+def random_analysis_results(rng):
+    """analysis_results dicts spread around every diagnosis threshold"""
+    return {
+        'colors': {
+            'dominant_colors': rng.uniform(0, 255, size=(int(rng.integers(1, 6)), 3)).tolist(),
+            'green_dominance': float(rng.uniform(0.2, 1.0)),
+            'discoloration_index': float(rng.uniform(0, 0.6)),
+            'hue_variance': float(rng.uniform(0, 2000)),
+            'saturation_mean': float(rng.uniform(0, 255)),
+            'brightness_mean': float(rng.uniform(50, 200)),
+        },
+        'texture': {
+            'variance': float(rng.uniform(0, 3000)),
+            'edge_density': float(rng.uniform(0, 0.3)),
+            'texture_contrast': float(rng.uniform(0, 80)),
+            'roughness_index': float(rng.uniform(0, 1000)),
+        },
+        'shapes': {
+            'spot_count': int(rng.integers(0, 25)),
+            'avg_spot_size': float(rng.uniform(0, 500)),
+            'shape_irregularity': float(rng.uniform(0, 1)),
+            'size_variance': float(rng.uniform(0, 1e5)),
+        },
+        'stats': {
+            'mean_rgb': rng.uniform(0, 255, size=3).tolist(),
+            'std_rgb': rng.uniform(0, 80, size=3).tolist(),
+            'extrema': [tuple(int(v) for v in sorted(rng.integers(0, 256, size=2))) for _ in range(3)],
+            'brightness_uniformity': float(rng.uniform(0, 1)),
+            'color_balance': float(rng.uniform(0, 1)),
+        },
+        'anomalies': {
+            'dark_lesion_ratio': float(rng.uniform(0, 0.2)),
+            'bright_discoloration_ratio': float(rng.uniform(0, 0.2)),
+            'edge_damage_intensity': float(rng.uniform(0, 0.2)),
+            'anomaly_score': float(rng.uniform(0, 0.2)),
+        },
+    }
+
+
+def test_record_round_trip():
+    """Records rebuild the analysis dict they were packed from"""
+    print("\n🧱 Testing feature record round trip...")
+    rng = np.random.default_rng(0)
+    results = [random_analysis_results(rng) for _ in range(20)]
+    records = to_feature_records(results)
+    assert records.dtype == FEATURE_DTYPE
+    for original, record in zip(results, records):
+        rebuilt = from_feature_record(record)
+        assert rebuilt['shapes'] == original['shapes']
+        assert rebuilt['stats']['extrema'] == original['stats']['extrema']
+        assert rebuilt['colors']['green_dominance'] == original['colors']['green_dominance']
+        assert np.allclose(rebuilt['colors']['dominant_colors'], original['colors']['dominant_colors'], atol=1e-4)
+        assert generate_diagnosis(rebuilt) == generate_diagnosis(original)
+    print(f"✅ 20 records, {FEATURE_DTYPE.itemsize} bytes each")
+
+
+def test_rule_engine_matches_generate_diagnosis():
+    """Vectorized re-diagnosis equals generate_diagnosis, with and without threshold overrides"""
+    print("\n🧱 Testing vectorized rule engine...")
+    rng = np.random.default_rng(1)
+    results = [random_analysis_results(rng) for _ in range(500)]
+    records = to_feature_records(results)
+
+    for thresholds in (None, {'spot_count': 5, 'discoloration': 0.2}, {'brightness_mean': 150}):
+        outcome = diagnose_records(records, thresholds)
+        described = describe_diagnoses(records, outcome)
+        for row, analysis_results in enumerate(results):
+            expected = generate_diagnosis(analysis_results, thresholds)
+            assert described[row] == expected, (row, thresholds)
+            assert expected['disease'].startswith(GRADE_LABELS[outcome['grade'][row]])
+    print("✅ 500 records x 3 threshold sets agree")
+
+
+def test_file_round_trip_and_version_check():
+    """Appended records memory-map back; foreign files are rejected"""
+    print("\n🧱 Testing feature files...")
+    rng = np.random.default_rng(2)
+    records = to_feature_records([random_analysis_results(rng) for _ in range(10)])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "features.bin"
+        append_feature_records(path, records[:4])
+        append_feature_records(path, records[4:])
+        loaded = load_feature_records(path)
+        assert isinstance(loaded, np.memmap)
+        assert np.array_equal(loaded, records)
+
+        # A torn trailing record is ignored
+        with open(path, "ab") as f:
+            f.write(b"\0" * 7)
+        assert len(load_feature_records(path)) == 10
+
+        # Records of another version are refused
+        data = bytearray(path.read_bytes())
+        data[:HEADER_SIZE] = data[:HEADER_SIZE].replace(b'"version": 1', b'"version": 9')
+        path.write_bytes(bytes(data))
+        try:
+            load_feature_records(path)
+            assert False, "version mismatch not detected"
+        except ValueError:
+            pass
+    print("✅ Append, memory-map and version check work")
+
+
+def test_analyze_to_record():
+    """The record path gives the same diagnosis as analyze_plant_image_bytes"""
+    print("\n🧱 Testing analyze_to_record...")
+    image_bytes = SAMPLE_IMAGE.read_bytes()
+    original_cache = predictor.DIAGNOSIS_CACHE
+    predictor.DIAGNOSIS_CACHE = None
+    try:
+        diagnosis, record = analyze_to_record(image_bytes)
+        assert diagnosis == analyze_plant_image_bytes(image_bytes)
+    finally:
+        predictor.DIAGNOSIS_CACHE = original_cache
+    described = describe_diagnoses(record, diagnose_records(record))[0]
+    assert described == {key: value for key, value in diagnosis.items() if key != 'resolution'}
+
+    error, record = analyze_to_record(b"not an image")
+    assert error['disease'] == "Error" and record is None
+    print(f"✅ {diagnosis['disease']}")
+
+
+def test_bulk_features_option():
+    """bulk_analyze --features writes one record per analyzed image"""
+    print("\n🧱 Testing bulk_analyze --features...")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "photos"
+        root.mkdir()
+        (root / "leaf.jpeg").write_bytes(SAMPLE_IMAGE.read_bytes())
+        (root / "corrupt.jpg").write_bytes(b"not really a jpeg")
+        output = Path(tmp) / "results.jsonl"
+        features = Path(tmp) / "features.bin"
+        assert bulk_analyze.main([str(root), "-o", str(output), "--features", str(features),
+                                  "-j", "1", "--no-progress"]) == 0
+        assert "features" not in output.read_text()
+        assert len(load_feature_records(features)) == 1
+    print("✅ 1 record for 2 files (corrupt one skipped)")
+
+
+def run_benchmark(n_records=1_000_000):
+    """Re-diagnose a million stored records with new thresholds"""
+    print(f"\n⏱️  Re-diagnosing {n_records:,} records...")
+    rng = np.random.default_rng(3)
+    base = to_feature_records([random_analysis_results(rng) for _ in range(1000)])
+    records = np.resize(base, n_records)
+
+    start = time.perf_counter()
+    outcome = diagnose_records(records, {'spot_count': 8})
+    elapsed = time.perf_counter() - start
+    counts = np.bincount(outcome['grade'], minlength=len(GRADE_LABELS))
+    print(f"   {elapsed:.3f}s ({n_records / elapsed:,.0f} records/s), "
+          f"{FEATURE_DTYPE.itemsize * n_records / 1e6:.0f} MB of records")
+    for label, count in zip(GRADE_LABELS, counts):
+        print(f"   {label}: {count:,}")
+    assert elapsed < 10
+    return elapsed
+
+
+def main():
+    """Run all feature record tests"""
+    print("🧪 Feature Record Tests")
+    print("=" * 50)
+
+    tests = [
+        test_record_round_trip,
+        test_rule_engine_matches_generate_diagnosis,
+        test_file_round_trip_and_version_check,
+        test_analyze_to_record,
+        test_bulk_features_option,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
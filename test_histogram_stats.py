@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test the histogram-backed statistics against numpy / PIL and benchmark them
+at 1, 4 and 12 MP
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image, ImageStat
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.histogram_stats import HistogramStats, batch_channel_histograms, batch_image_stat, channel_histograms
+
+
+def random_images(count=20, seed=0):
+    """Random 8-bit RGB images of assorted sizes, including low-contrast ones"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        height, width = rng.integers(1, 400, size=2)
+        low, high = sorted(rng.integers(0, 256, size=2))
+        images.append(rng.integers(low, high + 1, size=(height, width, 3), dtype=np.uint8))
+    images.append(np.full((30, 40, 3), 9, np.uint8))
+    return images
+
+
+def test_percentiles_and_means_are_bit_identical():
+    """Percentiles and means equal np.percentile / np.mean exactly"""
+    print("\n📊 Testing percentiles and means...")
+    for image in random_images():
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        stats = HistogramStats.from_image(gray)
+        for q in (0, 1, 12.5, 20, 33.3, 50, 61, 80, 87.5, 99, 100):
+            assert stats.percentile(q) == np.percentile(gray, q), q
+        assert stats.mean() == np.mean(gray.flatten())
+        assert stats.extrema() == (gray.min(), gray.max())
+    print("✅ Bit-identical")
+
+
+def test_image_stat_is_bit_identical():
+    """image_stat() reproduces PIL's ImageStat.Stat"""
+    print("\n📊 Testing ImageStat equivalence...")
+    for image in random_images():
+        stat = ImageStat.Stat(Image.fromarray(image))
+        ours = HistogramStats.from_image(image).image_stat()
+        assert ours["mean"] == stat.mean
+        assert ours["stddev"] == stat.stddev
+        assert ours["extrema"] == stat.extrema
+    print("✅ Bit-identical")
+
+
+def test_batch_histograms_match_per_image():
+    """Stacked histograms and batch_image_stat() equal the per-image results"""
+    print("\n📊 Testing stacked histograms...")
+    rng = np.random.default_rng(1)
+    stack = np.stack([rng.integers(low, 256, size=(60, 80, 3), dtype=np.uint8) for low in (0, 40, 200, 255)])
+    counts = batch_channel_histograms(stack)
+    assert counts.shape == (4, 3, 256)
+    for image, image_counts, stat in zip(stack, counts, batch_image_stat(counts)):
+        assert np.array_equal(image_counts, channel_histograms(image))
+        assert stat == HistogramStats.from_image(image).image_stat()
+        assert stat["stddev"] == ImageStat.Stat(Image.fromarray(image)).stddev
+    assert batch_channel_histograms(stack[:, :, :, 0]).shape == (4, 1, 256)
+    print("✅ Identical")
+
+
+def test_variance_matches_numpy():
+    """Exact variance agrees with np.var up to np.var's own rounding"""
+    print("\n📊 Testing variance...")
+    for image in random_images():
+        stats = HistogramStats.from_image(image)
+        for channel in range(3):
+            expected = np.var(image[:, :, channel].flatten())
+            assert abs(stats.var(channel) - expected) <= 4 * np.spacing(max(expected, 1.0))
+    print("✅ Within a few ulp")
+
+
+def current_statistics(rgb, gray, hsv):
+    """The per-pixel statistics as computed before the histogram engine"""
+    np.percentile(gray, 20), np.percentile(gray, 80)
+    np.percentile(gray, 20), np.percentile(gray, 80)
+    np.var(hsv[:, :, 0].flatten()), np.mean(hsv[:, :, 1].flatten()), np.mean(hsv[:, :, 2].flatten())
+    ImageStat.Stat(Image.fromarray(rgb)).stddev
+
+
+def histogram_statistics(rgb, gray, hsv):
+    """The same statistics from one set of histograms per plane"""
+    gray_stats = HistogramStats.from_image(gray)
+    gray_stats.percentile(20), gray_stats.percentile(80)
+    hsv_stats = HistogramStats.from_image(hsv)
+    hsv_stats.var(0), hsv_stats.mean(1), hsv_stats.mean(2)
+    HistogramStats.from_image(rgb).image_stat()
+
+
+def run_benchmark(megapixels=(1, 4, 12), repeats=3):
+    """Print the speedup of the histogram engine at each image size"""
+    print("\n⏱️ Benchmark (best of %d):" % repeats)
+    rng = np.random.default_rng(0)
+    for mp in megapixels:
+        height = int((mp * 1e6 * 3 / 4) ** 0.5)
+        width = int(mp * 1e6 / height)
+        rgb = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        hsv = np.array(Image.fromarray(rgb).convert("HSV"))
+
+        timings = []
+        for func in (current_statistics, histogram_statistics):
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                func(rgb, gray, hsv)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best)
+        print(f"   {mp:>2} MP  numpy/PIL {timings[0] * 1000:8.1f} ms   "
+              f"histogram {timings[1] * 1000:8.1f} ms   speedup {timings[0] / timings[1]:.1f}x")
+
+
+def main():
+    """Run all tests and the benchmark"""
+    print("🧪 Testing Histogram Statistics")
+    print("=" * 50)
+    tests = [
+        test_percentiles_and_means_are_bit_identical,
+        test_image_stat_is_bit_identical,
+        test_batch_histograms_match_per_image,
+        test_variance_matches_numpy,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    run_benchmark()
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the shared per-image feature context
+"""
+
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.disease_predictor import perform_dynamic_analysis
+from models.image_context import ImageContext
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+
+
+def test_planes_are_built_once():
+    """Each derived plane is computed on first use and then reused"""
+    print("\n🖼️ Testing plane memoization...")
+    calls = []
+    original = ImageContext._builders["gray"]
+    ImageContext.register_plane("gray", lambda context: calls.append(1) or original(context))
+    try:
+        context = ImageContext(pil_image=Image.open(SAMPLE_IMAGE).convert("RGB"))
+        perform_dynamic_analysis(context)
+        assert len(calls) == 1
+        assert context.has("canny", 50, 150) and context.has("canny", 30, 100)
+        assert context.has("otsu_mask") and context.has("hsv")
+    finally:
+        ImageContext.register_plane("gray", original)
+    print("✅ Gray plane built once for all analyzers")
+
+
+def test_custom_plane_registration():
+    """Third-party analyzers can add their own cached planes"""
+    print("\n🖼️ Testing custom plane registration...")
+    ImageContext.register_plane("blurred", lambda context, size: cv2.GaussianBlur(context.gray, (size, size), 0))
+    context = ImageContext(pil_image=Image.open(SAMPLE_IMAGE).convert("RGB"))
+    blurred = context.get("blurred", 5)
+    assert blurred.shape == context.shape
+    assert context.get("blurred", 5) is blurred
+    assert not blurred.flags.writeable
+    print("✅ Custom plane cached and read-only")
+
+
+def test_context_keeps_caller_arrays_writeable():
+    """Wrapping an array must not lock the caller's copy"""
+    print("\n🖼️ Testing caller array ownership...")
+    bgr = np.zeros((20, 30, 3), np.uint8)
+    context = ImageContext(bgr=bgr)
+    assert not context.bgr.flags.writeable
+    bgr[0, 0] = 255
+    assert context.shape == (20, 30)
+    print("✅ Caller array still writeable")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Image Context")
+    print("=" * 50)
+    tests = [
+        test_planes_are_built_once,
+        test_custom_plane_registration,
+        test_context_keeps_caller_arrays_writeable,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test the pluggable MobileNetV2 inference backends
+"""
+
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.inference_backends import (
+    BACKEND_NAMES, LABELS_FILE, ONNXRUNTIME_AVAILABLE, TORCH_AVAILABLE, create_backend, export_model,
+    load_labels, measure_backend, top1_agreement,
+)
+
+MODEL_SNAPSHOT = (Path(__file__).parent / "model_cache" / "models--linkanjarad--mobilenet_v2_1.0_224-plant-disease-identification"
+                  / "snapshots" / "c1861579a670fb6232258805b801cd4137cb7176")
+
+
+class LinearBackend:
+    """numpy stand-in backend: a fixed projection of the pooled pixels, optionally with noise"""
+
+    def __init__(self, noise=0.0, seed=0):
+        self.weights = np.random.default_rng(1).standard_normal((3, 38)).astype(np.float32)
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.labels = {i: f"class {i}" for i in range(38)}
+
+    def run(self, pixel_values):
+        embeddings = pixel_values.mean(axis=(2, 3))
+        logits = embeddings @ self.weights
+        return logits + self.noise * self.rng.standard_normal(logits.shape).astype(np.float32), embeddings
+
+
+def random_pixels(n, seed=0):
+    return np.random.default_rng(seed).uniform(-1, 1, size=(n, 3, 224, 224)).astype(np.float32)
+
+
+def random_mobilenet():
+    """The plant disease MobileNetV2 architecture with random weights (no download needed)"""
+    from transformers import AutoConfig, AutoModelForImageClassification
+    return AutoModelForImageClassification.from_config(AutoConfig.from_pretrained(MODEL_SNAPSHOT)).eval()
+
+
+def test_backend_selection_errors():
+    """Unknown names and missing exports fail with actionable messages"""
+    print("\n🧠 Testing backend selection...")
+    try:
+        create_backend("tensorrt")
+        assert False, "expected ValueError"
+    except ValueError as e:
+        assert all(name in str(e) for name in BACKEND_NAMES)
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            create_backend("onnx-int8", directory=directory)
+            assert False, "expected FileNotFoundError"
+        except FileNotFoundError as e:
+            assert "export_model.py" in str(e)
+        try:
+            create_backend("torchscript", directory=directory)
+            assert False, "expected FileNotFoundError"
+        except (FileNotFoundError, ImportError):
+            pass
+
+        with open(Path(directory) / LABELS_FILE, "w") as f:
+            json.dump({"0": "Apple___Apple_scab", "12": "Tomato___healthy"}, f)
+        assert load_labels(directory) == {0: "Apple___Apple_scab", 12: "Tomato___healthy"}
+    print("✅ Clear errors for unknown backends and missing exports")
+
+
+def test_top1_agreement():
+    """Agreement counts matching argmax classes across batches"""
+    print("\n🧠 Testing the top-1 agreement check...")
+    pixels = random_pixels(40)
+    reference = LinearBackend()
+    same = top1_agreement(reference, LinearBackend(), pixels, batch_size=16)
+    assert same == {"agreement": 1.0, "images": 40, "max_logit_difference": 0.0}
+    noisy = top1_agreement(reference, LinearBackend(noise=0.05), pixels)
+    assert 0 < noisy["agreement"] < 1 and noisy["max_logit_difference"] > 0
+    print(f"✅ Identical 100%, noisy {noisy['agreement']:.0%}")
+
+
+def test_measure_backend():
+    """Latency percentiles and throughput are reported per batch"""
+    print("\n🧠 Testing backend measurement...")
+    stats = measure_backend(LinearBackend(), random_pixels(4), repeats=5)
+    assert stats["batch_size"] == 4 and stats["p50_ms"] <= stats["p99_ms"]
+    assert stats["images_per_second"] > 0 and stats["resident_mb"] > 0
+    print(f"✅ {stats}")
+
+
+def test_exported_backends_agree():
+    """TorchScript and int8 ONNX exports pick the fp32 model's class"""
+    print("\n🧠 Testing exported backends...")
+    if not (TORCH_AVAILABLE and ONNXRUNTIME_AVAILABLE):
+        raise unittest.SkipTest("torch/onnxruntime not installed")
+    model = random_mobilenet()
+    pixels = random_pixels(16)
+    with tempfile.TemporaryDirectory() as directory:
+        export_model(model, directory)
+        reference = create_backend("eager", model)
+        for name in BACKEND_NAMES[1:]:
+            backend = create_backend(name, directory=directory)
+            assert backend.labels == reference.labels
+            check = top1_agreement(reference, backend, pixels)
+            assert check["agreement"] >= 0.9, (name, check)
+            logits, embeddings = backend.run(pixels[:3])
+            assert logits.shape == (3, len(reference.labels)) and embeddings.shape[0] == 3
+            print(f"   {name}: {check}")
+    print("✅ Exports agree with fp32")
+
+
+def run_benchmark(batch_size=8):
+    """Latency and memory of each backend on the MobileNetV2 architecture"""
+    print("\n⏱️  Backend latency...")
+    if not (TORCH_AVAILABLE and ONNXRUNTIME_AVAILABLE):
+        print("   torch/onnxruntime not installed, skipping (run export_model.py --benchmark with the real model)")
+        return None
+    model = random_mobilenet()
+    pixels = random_pixels(batch_size)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = export_model(model, directory)
+        for name in BACKEND_NAMES:
+            backend = create_backend(name, model, directory)
+            for size in (1, batch_size):
+                results[(name, size)] = stats = measure_backend(backend, pixels[:size])
+                print(f"   {name} batch {size}: p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms, "
+                      f"{stats['images_per_second']} img/s")
+        sizes = {name: round(path.stat().st_size / 2 ** 20, 1) for name, path in paths.items()}
+        print(f"   model files (MB): {sizes}")
+    return results
+
+
+def main():
+    """Run all inference backend tests"""
+    print("🧪 Inference Backend Tests")
+    print("=" * 50)
+
+    tests = [
+        test_backend_selection_errors,
+        test_top1_agreement,
+        test_measure_backend,
+        test_exported_backends_agree,
+    ]
+    passed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except unittest.SkipTest as e:
+            skipped += 1
+            print(f"⏭️  {test.__name__} skipped: {e}")
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed, {skipped} skipped")
+    return passed + skipped == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test the connected-component lesion engine
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.disease_predictor import analyze_shapes_and_contours
+from models.image_context import ImageContext
+from models.lesion_engine import LESION_DTYPE, detect_lesions, lesion_features
+
+
+def make_mask():
+    """A disk, a rectangle and a speck below the minimum lesion size"""
+    mask = np.zeros((400, 400), dtype=np.uint8)
+    cv2.circle(mask, (100, 100), 50, 255, -1)
+    cv2.rectangle(mask, (200, 200), (299, 249), 255, -1)
+    mask[5:7, 5:7] = 255
+    return mask
+
+
+def make_specks(count=5000, side=2000, seed=0):
+    """Thousands of small random blobs, as on a heavily spotted leaf"""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((side, side), dtype=np.uint8)
+    for x, y, radius in zip(rng.integers(0, side, count), rng.integers(0, side, count), rng.integers(2, 6, count)):
+        cv2.circle(mask, (int(x), int(y)), int(radius), 255, -1)
+    return mask
+
+
+def test_lesion_records():
+    """Per-lesion area, bbox, centroid, perimeter and circularity"""
+    print("\n🔬 Testing lesion records...")
+    lesions = detect_lesions(make_mask())
+    assert lesions.dtype == LESION_DTYPE
+    assert len(lesions) == 2
+
+    disk, rectangle = lesions
+    assert abs(disk['area'] - np.pi * 50 ** 2) / (np.pi * 50 ** 2) < 0.01
+    assert list(disk['bbox']) == [50, 50, 101, 101]
+    assert np.allclose(disk['centroid'], [100, 100])
+    assert abs(disk['perimeter'] - 2 * np.pi * 50) / (2 * np.pi * 50) < 0.06
+    assert disk['circularity'] > rectangle['circularity']
+
+    assert rectangle['area'] == 100 * 50
+    assert list(rectangle['bbox']) == [200, 200, 100, 50]
+    assert np.allclose(rectangle['centroid'], [249.5, 224.5])
+    assert rectangle['perimeter'] == 2 * (99 + 49)
+    print(f"✅ Disk circularity {disk['circularity']:.3f}, rectangle {rectangle['circularity']:.3f}")
+
+
+def test_features_from_lesions():
+    """Shape features are derived from the lesion array"""
+    print("\n🔬 Testing derived shape features...")
+    mask = make_mask()
+    lesions = detect_lesions(mask)
+    features = analyze_shapes_and_contours(ImageContext(rgb=np.dstack([mask] * 3)))
+    areas = lesions['area'].astype(np.float64)
+
+    assert features == lesion_features(lesions)
+    assert features['spot_count'] == 2
+    assert features['avg_spot_size'] == areas.mean()
+    assert features['size_variance'] == areas.var()
+    assert np.isclose(features['shape_irregularity'], 1 - lesions['circularity'].mean())
+
+    empty = lesion_features(detect_lesions(np.zeros((50, 50), dtype=np.uint8)))
+    assert empty == {'spot_count': 0, 'avg_spot_size': 0, 'shape_irregularity': 0, 'size_variance': 0}
+    print(f"✅ {features}")
+
+
+def test_lesions_are_cached_on_the_context():
+    """The lesion array is a shared, read-only context plane"""
+    print("\n🔬 Testing lesion plane caching...")
+    context = ImageContext(rgb=np.dstack([make_mask()] * 3))
+    analyze_shapes_and_contours(context)
+    assert context.has('lesions')
+    assert context.get('lesions') is context.get('lesions')
+    assert not context.get('lesions').flags.writeable
+    print("✅ Lesions computed once per image")
+
+
+def legacy_contour_features(mask):
+    """The findContours implementation the engine replaced"""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    areas = [cv2.contourArea(c) for c in contours if cv2.contourArea(c) > 10]
+    perimeters = [cv2.arcLength(c, True) for c in contours if cv2.contourArea(c) > 10]
+    circularities = []
+    for i, contour in enumerate(contours):
+        if len(areas) > i and areas[i] > 10:
+            circularities.append(4 * np.pi * areas[i] / (perimeters[i] ** 2) if perimeters[i] > 0 else 0)
+    return len(areas)
+
+
+def run_benchmark():
+    """Lesion engine against the contour loop on masks with thousands of specks"""
+    print("\n⏱️  Lesion benchmark")
+    for count, side in ((5000, 2000), (200000, 4000)):
+        mask = make_specks(count, side)
+        for label, func in (("contour loop", legacy_contour_features),
+                            ("connected components", lambda m: len(detect_lesions(m)))):
+            start = time.perf_counter()
+            spots = func(mask)
+            print(f"   {side}x{side}, {count:6d} specks  {label:22s} {time.perf_counter() - start:6.3f}s  {spots} spots")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Lesion Engine")
+    print("=" * 50)
+    tests = [
+        test_lesion_records,
+        test_features_from_lesions,
+        test_lesions_are_cached_on_the_context,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    run_benchmark()
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
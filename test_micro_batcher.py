@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Test the micro-batching inference queue
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.micro_batcher import MicroBatcher
+
+
+class RecordingModel:
+    """Batched stand-in model that records the batch sizes it was called with"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, items):
+        self.batches.append(len(items))
+        time.sleep(self.delay)
+        return [item * 2 for item in items]
+
+
+def test_results_follow_requests():
+    """Every caller gets the result for its own item"""
+    print("\n📦 Testing per-request results...")
+    batcher = MicroBatcher(RecordingModel(), max_batch_size=4, max_wait_ms=5)
+    try:
+        futures = [batcher.submit(i) for i in range(10)]
+        assert [future.result(5) for future in futures] == [i * 2 for i in range(10)]
+        assert batcher(21, timeout=5) == 42
+    finally:
+        batcher.close()
+    print("✅ Results dispatched in order")
+
+
+def test_concurrent_requests_share_batches():
+    """Concurrent callers are grouped, never above max_batch_size"""
+    print("\n📦 Testing batching of concurrent callers...")
+    model = RecordingModel(delay=0.005)
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=20)
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda i: batcher(i, timeout=5), range(64)))
+        assert results == [i * 2 for i in range(64)]
+    finally:
+        batcher.close()
+    stats = batcher.get_stats()
+    assert max(model.batches) <= 8
+    assert stats["requests"] == 64 and stats["batches"] == len(model.batches)
+    assert stats["mean_batch_size"] > 2, stats
+    print(f"✅ {stats['batches']} batches, mean size {stats['mean_batch_size']}")
+
+
+def test_lone_request_waits_at_most_max_wait():
+    """A single request is not held much longer than max_wait_ms"""
+    print("\n📦 Testing the wait bound...")
+    batcher = MicroBatcher(RecordingModel(), max_batch_size=8, max_wait_ms=30)
+    try:
+        batcher(0, timeout=5)  # start the worker
+        start = time.perf_counter()
+        batcher(1, timeout=5)
+        waited = time.perf_counter() - start
+    finally:
+        batcher.close()
+    assert 0.025 <= waited < 0.5, waited
+    print(f"✅ Lone request answered after {waited * 1000:.1f} ms")
+
+
+def test_failures_reach_every_caller():
+    """A failing batch raises in each of its callers and the worker keeps going"""
+    print("\n📦 Testing error propagation...")
+
+    def flaky(items):
+        if any(item < 0 for item in items):
+            raise ValueError("bad input")
+        return items
+
+    def short(items):
+        return items[:-1]
+
+    batcher = MicroBatcher(flaky, max_batch_size=4, max_wait_ms=50)
+    try:
+        futures = [batcher.submit(item) for item in (1, -1, 2)]
+        for future in futures:
+            try:
+                future.result(5)
+                assert False, "expected ValueError"
+            except ValueError:
+                pass
+        assert batcher(3, timeout=5) == 3
+        assert batcher.get_stats()["failed_batches"] == 1
+    finally:
+        batcher.close()
+
+    batcher = MicroBatcher(short, max_batch_size=2, max_wait_ms=1)
+    try:
+        batcher(1, timeout=5)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    finally:
+        batcher.close()
+    print("✅ Batch errors raised per caller")
+
+
+def test_close():
+    """close() drains queued requests, then refuses new ones"""
+    print("\n📦 Testing close...")
+    batcher = MicroBatcher(RecordingModel(delay=0.01), max_batch_size=2, max_wait_ms=1)
+    futures = [batcher.submit(i) for i in range(6)]
+    batcher.close()
+    assert all(future.done() for future in futures)
+    assert [future.result() for future in futures] == [0, 2, 4, 6, 8, 10]
+    try:
+        batcher.submit(7)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    MicroBatcher(RecordingModel()).close()  # never started
+    print("✅ Queued requests finished on close")
+
+
+def run_benchmark(clients=16, requests_per_client=8, max_batch_size=8, max_wait_ms=10):
+    """
+    Concurrent clients against batch-1 calls behind a lock (the current path)
+    and against the batcher. The stand-in model is a pooled 1280-dim
+    projection with a fixed per-call overhead, like a CPU forward pass.
+    """
+    print("\n⏱️  Micro-batching throughput...")
+    rng = np.random.default_rng(0)
+    weights = rng.standard_normal((224 * 224 // 16, 1280)).astype(np.float32)
+    inputs = [rng.standard_normal(weights.shape[0]).astype(np.float32) for _ in range(clients)]
+
+    def forward(batch):
+        time.sleep(0.002)
+        return list(np.stack(batch) @ weights)
+
+    model_lock = threading.Lock()
+
+    def single(item):
+        with model_lock:
+            return forward([item])[0]
+
+    def measure(predict):
+        latencies = []
+
+        def client(item):
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                predict(item)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            list(pool.map(client, inputs))
+        elapsed = time.perf_counter() - start
+        return np.percentile(latencies, 50), np.percentile(latencies, 99), len(latencies) / elapsed
+
+    batcher = MicroBatcher(forward, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    try:
+        results = {"batch size 1": measure(single), "micro-batched": measure(batcher)}
+    finally:
+        batcher.close()
+    for name, (p50, p99, throughput) in results.items():
+        print(f"   {name}: p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms, {throughput:.0f} images/s")
+    print(f"   mean batch size {batcher.get_stats()['mean_batch_size']}")
+    return results
+
+
+def main():
+    """Run all micro-batcher tests"""
+    print("🧪 Micro-Batcher Tests")
+    print("=" * 50)
+
+    tests = [
+        test_results_follow_requests,
+        test_concurrent_requests_share_batches,
+        test_lone_request_waits_at_most_max_wait,
+        test_failures_reach_every_caller,
+        test_close,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Test background and offline model loading, and measure MCP server startup
+"""
+
+import importlib.util
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models.model_loader as model_loader
+from models.model_loader import ModelLoader, load_offline_model, resident_memory_mb, resolve_snapshot, snapshot_weights
+
+SERVER = Path(__file__).parent / "server.py"
+MODEL_CACHE = Path(__file__).parent / "model_cache"
+MODEL_REPO = "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification"
+
+
+class SlowLoad:
+    """Stand-in model load that blocks until released and counts its calls"""
+
+    def __init__(self, error=None):
+        self.release = threading.Event()
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return "model"
+
+
+def test_status_transitions():
+    """not_loaded -> loading -> loaded, with the load run once"""
+    print("\n⏳ Testing status transitions...")
+    load = SlowLoad()
+    loader = ModelLoader(load)
+    assert loader.status == "not_loaded" and not loader.ready
+    loader.start()
+    loader.start()
+    assert loader.status == "loading"
+    load.release.set()
+    assert loader.wait(5) == "model"
+    assert loader.status == "loaded" and loader.ready and load.calls == 1
+    assert loader.get_stats()["load_seconds"] is not None and loader.get_stats()["resident_mb"] > 0
+    print(f"✅ {loader.get_stats()}")
+
+
+def test_callers_wait_for_readiness():
+    """Concurrent callers block until the model is ready and share one load"""
+    print("\n⏳ Testing concurrent waiters...")
+    load = SlowLoad()
+    loader = ModelLoader(load, mode="lazy")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        waiters = [pool.submit(loader.wait, 5) for _ in range(4)]
+        time.sleep(0.05)
+        assert not any(waiter.done() for waiter in waiters)
+        load.release.set()
+        assert [waiter.result() for waiter in waiters] == ["model"] * 4
+    assert load.calls == 1
+    print("✅ One load, four callers served")
+
+
+def test_errors_and_timeouts():
+    """A failed load reports error: ...; a slow one times out while still loading"""
+    print("\n⏳ Testing failures...")
+    load = SlowLoad(error=OSError("weights missing"))
+    loader = ModelLoader(load)
+    load.release.set()
+    try:
+        loader.wait(5)
+        assert False, "expected OSError"
+    except OSError:
+        pass
+    assert loader.status == "error: weights missing" and not loader.ready
+
+    slow = SlowLoad()
+    loader = ModelLoader(slow, timeout=0.05)
+    try:
+        loader.wait()
+        assert False, "expected TimeoutError"
+    except TimeoutError:
+        pass
+    assert loader.status == "loading"
+    slow.release.set()
+
+    try:
+        ModelLoader(slow, mode="eager")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert ModelLoader.from_config(slow, {"mode": "lazy", "timeout_seconds": 9}).timeout == 9
+    print(f"✅ {loader.status}")
+
+
+def fake_cache(root, commit="abc123", files=("config.json", "preprocessor_config.json", "pytorch_model.bin")):
+    """A Hugging Face style cache holding one snapshot of MODEL_REPO"""
+    repo_dir = Path(root) / f"models--{MODEL_REPO.replace('/', '--')}"
+    (repo_dir / "refs").mkdir(parents=True)
+    (repo_dir / "refs" / "main").write_text(commit + "\n")
+    snapshot = repo_dir / "snapshots" / commit
+    snapshot.mkdir(parents=True)
+    for name in files:
+        (snapshot / name).write_text("{}")
+    return snapshot
+
+
+def test_offline_snapshot_resolution():
+    """refs/main is followed to its snapshot; missing pieces fail with a clear message"""
+    print("\n⏳ Testing offline snapshot resolution...")
+    with tempfile.TemporaryDirectory() as root:
+        snapshot = fake_cache(root)
+        assert resolve_snapshot(root, MODEL_REPO) == snapshot
+        assert resolve_snapshot(root, MODEL_REPO, revision="abc123") == snapshot
+        try:
+            resolve_snapshot(root, MODEL_REPO, revision="v2")
+            assert False, "expected FileNotFoundError"
+        except FileNotFoundError as e:
+            assert "No snapshot for revision 'v2'" in str(e), e
+        try:
+            resolve_snapshot(root, "someone/other-model")
+            assert False, "expected FileNotFoundError"
+        except FileNotFoundError as e:
+            assert "not in the offline cache" in str(e)
+    print("✅ Snapshots resolved from refs")
+
+
+def test_offline_weight_files():
+    """main ships pytorch_model.bin only; model.safetensors is preferred where present"""
+    print("\n⏳ Testing offline weight files...")
+    with tempfile.TemporaryDirectory() as root:
+        # Like the real cache: safetensors recorded as absent on main
+        snapshot = fake_cache(root)
+        no_exist = snapshot.parent.parent / ".no_exist" / snapshot.name
+        no_exist.mkdir(parents=True)
+        (no_exist / "model.safetensors").write_text("")
+        assert snapshot_weights(resolve_snapshot(root, MODEL_REPO)) == snapshot / "pytorch_model.bin"
+        (snapshot / "model.safetensors").write_text("{}")
+        assert snapshot_weights(snapshot) == snapshot / "model.safetensors"
+
+    with tempfile.TemporaryDirectory() as root:
+        snapshot = fake_cache(root, files=("config.json", "preprocessor_config.json"))
+        assert resolve_snapshot(root, MODEL_REPO, files=("preprocessor_config.json",), weights=()) == snapshot
+        # Fail fast, before importing torch
+        start = time.perf_counter()
+        loader = ModelLoader(lambda: load_offline_model(root, MODEL_REPO))
+        try:
+            loader.wait(5)
+            assert False, "expected FileNotFoundError"
+        except FileNotFoundError:
+            pass
+        elapsed = time.perf_counter() - start
+        assert loader.status.startswith("error: Offline snapshot")
+        assert "model.safetensors or pytorch_model.bin" in loader.status
+        assert elapsed < 1, elapsed
+    print(f"✅ Weights found; incomplete cache failed in {elapsed * 1000:.1f} ms")
+
+
+def test_resident_memory_without_proc():
+    """Resident memory falls back to getrusage, and is None where neither source exists (Windows)"""
+    print("\n📏 Testing resident memory reporting...")
+    if model_loader.RESOURCE_AVAILABLE:
+        assert resident_memory_mb() > 0
+
+    def no_proc(*args, **kwargs):
+        raise FileNotFoundError("/proc/self/statm")
+
+    saved = model_loader.RESOURCE_AVAILABLE
+    model_loader.open = no_proc
+    try:
+        if saved:
+            assert resident_memory_mb() > 0
+        model_loader.RESOURCE_AVAILABLE = False
+        assert resident_memory_mb() is None
+    finally:
+        del model_loader.open
+        model_loader.RESOURCE_AVAILABLE = saved
+    print("✅ RSS reported where available, skipped otherwise")
+
+
+def test_offline_load_is_strict():
+    """A pytorch_model.bin snapshot loads to the saved model; a checkpoint missing a parameter is rejected"""
+    print("\n⏳ Testing strict offline loading...")
+    if importlib.util.find_spec("torch") is None or importlib.util.find_spec("transformers") is None:
+        raise unittest.SkipTest("torch/transformers not installed")
+    import torch
+    from transformers import MobileNetV2Config, MobileNetV2ForImageClassification
+
+    checked_in = resolve_snapshot(MODEL_CACHE, MODEL_REPO, weights=())
+    config = MobileNetV2Config(depth_multiplier=0.35, num_labels=3, image_size=32)
+    model = MobileNetV2ForImageClassification(config).eval()
+    with tempfile.TemporaryDirectory() as root:
+        snapshot = fake_cache(root, files=())
+        config.save_pretrained(snapshot)
+        (snapshot / "preprocessor_config.json").write_text((checked_in / "preprocessor_config.json").read_text())
+        torch.save(model.state_dict(), snapshot / "pytorch_model.bin")
+
+        _, loaded = load_offline_model(root, MODEL_REPO)
+        pixels = torch.rand(1, 3, 32, 32)
+        with torch.no_grad():
+            assert torch.allclose(loaded(pixels).logits, model(pixels).logits)
+
+        state_dict = model.state_dict()
+        state_dict.pop("classifier.weight")
+        torch.save(state_dict, snapshot / "pytorch_model.bin")
+        try:
+            load_offline_model(root, MODEL_REPO)
+            assert False, "expected RuntimeError"
+        except RuntimeError as e:
+            assert "classifier.weight" in str(e)
+    print("✅ Loaded from pytorch_model.bin; incomplete checkpoint rejected")
+
+
+def test_server_startup_hooks():
+    """The server's lifespan starts the background load; server.MODEL_STATUS keeps its old values"""
+    print("\n⏳ Testing server startup hooks...")
+    if importlib.util.find_spec("fastmcp") is None:
+        raise unittest.SkipTest("fastmcp not installed")
+    import asyncio
+    import server
+
+    saved = server.MODEL_LOADER
+    try:
+        load = SlowLoad()
+        server.MODEL_LOADER = ModelLoader(load)
+
+        async def start_server():
+            async with server.server_lifespan(server.mcp):
+                return server.MODEL_LOADER.status
+
+        assert asyncio.run(start_server()) == "loading"
+        load.release.set()
+        assert server.MODEL_STATUS == "loaded"
+
+        failing = SlowLoad(error=OSError("weights missing"))
+        failing.release.set()
+        server.MODEL_LOADER = ModelLoader(failing, mode="lazy")
+        assert server.MODEL_STATUS == "error: weights missing"
+    finally:
+        server.MODEL_LOADER = saved
+    print("✅ Load started by the lifespan hook")
+
+
+def first_tools_list_seconds(timeout=120):
+    """Launch server.py over stdio and time the MCP handshake up to the first tools/list reply"""
+    messages = [
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {
+            "protocolVersion": "2024-11-05", "capabilities": {},
+            "clientInfo": {"name": "startup-benchmark", "version": "1.0"}}},
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/list"},
+    ]
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, str(SERVER)], cwd=SERVER.parent, text=True,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    try:
+        server.stdin.write("".join(json.dumps(message) + "\n" for message in messages))
+        server.stdin.flush()
+        while time.perf_counter() - start < timeout:
+            line = server.stdout.readline()
+            if not line:
+                raise RuntimeError("server exited before answering tools/list")
+            reply = json.loads(line)
+            if reply.get("id") == 2:
+                return time.perf_counter() - start, len(reply["result"]["tools"])
+        raise TimeoutError("no tools/list reply")
+    finally:
+        server.kill()
+        server.wait()
+
+
+def run_benchmark():
+    """Offline model load time and memory, and time from launching server.py to its first tools/list reply"""
+    print("\n⏱️  Offline model load...")
+    try:
+        snapshot_weights(resolve_snapshot(MODEL_CACHE, MODEL_REPO))
+        before = resident_memory_mb()
+        start = time.perf_counter()
+        load_offline_model(MODEL_CACHE, MODEL_REPO)
+        print(f"   loaded in {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"resident {before} -> {resident_memory_mb()} MB")
+    except (FileNotFoundError, ImportError) as e:
+        print(f"   skipped: {e}")
+
+    print("\n⏱️  Server startup...")
+    if importlib.util.find_spec("fastmcp") is None:
+        print("   fastmcp not installed, skipping the server startup benchmark")
+        return None
+    elapsed, tools = first_tools_list_seconds()
+    print(f"   first tools/list after {elapsed * 1000:.0f} ms ({tools} tools)")
+    return elapsed
+
+
+def main():
+    """Run all model loader tests"""
+    print("🧪 Model Loader Tests")
+    print("=" * 50)
+
+    tests = [
+        test_status_transitions,
+        test_callers_wait_for_readiness,
+        test_errors_and_timeouts,
+        test_offline_snapshot_resolution,
+        test_offline_weight_files,
+        test_resident_memory_without_proc,
+        test_offline_load_is_strict,
+        test_server_startup_hooks,
+    ]
+    passed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except unittest.SkipTest as e:
+            skipped += 1
+            print(f"⏭️  {test.__name__} skipped: {e}")
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed, {skipped} skipped")
+    return passed + skipped == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
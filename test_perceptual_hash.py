@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test perceptual hashing and near-duplicate lookup
+"""
+
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.perceptual_hash import HASH_METHODS, NearDuplicateIndex, dhash, hamming_distance, phash
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+OTHER_IMAGE = Path(__file__).parent / "rust_fungus-min_1024x1024.webp"
+
+
+def burst_variants():
+    """Re-encoded, slightly brighter, rescaled and slightly cropped copies of the sample, as JPEG bytes"""
+    image = Image.open(SAMPLE_IMAGE).convert("RGB")
+    width, height = image.size
+    variants = [
+        image,
+        ImageEnhance.Brightness(image).enhance(1.08),
+        image.resize((width * 3 // 4, height * 3 // 4)),
+        image.crop((2, 2, width - 2, height - 2)),
+    ]
+    encoded = []
+    for variant in variants:
+        buffer = io.BytesIO()
+        variant.save(buffer, "JPEG", quality=80)
+        encoded.append(buffer.getvalue())
+    return encoded
+
+
+def test_near_duplicates_are_close():
+    """Burst shots of one leaf hash within a few bits; another leaf does not"""
+    print("\n🔁 Testing hash distances...")
+    variants = burst_variants()
+    for name, method in HASH_METHODS.items():
+        reference = method(str(SAMPLE_IMAGE))
+        distances = [hamming_distance(reference, method(io.BytesIO(data))) for data in variants]
+        other = hamming_distance(reference, method(str(OTHER_IMAGE)))
+        print(f"   {name}: burst {distances}, other leaf {other}")
+        assert max(distances) <= 6
+        assert other > 12
+    print("✅ Near-duplicates within 6 bits")
+
+
+def test_index_lookup():
+    """Hits reuse the stored result; misses, expiry and eviction behave"""
+    print("\n🔁 Testing the near-duplicate index...")
+    index = NearDuplicateIndex(max_entries=2, max_distance=3, max_age=600)
+    assert index.lookup(0b1011) is None
+
+    index.add(0b1011, {"detected_disease": "rust"}, "a.jpg")
+    result, source, distance = index.lookup(0b1010)
+    assert result == {"detected_disease": "rust"} and source == "a.jpg" and distance == 1
+    assert index.lookup(0b1011 ^ 0b111110000) is None
+
+    # The oldest entry is replaced once full
+    index.add(1 << 40, {"detected_disease": "healthy"}, "b.jpg")
+    index.add(1 << 50, {"detected_disease": "blight"}, "c.jpg")
+    assert index.lookup(0b1011) is None
+    assert index.lookup(1 << 50)[1] == "c.jpg"
+
+    # High-bit hashes round-trip through the uint64 store
+    index.add(2 ** 64 - 1, {"detected_disease": "scorch"}, "d.jpg")
+    assert index.lookup(2 ** 64 - 2)[2] == 1
+
+    stats = index.get_stats()
+    assert stats["hits"] == 3 and stats["misses"] == 3 and stats["hit_rate"] == 0.5
+    assert stats["entries"] == 2
+
+    expired = NearDuplicateIndex(max_age=0)
+    expired.add(7, {}, "old.jpg")
+    time.sleep(0.01)
+    assert expired.lookup(7) is None
+    print(f"✅ {stats}")
+
+
+def test_index_on_real_bursts():
+    """A burst after the first shot is answered from the index"""
+    print("\n🔁 Testing a burst of shots...")
+    index = NearDuplicateIndex(max_distance=6)
+    predictions = 0
+    for data in burst_variants() + [OTHER_IMAGE.read_bytes()]:
+        image_hash = index.hash(io.BytesIO(data))
+        if index.lookup(image_hash) is None:
+            predictions += 1
+            index.add(image_hash, {"detected_disease": f"prediction {predictions}"})
+    assert predictions == 2
+    print(f"✅ 5 shots, 2 predictions, hit rate {index.get_stats()['hit_rate']}")
+
+
+def run_benchmark(repeats=20):
+    """Hashing cost against a full decode"""
+    print("\n⏱️  Hashing cost...")
+    data = SAMPLE_IMAGE.read_bytes()
+    timings = {}
+    for name, function in [("full decode", lambda: np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))),
+                           ("dhash", lambda: dhash(io.BytesIO(data))),
+                           ("phash", lambda: phash(io.BytesIO(data)))]:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            function()
+        timings[name] = (time.perf_counter() - start) / repeats
+        print(f"   {name}: {timings[name] * 1000:.2f} ms")
+    return timings
+
+
+def main():
+    """Run all perceptual hash tests"""
+    print("🧪 Perceptual Hash Tests")
+    print("=" * 50)
+
+    tests = [
+        test_near_duplicates_are_close,
+        test_index_lookup,
+        test_index_on_real_bursts,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test the preallocated MobileNetV2 preprocessing pipeline against the image processor
+"""
+
+import importlib.util
+import sys
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.preprocessing import ImagePreprocessor
+
+MODEL_SNAPSHOT = (Path(__file__).parent / "model_cache" / "models--linkanjarad--mobilenet_v2_1.0_224-plant-disease-identification"
+                  / "snapshots" / "c1861579a670fb6232258805b801cd4137cb7176")
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+LARGE_IMAGE = Path(__file__).parent / "rust_fungus-min_1024x1024.webp"
+TOLERANCE = 1e-5
+
+
+def sample_inputs():
+    """Landscape, portrait, square, odd-sized, tiny and non-RGB inputs"""
+    sample = Image.open(SAMPLE_IMAGE).convert("RGB")
+    large = Image.open(LARGE_IMAGE)
+    return [
+        sample,
+        sample.transpose(Image.Transpose.ROTATE_90),
+        large.convert("RGB"),
+        large.convert("RGB").resize((777, 333)),
+        sample.resize((120, 90)),
+        large.convert("RGBA"),
+        sample.convert("L"),
+    ]
+
+
+def reference_pixel_values(image, shortest_edge=256, crop=224, mean=0.5, std=0.5):
+    """
+    The image processor's steps one at a time, as in transformers'
+    MobileNetV2 processor: shortest-edge bilinear resize, center crop
+    (zero-padding smaller images), rescale in float64, then normalize.
+    """
+    image = image.convert("RGB")
+    width, height = image.size
+    short, long = (width, height) if width <= height else (height, width)
+    new_long = int(shortest_edge * long / short)
+    size = (shortest_edge, new_long) if width <= height else (new_long, shortest_edge)
+    pixels = np.asarray(image.resize(size, resample=Image.Resampling.BILINEAR))
+
+    height, width = pixels.shape[:2]
+    if height < crop or width < crop:
+        padded = np.zeros((max(height, crop), max(width, crop), 3), dtype=np.uint8)
+        top, left = -(-(padded.shape[0] - height) // 2), -(-(padded.shape[1] - width) // 2)
+        padded[top:top + height, left:left + width] = pixels
+        pixels = padded
+        height, width = pixels.shape[:2]
+    top, left = (height - crop) // 2, (width - crop) // 2
+    pixels = pixels[top:top + crop, left:left + crop]
+
+    rescaled = (pixels.astype(np.float64) * (1 / 255)).astype(np.float32)
+    normalized = (rescaled - np.float32(mean)) / np.float32(std)
+    return normalized.transpose(2, 0, 1)
+
+
+def test_matches_processor_steps():
+    """Fused output matches the step-by-step processor pipeline"""
+    print("\n🖼️  Testing against the reference pipeline...")
+    preprocess = ImagePreprocessor.from_config(MODEL_SNAPSHOT)
+    images = sample_inputs()
+    batch = preprocess(images)
+    assert batch.shape == (len(images), 3, 224, 224) and batch.dtype == np.float32
+    for image, pixels in zip(images, batch):
+        difference = float(np.abs(pixels - reference_pixel_values(image)).max())
+        assert difference < TOLERANCE, (image.size, image.mode, difference)
+    print(f"✅ {len(images)} images within {TOLERANCE}")
+
+
+def test_matches_auto_image_processor():
+    """Output matches AutoImageProcessor loaded from the cached snapshot"""
+    print("\n🖼️  Testing against AutoImageProcessor...")
+    if importlib.util.find_spec("transformers") is None:
+        raise unittest.SkipTest("transformers not installed")
+    from transformers import AutoImageProcessor
+    processor = AutoImageProcessor.from_pretrained(MODEL_SNAPSHOT, local_files_only=True)
+    preprocess = ImagePreprocessor.from_config(processor.to_dict())
+    images = [image.convert("RGB") for image in sample_inputs()]
+    expected = processor(images=images, return_tensors="np")["pixel_values"]
+    difference = float(np.abs(preprocess(images) - expected).max())
+    assert difference < TOLERANCE, difference
+    print(f"✅ Max difference {difference:.2e}")
+
+
+def test_config_and_resize_size():
+    """Parameters come from the processor config; output sizes follow its rounding"""
+    print("\n🖼️  Testing configuration...")
+    preprocess = ImagePreprocessor.from_config(MODEL_SNAPSHOT / "preprocessor_config.json")
+    assert preprocess.resize_size(1024, 768) == (341, 256)
+    assert preprocess.resize_size(300, 1000) == (256, 853)
+    assert preprocess.resize_size(500, 500) == (256, 256)
+    assert preprocess.resample == Image.Resampling.BILINEAR
+
+    custom = ImagePreprocessor.from_config({"size": 160, "crop_size": 128, "image_mean": [0.485, 0.456, 0.406],
+                                            "image_std": [0.229, 0.224, 0.225]})
+    pixels = custom([Image.new("RGB", (300, 200), (255, 0, 0))])
+    assert pixels.shape == (1, 3, 128, 128)
+    assert np.allclose(pixels[0, :, 0, 0], [(1 - 0.485) / 0.229, -0.456 / 0.224, -0.406 / 0.225], atol=1e-5)
+    print("✅ Sizes, resampling and normalization from config")
+
+
+def test_buffer_is_reused():
+    """Batches are written into the same preallocated buffer, grown only when needed"""
+    print("\n🖼️  Testing buffer reuse...")
+    preprocess = ImagePreprocessor(max_batch_size=4)
+    images = sample_inputs()
+    first = preprocess(images[:2])
+    first_copy = first.copy()
+    second = preprocess(images[2:4])
+    assert np.shares_memory(first, second)
+    assert not np.array_equal(first, first_copy)  # overwritten by the second call
+    large = preprocess(images)
+    assert len(large) == len(images) and len(preprocess(images[:1])) == 1
+    print("✅ One buffer reused across calls")
+
+
+def run_benchmark(batch_size=8, repeats=10):
+    """Fused, preallocated preprocessing against the step-by-step pipeline and AutoImageProcessor"""
+    print("\n⏱️  Preprocessing cost...")
+    images = [Image.open(LARGE_IMAGE).convert("RGB")] * (batch_size // 2) + \
+             [Image.open(SAMPLE_IMAGE).convert("RGB")] * (batch_size - batch_size // 2)
+    preprocess = ImagePreprocessor.from_config(MODEL_SNAPSHOT, max_batch_size=batch_size)
+    pipelines = {
+        "step-by-step": lambda: np.stack([reference_pixel_values(image) for image in images]),
+        "preallocated": lambda: preprocess(images),
+    }
+    if importlib.util.find_spec("transformers") is not None:
+        from transformers import AutoImageProcessor
+        processor = AutoImageProcessor.from_pretrained(MODEL_SNAPSHOT, local_files_only=True)
+        pipelines["AutoImageProcessor"] = lambda: processor(images=images, return_tensors="np")
+    timings = {}
+    for name, pipeline in pipelines.items():
+        pipeline()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            pipeline()
+        timings[name] = (time.perf_counter() - start) / repeats / batch_size
+        print(f"   {name}: {timings[name] * 1000:.2f} ms/image")
+    return timings
+
+
+def main():
+    """Run all preprocessing tests"""
+    print("🧪 Preprocessing Tests")
+    print("=" * 50)
+
+    tests = [
+        test_matches_processor_steps,
+        test_matches_auto_image_processor,
+        test_config_and_resize_size,
+        test_buffer_is_reused,
+    ]
+    passed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except unittest.SkipTest as e:
+            skipped += 1
+            print(f"⏭️  {test.__name__} skipped: {e}")
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed, {skipped} skipped")
+    return passed + skipped == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
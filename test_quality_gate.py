@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Test the pre-analysis image quality gate
+"""
+
+import io
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models.disease_predictor as predictor
+from models.disease_predictor import analyze_plant_image_bytes, analyze_plant_images_batch
+from models.quality_gate import QualityGate
+from models.stage_profiler import StageProfiler
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+LARGE_IMAGE = Path(__file__).parent / "rust_fungus-min_1024x1024.webp"
+
+
+def sample_bgr():
+    return cv2.imread(str(SAMPLE_IMAGE))
+
+
+def encode(bgr, ext=".png"):
+    return cv2.imencode(ext, bgr)[1].tobytes()
+
+
+def bad_photos():
+    """One photo per rejection reason, keyed on the expected reason code"""
+    bgr = sample_bgr()
+    rng = np.random.default_rng(0)
+    # Textured grey-blue gravel: sharp and well exposed, but no leaf
+    gravel = np.clip(rng.normal(120, 40, size=bgr.shape[:2])[:, :, None] * [1.1, 1.0, 0.9], 0, 255)
+    return {
+        'blurry': cv2.GaussianBlur(bgr, (0, 0), 3),
+        'underexposed': (bgr * 0.15).astype(np.uint8),
+        'overexposed': cv2.add(bgr, np.full_like(bgr, 170)),
+        'too_small': cv2.resize(bgr, (96, 72), interpolation=cv2.INTER_AREA),
+        'no_leaf': gravel.astype(np.uint8),
+    }
+
+
+def test_good_photos_pass():
+    """Real leaf photos pass every check"""
+    print("\n🚦 Testing good photos...")
+    gate = QualityGate()
+    for path in (SAMPLE_IMAGE, LARGE_IMAGE):
+        report = gate.check_bytes(path.read_bytes())
+        assert report['passed'], (path.name, report)
+        print(f"   {path.name}: {report['metrics']}")
+    print("✅ Sample leaves pass")
+
+
+def test_diseased_leaves_pass():
+    """Brown, necrotic and scorched leaves count as leaf, not as an empty frame"""
+    print("\n🚦 Testing necrotic leaves...")
+    gate = QualityGate()
+    bgr = sample_bgr()
+    shading = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY).astype(np.float64)[:, :, None]
+    shading /= shading.mean()
+    leaves = {
+        'brown': np.clip(shading * [30, 70, 120], 0, 255).astype(np.uint8),  # OpenCV hue 13
+        'scorched tan': np.clip(shading * [120, 160, 190], 0, 255).astype(np.uint8),
+        'half necrotic': np.where(np.arange(bgr.shape[1])[None, :, None] < bgr.shape[1] // 2,
+                                  np.clip(shading * [25, 50, 90], 0, 255), bgr).astype(np.uint8),
+    }
+    for name, leaf in leaves.items():
+        report = gate.check(leaf)
+        assert report['passed'], (name, report)
+        assert report['metrics']['leaf_coverage'] > 0.5, (name, report)
+        print(f"   {name}: leaf coverage {report['metrics']['leaf_coverage']:.0%}")
+    print("✅ Diseased leaves pass")
+
+
+def test_bad_photos_are_rejected_with_reasons():
+    """Each unusable photo is rejected with its own reason code"""
+    print("\n🚦 Testing rejections...")
+    gate = QualityGate()
+    for expected, bgr in bad_photos().items():
+        report = gate.check(bgr)
+        codes = [reason['code'] for reason in report['reasons']]
+        assert not report['passed'] and expected in codes, (expected, report)
+        assert all(reason['message'] for reason in report['reasons'])
+        print(f"   {expected}: {codes}")
+    print("✅ Blurry, dark, bright, tiny and leafless photos rejected")
+
+
+def test_thresholds_are_configurable():
+    """Thresholds come from the config block"""
+    print("\n🚦 Testing configured thresholds...")
+    blurry = bad_photos()['blurry']
+    assert not QualityGate.from_config({}).check(blurry)['passed']
+    assert QualityGate.from_config({"min_sharpness": 1.0}).check(blurry)['passed']
+    tiny = QualityGate.from_config({"min_side": 2000}).check(sample_bgr(), source_size=(1500, 1000))
+    assert [reason['code'] for reason in tiny['reasons']] == ['too_small']
+    print("✅ Config overrides apply")
+
+
+def test_rejected_before_analysis():
+    """The predictor returns the rejection without running any analyzer"""
+    print("\n🚦 Testing the disease predictor gate...")
+    original_cache = predictor.DIAGNOSIS_CACHE
+    predictor.DIAGNOSIS_CACHE = None
+    try:
+        blurry = encode(bad_photos()['blurry'])
+        diagnosis = analyze_plant_image_bytes(blurry, StageProfiler(track_memory=False))
+        assert diagnosis['disease'] == "Image Rejected"
+        assert diagnosis['quality']['reasons'][0]['code'] == 'blurry'
+        assert list(diagnosis['profile']) == ['decode', 'quality']
+
+        # Batches reject per image
+        good = SAMPLE_IMAGE.read_bytes()
+        batch = analyze_plant_images_batch([good, blurry])
+        assert batch[0] == analyze_plant_image_bytes(good)
+        assert batch[1]['disease'] == "Image Rejected"
+
+        # Disabling the gate restores full analysis
+        original_gate = predictor.QUALITY_GATE
+        predictor.QUALITY_GATE = None
+        try:
+            assert analyze_plant_image_bytes(blurry)['disease'] != "Image Rejected"
+        finally:
+            predictor.QUALITY_GATE = original_gate
+    finally:
+        predictor.DIAGNOSIS_CACHE = original_cache
+    print(f"✅ {diagnosis['recommendations']}")
+
+
+def run_benchmark(repeats=20):
+    """Gate cost against a full analysis of the same upload"""
+    print("\n⏱️  Gate cost...")
+    gate = QualityGate()
+    image = Image.open(LARGE_IMAGE).convert("RGB").resize((3000, 2000))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    data = buffer.getvalue()
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        gate.check_bytes(data)
+    gate_time = (time.perf_counter() - start) / repeats
+
+    original_cache = predictor.DIAGNOSIS_CACHE
+    predictor.DIAGNOSIS_CACHE = None
+    try:
+        start = time.perf_counter()
+        analyze_plant_image_bytes(data)
+        analysis_time = time.perf_counter() - start
+    finally:
+        predictor.DIAGNOSIS_CACHE = original_cache
+    print(f"   3000x2000 JPEG: gate {gate_time * 1000:.1f} ms, full analysis {analysis_time * 1000:.0f} ms")
+    return gate_time
+
+
+def main():
+    """Run all quality gate tests"""
+    print("🧪 Quality Gate Tests")
+    print("=" * 50)
+
+    tests = [
+        test_good_photos_pass,
+        test_diseased_leaves_pass,
+        test_bad_photos_are_rejected_with_reasons,
+        test_thresholds_are_configurable,
+        test_rejected_before_analysis,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
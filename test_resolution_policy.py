@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test the resolution policy used for uploaded plant images
+"""
+
+import base64
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models.disease_predictor as predictor
+from models.disease_predictor import analyze_plant_image, analyze_plant_images_batch
+from models.resolution_policy import ResolutionPolicy
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+
+
+def encode_bytes(image, fmt="JPEG"):
+    """Encode a PIL image to bytes"""
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def large_leaf(size=(4000, 3000)):
+    """The sample leaf upscaled to a camera-sized frame"""
+    return Image.open(SAMPLE_IMAGE).convert("RGB").resize(size, Image.Resampling.BILINEAR)
+
+
+def test_small_images_stay_at_source_resolution():
+    """Images within the working size are analyzed untouched"""
+    print("\n📐 Testing small images...")
+    image_bytes = SAMPLE_IMAGE.read_bytes()
+    context, source_size = ResolutionPolicy(working_size=1024).open(image_bytes)
+    assert context.shape == source_size[::-1]
+    assert np.array_equal(context.rgb, np.asarray(Image.open(SAMPLE_IMAGE).convert("RGB")))
+    print(f"✅ {source_size} analyzed as-is")
+
+
+def test_large_jpeg_is_reduced_at_decode_time():
+    """Draft decoding plus resize brings big JPEGs to the working size"""
+    print("\n📐 Testing JPEG draft reduction...")
+    image_bytes = encode_bytes(large_leaf())
+    for jpeg_draft in (True, False):
+        context, source_size = ResolutionPolicy(working_size=1000, jpeg_draft=jpeg_draft).open(image_bytes)
+        assert source_size == (4000, 3000)
+        assert context.shape == (750, 1000), context.shape
+        assert context.rgb.shape == (750, 1000, 3)
+
+    png_context, _ = ResolutionPolicy(working_size=1000).open(encode_bytes(large_leaf((2000, 1500)), "PNG"))
+    assert png_context.shape == (750, 1000)
+
+    full_context, _ = ResolutionPolicy(working_size=1000).open(image_bytes, full_resolution=True)
+    assert full_context.shape == (3000, 4000)
+    print("✅ 4000x3000 -> 1000x750")
+
+
+def test_diagnosis_reports_resolution_and_escalates():
+    """Coarse results near a threshold are re-analyzed at full resolution"""
+    print("\n📐 Testing coarse-to-fine escalation...")
+    image_data = base64.b64encode(encode_bytes(large_leaf((1600, 1200)))).decode()
+
+    original_policy, original_cache = predictor.RESOLUTION_POLICY, predictor.DIAGNOSIS_CACHE
+    predictor.DIAGNOSIS_CACHE = None
+    try:
+        predictor.RESOLUTION_POLICY = ResolutionPolicy(working_size=400)
+        coarse = analyze_plant_image.invoke({"image_data": image_data})
+        assert coarse["resolution"]["source"] == [1600, 1200]
+        assert coarse["resolution"]["analyzed"] == [400, 300]
+        assert coarse["resolution"]["escalated"] is False
+
+        # A margin this wide puts every result near a threshold
+        predictor.RESOLUTION_POLICY = ResolutionPolicy(working_size=400, coarse_to_fine=True, decision_margin=10)
+        fine = analyze_plant_image.invoke({"image_data": image_data})
+        assert fine["resolution"]["analyzed"] == [1600, 1200]
+        assert fine["resolution"]["escalated"] is True
+        assert analyze_plant_images_batch([image_data]) == [fine]
+
+        predictor.RESOLUTION_POLICY = ResolutionPolicy(working_size=400, coarse_to_fine=True, decision_margin=0)
+        assert analyze_plant_image.invoke({"image_data": image_data})["resolution"]["escalated"] is False
+    finally:
+        predictor.RESOLUTION_POLICY, predictor.DIAGNOSIS_CACHE = original_policy, original_cache
+    print(f"✅ Coarse: {coarse['disease']} | Fine: {fine['disease']}")
+
+
+def run_benchmark():
+    """Decode + analysis time of a 12 MP JPEG at full and working resolution"""
+    print("\n⏱️  Resolution benchmark (12 MP JPEG)")
+    image_bytes = encode_bytes(large_leaf())
+    for label, policy, full in (
+        ("full resolution", ResolutionPolicy(), True),
+        ("1024 resize only", ResolutionPolicy(working_size=1024, jpeg_draft=False), False),
+        ("1024 draft + resize", ResolutionPolicy(working_size=1024), False),
+    ):
+        start = time.perf_counter()
+        context, _ = policy.open(image_bytes, full_resolution=full)
+        decoded = time.perf_counter()
+        predictor.perform_dynamic_analysis(context)
+        done = time.perf_counter()
+        print(f"   {label:20s} decode {decoded - start:6.3f}s  analysis {done - decoded:6.3f}s  {context.shape}")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Resolution Policy")
+    print("=" * 50)
+    tests = [
+        test_small_images_stay_at_source_resolution,
+        test_large_jpeg_is_reduced_at_decode_time,
+        test_diagnosis_reports_resolution_and_escalates,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    run_benchmark()
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Test the persistent similarity index of past cases
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models.disease_predictor as predictor
+from models.disease_predictor import analyze_plant_image_bytes
+from models.diagnosis_cache import DiagnosisCache
+from models.feature_records import analyze_to_record, to_feature_records
+from models.similarity_index import (
+    FAISS_AVAILABLE,
+    FEATURE_VECTOR_DIM,
+    CaseIndex,
+    SimilarityIndex,
+    feature_vectors,
+)
+from test_feature_records import random_analysis_results
+
+SAMPLE_IMAGES = [Path(__file__).parent / "images.jpeg", Path(__file__).parent / "rust_fungus-min_1024x1024.webp"]
+
+
+def random_cases(rng, count, dim=8):
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    cases = [{"image_key": f"key-{i}", "disease": f"case {i}"} for i in range(count)]
+    return vectors, cases
+
+
+def brute_force(vectors, query, k):
+    return list(np.argsort(((vectors - query) ** 2).sum(axis=1), kind='stable')[:k])
+
+
+def test_feature_vectors():
+    """Vectors have a fixed size and ignore the order of dominant colors"""
+    print("\n🔎 Testing feature vectors...")
+    rng = np.random.default_rng(0)
+    results = random_analysis_results(rng)
+    vectors = feature_vectors(to_feature_records([results]))
+    assert vectors.shape == (1, FEATURE_VECTOR_DIM) and vectors.dtype == np.float32
+    assert np.isfinite(vectors).all()
+
+    results['colors']['dominant_colors'] = results['colors']['dominant_colors'][::-1]
+    assert np.allclose(feature_vectors(to_feature_records([results])), vectors)
+    print(f"✅ {FEATURE_VECTOR_DIM}-dimensional vectors")
+
+
+def test_search_matches_brute_force():
+    """Nearest neighbours across compacted and freshly added rows"""
+    print(f"\n🔎 Testing search ({'faiss' if FAISS_AVAILABLE else 'numpy'} backend)...")
+    rng = np.random.default_rng(1)
+    vectors, cases = random_cases(rng, 300)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SimilarityIndex(tmp, 8, compact_every=200)
+        index.add(vectors[:250], cases[:250])   # compacts into the base, in the background
+        index.wait_for_compaction(10)
+        index.add(vectors[250:], cases[250:])   # stays in the delta
+        stats = index.get_stats()
+        assert stats["indexed"] == 250 and stats["pending"] == 50
+
+        for query in rng.normal(size=(20, 8)).astype(np.float32):
+            matches = index.search(query, k=5)
+            assert [match["id"] for match in matches] == brute_force(vectors, query, 5)
+            assert matches[0]["disease"] == cases[matches[0]["id"]]["disease"]
+            assert matches == sorted(matches, key=lambda match: match["distance"])
+    print("✅ Same neighbours as brute force")
+
+
+def test_persistence_and_compaction():
+    """Reopened indexes answer identically; superseded cases disappear"""
+    print("\n🔎 Testing persistence and compaction...")
+    rng = np.random.default_rng(2)
+    vectors, cases = random_cases(rng, 50)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SimilarityIndex(tmp, 8, compact_every=0)
+        index.add(vectors, cases)
+        query = vectors[7] + 0.01
+        before = index.search(query, k=3)
+
+        reopened = SimilarityIndex(tmp, 8)
+        assert reopened.search(query, k=3) == before
+        assert reopened.search(query, k=3, exclude_key="key-7")[0]["id"] != 7
+
+        # A new case for key-7 far away supersedes the old one
+        reopened.add(np.full((1, 8), 50, dtype=np.float32), [{"image_key": "key-7", "disease": "moved"}])
+        assert all(match["image_key"] != "key-7" for match in reopened.search(query, k=3))
+        assert len(reopened) == 50 and reopened.get_stats()["superseded"] == 1
+
+        reopened.compact()
+        stats = reopened.get_stats()
+        assert stats["rows"] == 50 and stats["superseded"] == 0 and stats["pending"] == 0
+        assert SimilarityIndex(tmp, 8).search(np.full(8, 50, dtype=np.float32), k=1)[0]["disease"] == "moved"
+
+        # An interrupted add (vector written, case not) is rolled back on load
+        with open(Path(tmp) / "vectors.f32", "ab") as f:
+            f.write(np.zeros(8, dtype=np.float32).tobytes())
+        assert SimilarityIndex(tmp, 8).get_stats()["rows"] == 50
+    print("✅ Reload, supersede, compact and recovery work")
+
+
+def test_compaction_is_safe():
+    """A failed compaction keeps the index; cases added during one are carried over"""
+    print("\n🔎 Testing compaction failures and concurrent adds...")
+    rng = np.random.default_rng(3)
+    vectors, cases = random_cases(rng, 40)
+    query = vectors[3] + 0.01
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SimilarityIndex(tmp, 8, compact_every=0)
+        index.add(vectors[:30], cases[:30])
+        index.add(vectors[:1], [{"image_key": "key-0", "disease": "again"}])
+        before = index.search(query, k=5)
+        files = {path.name: path.read_bytes() for path in Path(tmp).iterdir()}
+
+        write_cases = index._write_cases
+
+        def disk_full(path, rows):
+            raise OSError("No space left on device")
+
+        index._write_cases = disk_full
+        try:
+            index.compact()
+            assert False, "expected OSError"
+        except OSError:
+            pass
+        assert index.search(query, k=5) == before and index.get_stats()["superseded"] == 1
+        assert {path.name: path.read_bytes() for path in Path(tmp).iterdir()} == files
+
+        def add_meanwhile(path, rows):
+            write_cases(path, rows)
+            index.add(vectors[30:], cases[30:])
+
+        index._write_cases = add_meanwhile
+        index.compact()
+        index._write_cases = write_cases
+        stats = index.get_stats()
+        assert stats["rows"] == 40 and stats["superseded"] == 0 and stats["pending"] == 10
+        expected = brute_force(np.concatenate([vectors[1:30], vectors[:1], vectors[30:]]), query, 5)
+        assert [match["id"] for match in index.search(query, k=5)] == expected
+        assert SimilarityIndex(tmp, 8).search(query, k=5) == index.search(query, k=5)
+
+        # Past compact_every, add() returns at once and compacts in the background
+        index.compact_every = index._compact_at = 5
+        index.add(vectors[:5] + 1, [{"image_key": f"new-{i}"} for i in range(5)])
+        index.wait_for_compaction(10)
+        stats = index.get_stats()
+        assert stats["pending"] == 0 and stats["compactions"] == 2 and not stats["compacting"]
+
+        # A failed background compaction is counted and retried after compact_every more adds
+        index._write_cases = disk_full
+        index.add(vectors[:5] + 2, [{"image_key": f"later-{i}"} for i in range(5)])
+        index.wait_for_compaction(10)
+        index._write_cases = write_cases
+        stats = index.get_stats()
+        assert stats["errors"] == 1 and "No space" in stats["last_error"] and stats["pending"] == 5
+        assert index.compact_in_background() is not None
+        index.wait_for_compaction(10)
+        assert index.get_stats()["pending"] == 0
+    print("✅ Index kept on failure, concurrent adds carried over")
+
+
+def test_diagnoses_are_indexed():
+    """With a case index attached, every diagnosed image is recorded once"""
+    print("\n🔎 Testing the disease predictor hook...")
+    original_cache = predictor.DIAGNOSIS_CACHE
+    with tempfile.TemporaryDirectory() as tmp:
+        index = CaseIndex(tmp)
+        predictor.set_case_index(index)
+        predictor.DIAGNOSIS_CACHE = DiagnosisCache(max_entries=16)
+        try:
+            diagnoses = [analyze_plant_image_bytes(path.read_bytes()) for path in SAMPLE_IMAGES]
+            # Repeats are answered from the diagnosis cache and not indexed again
+            analyze_plant_image_bytes(SAMPLE_IMAGES[0].read_bytes())
+        finally:
+            predictor.set_case_index(None)
+            predictor.DIAGNOSIS_CACHE = original_cache
+        assert len(index) == 2
+
+        predictor.DIAGNOSIS_CACHE = None
+        try:
+            _, record = analyze_to_record(SAMPLE_IMAGES[1].read_bytes())
+        finally:
+            predictor.DIAGNOSIS_CACHE = original_cache
+        nearest = index.search(feature_vectors(record)[0], k=2)
+        assert nearest[0]["disease"] == diagnoses[1]["disease"]
+        assert nearest[0]["distance"] < nearest[1]["distance"]
+    print(f"✅ 2 cases indexed, nearest to {SAMPLE_IMAGES[1].name} is itself")
+
+
+def run_benchmark(n_cases=100_000, n_queries=100):
+    """Query latency over a large feature index"""
+    print(f"\n⏱️  Searching {n_cases:,} cases...")
+    rng = np.random.default_rng(3)
+    base = feature_vectors(to_feature_records([random_analysis_results(rng) for _ in range(1000)]))
+    vectors = (np.resize(base, (n_cases, FEATURE_VECTOR_DIM))
+               + rng.normal(scale=0.01, size=(n_cases, FEATURE_VECTOR_DIM))).astype(np.float32)
+    cases = [{"image_key": str(i)} for i in range(n_cases)]
+    with tempfile.TemporaryDirectory() as tmp:
+        SimilarityIndex(tmp, FEATURE_VECTOR_DIM, compact_every=0).add(vectors, cases)
+
+        start = time.perf_counter()
+        index = SimilarityIndex(tmp, FEATURE_VECTOR_DIM)
+        load_time = time.perf_counter() - start
+
+        index.search(vectors[0], k=5)
+        start = time.perf_counter()
+        for query in vectors[:n_queries]:
+            index.search(query, k=5)
+        per_query = (time.perf_counter() - start) / n_queries
+    print(f"   Load: {load_time * 1000:.1f} ms, search: {per_query * 1000:.2f} ms/query "
+          f"({'faiss' if FAISS_AVAILABLE else 'numpy'})")
+    return per_query
+
+
+def main():
+    """Run all similarity index tests"""
+    print("🧪 Similarity Index Tests")
+    print("=" * 50)
+
+    tests = [
+        test_feature_vectors,
+        test_search_matches_brute_force,
+        test_persistence_and_compaction,
+        test_compaction_is_safe,
+        test_diagnoses_are_indexed,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
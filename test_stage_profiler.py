@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test per-stage profiling of the disease analysis
+"""
+
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import models.disease_predictor as predictor
+from models.disease_predictor import analyze_plant_image_bytes, get_profile_stats, perform_dynamic_analysis
+from models.resolution_policy import ResolutionPolicy
+from models.stage_profiler import NULL_PROFILER, StageHistograms, StageProfiler
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+
+STAGES = ['decode', 'quality', 'colors', 'texture', 'shapes', 'stats', 'anomalies', 'diagnosis']
+
+
+def test_profile_covers_every_stage():
+    """An opted-in analysis reports every stage with time, memory and resolution"""
+    print("\n⏱️  Testing per-stage profile...")
+    original_cache = predictor.DIAGNOSIS_CACHE
+    predictor.DIAGNOSIS_CACHE = None
+    try:
+        diagnosis = analyze_plant_image_bytes(SAMPLE_IMAGE.read_bytes(), StageProfiler())
+        unprofiled = analyze_plant_image_bytes(SAMPLE_IMAGE.read_bytes())
+    finally:
+        predictor.DIAGNOSIS_CACHE = original_cache
+
+    profile = diagnosis.pop('profile')
+    assert diagnosis == unprofiled
+    assert list(profile) == STAGES
+    for name, entry in profile.items():
+        assert entry['wall_time'] >= 0 and entry['cpu_time'] >= 0, name
+        assert entry['calls'] == 1
+        assert entry['peak_bytes'] is not None
+        if name != 'diagnosis':
+            assert entry['resolution'] == [194, 259], (name, entry['resolution'])
+    assert profile['decode']['peak_bytes'] >= 194 * 259 * 3
+    print("✅ " + ", ".join(f"{name} {entry['wall_time'] * 1000:.1f}ms" for name, entry in profile.items()))
+
+
+def test_histograms_aggregate_profiles():
+    """Finished profiles land in cumulative histogram buckets"""
+    print("\n⏱️  Testing stage histograms...")
+    histograms = StageHistograms(buckets=(0.01, 0.1))
+    for wall_time in (0.005, 0.05, 0.5):
+        histograms.observe({'colors': {'wall_time': wall_time, 'cpu_time': wall_time, 'peak_bytes': 100}})
+    stats = histograms.snapshot()['colors']
+    assert stats['count'] == 3
+    assert stats['buckets'] == {'0.01': 1, '0.1': 2, '+Inf': 3}
+    assert abs(stats['wall_time_sum'] - 0.555) < 1e-9
+    assert stats['max_peak_bytes'] == 100
+
+    predictor.STAGE_HISTOGRAMS.clear()
+    context, _ = ResolutionPolicy().open(SAMPLE_IMAGE.read_bytes())
+    profiler = StageProfiler(track_memory=False)
+    perform_dynamic_analysis(context, profiler=profiler)
+    predictor.finish_profile(profiler, {})
+    exported = get_profile_stats()['stages']
+    assert set(exported) == {'colors', 'texture', 'shapes', 'stats', 'anomalies'}
+    assert all(stage['count'] == 1 for stage in exported.values())
+    print("✅ Histograms exported")
+
+
+def test_concurrent_profilers_share_tracing():
+    """tracemalloc stays on until the last profiler finishes; overlapping stages report no peak"""
+    print("\n⏱️  Testing concurrent profilers...")
+    assert not tracemalloc.is_tracing()
+    first, second = StageProfiler(), StageProfiler()
+    first.finish()
+    assert tracemalloc.is_tracing()  # still in use by 'second'
+
+    with second.stage('alone'):
+        buffer = bytearray(1 << 20)
+    del buffer
+    assert second.stages['alone']['peak_bytes'] >= 1 << 20
+
+    # A stage running in another thread meanwhile makes both peaks unattributable
+    inside, release = threading.Event(), threading.Event()
+
+    def other_request():
+        profiler = StageProfiler()
+        with profiler.stage('colors'):
+            inside.set()
+            release.wait(5)
+        other_reports.append(profiler.finish())
+
+    other_reports = []
+    thread = threading.Thread(target=other_request)
+    thread.start()
+    inside.wait(5)
+    with second.stage('texture'):
+        release.set()
+        thread.join()
+    report = second.finish()
+    assert not tracemalloc.is_tracing()
+    assert report['texture']['peak_bytes'] is None and report['texture']['memory_overlapped'] == 1
+    assert other_reports[0]['colors']['peak_bytes'] is None
+    assert report['alone']['calls'] == 1 and 'memory_overlapped' not in report['alone']
+
+    # Tracing started by someone else is left running
+    tracemalloc.start()
+    StageProfiler().finish()
+    assert tracemalloc.is_tracing()
+    tracemalloc.stop()
+    print("✅ Shared tracing session, overlapping peaks skipped")
+
+
+def test_disabled_profiling_is_cheap():
+    """The null profiler costs at most a few microseconds per stage"""
+    print("\n⏱️  Testing disabled-profiler overhead...")
+    assert predictor.new_profiler(False) is NULL_PROFILER
+
+    def null_stage():
+        with NULL_PROFILER.stage('colors', (1, 1)):
+            pass
+
+    per_stage = min(timeit.repeat(null_stage, number=100000, repeat=3)) / 100000
+    assert per_stage < 5e-6, per_stage
+
+    context, _ = ResolutionPolicy().open(SAMPLE_IMAGE.read_bytes())
+    perform_dynamic_analysis(context)
+    start = time.perf_counter()
+    perform_dynamic_analysis(context)
+    analysis_time = time.perf_counter() - start
+    print(f"✅ {per_stage * 1e9:.0f}ns per disabled stage vs {analysis_time * 1000:.1f}ms per analysis")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Stage Profiler")
+    print("=" * 50)
+    tests = [
+        test_profile_covers_every_stage,
+        test_histograms_aggregate_profiles,
+        test_concurrent_profilers_share_tracing,
+        test_disabled_profiling_is_cheap,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test tiled analysis of large field mosaics
+"""
+
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models.disease_predictor import generate_diagnosis, perform_dynamic_analysis, score_diagnosis
+from models.image_context import ImageContext
+from models.tiled_analysis import ArrayTileSource, analyze_tiled, decode_with_pillow, tile_edges, tile_to_rgb
+
+SAMPLE_IMAGE = Path(__file__).parent / "images.jpeg"
+
+
+def make_mosaic(rows, cols):
+    """Sample leaf repeated in a rows x cols grid"""
+    leaf = np.asarray(Image.open(SAMPLE_IMAGE).convert("RGB"))
+    return np.tile(leaf, (rows, cols, 1))
+
+
+def test_tile_edges():
+    """Short remainders fold into the last tile"""
+    print("\n🧩 Testing tile layout...")
+    assert tile_edges(1000, 400) == [(0, 400), (400, 800), (800, 1000)]
+    assert tile_edges(1000, 300) == [(0, 300), (300, 600), (600, 1000)]
+    assert tile_edges(1000, 250) == [(0, 250), (250, 500), (500, 750), (750, 1000)]
+    assert tile_edges(100, 400) == [(0, 100)]
+    print("✅ Tile edges correct")
+
+
+def test_tiles_match_single_image_analysis():
+    """Each tile is diagnosed exactly as the same crop would be on its own"""
+    print("\n🧩 Testing per-tile diagnoses...")
+    mosaic = make_mosaic(2, 3)
+    height, width = mosaic.shape[:2]
+    result = analyze_tiled(mosaic, tile_size=194)
+
+    assert result["image_size"] == [width, height]
+    assert result["grid_shape"] == [2, 4]
+    assert result["summary"]["tiles_analyzed"] == 8
+    for tile in result["tiles"]:
+        left, top, tile_width, tile_height = tile["window"]
+        crop = mosaic[top:top + tile_height, left:left + tile_width]
+        analysis_results = perform_dynamic_analysis(ImageContext(rgb=crop))
+        assert tile["health_score"] == score_diagnosis(analysis_results)[0]
+        assert tile["disease"] == generate_diagnosis(analysis_results)["disease"]
+        assert result["health_heatmap"][tile["row"], tile["col"]] == np.float32(tile["health_score"])
+    print(f"✅ Summary: {result['summary']['disease']}")
+
+
+def test_no_data_tiles_are_skipped():
+    """Empty (black or transparent) tiles leave a gap in the heatmap"""
+    print("\n🧩 Testing no-data tiles...")
+    mosaic = make_mosaic(2, 2)
+    rgba = np.dstack([mosaic, np.full(mosaic.shape[:2], 255, dtype=np.uint8)])
+    rgba[:194, :194, 3] = 0
+    mosaic[194:, 388:] = 0
+
+    for source in (rgba, mosaic):
+        result = analyze_tiled(source, tile_size=194)
+        assert np.isnan(result["health_heatmap"]).sum() == 1
+        assert result["summary"]["tiles_analyzed"] == result["summary"]["tiles_total"] - 1
+
+    empty = analyze_tiled(np.zeros((300, 300, 3), dtype=np.uint8), tile_size=100)
+    assert empty["summary"]["disease"] == "No Data"
+    print("✅ No-data tiles skipped")
+
+
+def test_half_empty_tiles_ignore_the_fill():
+    """An edge tile is diagnosed on its valid pixels, not on the black no-data fill"""
+    print("\n🧩 Testing half-empty tiles...")
+    leaf = np.asarray(Image.open(SAMPLE_IMAGE).convert("RGB"))[:194, :194]
+    leaf = np.maximum(leaf, 1)  # no pure black pixels of its own
+    tile = np.zeros_like(leaf)
+    tile[:, :97] = leaf[:, :97]
+
+    result = analyze_tiled(tile, tile_size=194)
+    expected = perform_dynamic_analysis(ImageContext(rgb=np.ascontiguousarray(leaf[:, :97])))
+    assert result["tiles"][0]["health_score"] == score_diagnosis(expected)[0]
+    assert result["tiles"][0]["disease"] == generate_diagnosis(expected)["disease"]
+    unmasked = perform_dynamic_analysis(ImageContext(rgb=tile))
+    assert score_diagnosis(unmasked)[0] != score_diagnosis(expected)[0]
+
+    # No-data inside the valid bounding box takes the valid pixels' colour
+    corner = leaf.copy()
+    corner[np.triu_indices(194, 1)] = 0
+    rgb, valid_fraction = tile_to_rgb(corner)
+    assert rgb.shape == corner.shape and rgb.any(axis=2).all()
+    assert 0.45 < valid_fraction < 0.55
+    print(f"✅ Half-empty tile: {result['tiles'][0]['disease']}")
+
+
+def test_high_bit_depth_is_rescaled():
+    """16-bit and float mosaics are mapped to 8-bit by one percentile range instead of wrapping"""
+    print("\n🧩 Testing 16-bit and float mosaics...")
+    mosaic = make_mosaic(2, 2)
+    deep = mosaic.astype(np.uint16) * 200 + 1000
+    deep[:50, :50] = 0
+    source = ArrayTileSource(deep)
+    tiles = [source.read(left, top, 194, 194) for top in (0, 194) for left in (0, 194)]
+    assert all(tile.dtype == np.uint8 for tile in tiles)
+    tile = source.read(0, 0, mosaic.shape[1], mosaic.shape[0])
+    assert (tile[:50, :50] == 0).all() and (tile[50:] > 0).all()  # no-data kept, nothing wraps to 0
+    # Monotonic in the source values, band by band
+    for band in range(3):
+        values, scaled = deep[50:, :, band].ravel(), tile[50:, :, band].ravel()
+        order = np.argsort(values, kind='stable')
+        assert (np.diff(scaled[order].astype(int)) >= 0).all()
+    assert np.corrcoef(tile[50:, :, 1].ravel(), mosaic[50:, :, 1].ravel())[0, 1] > 0.99
+
+    # An affine change of units gives the same 8-bit tiles
+    float_tile = ArrayTileSource(deep.astype(np.float32) / 65535).read(0, 0, 194, 194)
+    assert np.array_equal(float_tile, tiles[0])
+    result = analyze_tiled(deep, tile_size=194)
+    assert result["summary"]["tiles_analyzed"] == result["summary"]["tiles_total"]
+    print(f"✅ 16-bit mosaic analyzed: {result['summary']['disease']}")
+
+
+def test_pillow_fallback():
+    """Without rasterio, palette and 16-bit files decode to RGB; oversized files fail clearly"""
+    print("\n🧩 Testing the Pillow fallback...")
+    leaf = Image.open(SAMPLE_IMAGE).convert("RGB")
+    with tempfile.TemporaryDirectory() as tmp:
+        palette_path = Path(tmp) / "mosaic.png"
+        palette_image = leaf.quantize(64)
+        palette_image.save(palette_path)
+        decoded = decode_with_pillow(palette_path)
+        assert decoded.shape == (leaf.height, leaf.width, 3)
+        assert np.array_equal(decoded, np.asarray(palette_image.convert("RGB")))
+        result = analyze_tiled(str(palette_path), tile_size=194)
+        assert result["summary"]["tiles_analyzed"] == result["summary"]["tiles_total"]
+
+        deep_path = Path(tmp) / "mosaic16.png"
+        Image.fromarray(np.asarray(leaf.convert("L")).astype(np.uint16) * 256 + 255).save(deep_path)
+        assert decode_with_pillow(deep_path).dtype != np.uint8
+        assert analyze_tiled(str(deep_path), tile_size=194)["summary"]["tiles_analyzed"] > 0
+
+        try:
+            decode_with_pillow(palette_path, max_pixels=1000)
+            assert False, "expected RuntimeError"
+        except RuntimeError as e:
+            assert "rasterio" in str(e)
+    print("✅ Palette and 16-bit files decoded")
+
+
+def peak_traced_bytes(path, tile_size):
+    tracemalloc.start()
+    analyze_tiled(path, tile_size=tile_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def test_memory_is_bounded_by_tile_size():
+    """Peak allocations on a memory-mapped mosaic do not grow with its size"""
+    print("\n🧩 Testing bounded memory on memory-mapped mosaics...")
+    tile_size = 512
+    with tempfile.TemporaryDirectory() as tmp:
+        peaks = {}
+        for side in (2048, 4096):
+            path = Path(tmp) / f"mosaic_{side}.npy"
+            mosaic = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(side, side, 3))
+            leaf = make_mosaic(1, 1)
+            for top in range(0, side, leaf.shape[0]):
+                for left in range(0, side, leaf.shape[1]):
+                    block = leaf[:side - top, :side - left]
+                    mosaic[top:top + block.shape[0], left:left + block.shape[1]] = block
+            mosaic.flush()
+            del mosaic
+            peaks[side] = peak_traced_bytes(path, tile_size)
+            print(f"   {side}x{side} ({side * side * 3 / 2**20:.0f} MiB): peak {peaks[side] / 2**20:.1f} MiB")
+
+    assert peaks[4096] < side * side * 3 / 4
+    assert peaks[4096] < peaks[2048] * 1.5
+    print("✅ Peak memory independent of mosaic size")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Tiled Mosaic Analysis")
+    print("=" * 50)
+    tests = [
+        test_tile_edges,
+        test_tiles_match_single_image_analysis,
+        test_no_data_tiles_are_skipped,
+        test_half_empty_tiles_ignore_the_fill,
+        test_high_bit_depth_is_rescaled,
+        test_pillow_fallback,
+        test_memory_is_bounded_by_tile_size,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"\n✅ Passed: {passed}/{len(tests)}")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Test request coalescing and the circuit breaker around OpenWeatherMap
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import tools.weather_tool as weather_tool
+from tools.upstream_guard import CircuitBreaker, CircuitOpenError, SingleFlight
+from tools.weather_cache import WeatherCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeUpstream:
+    """Sync and async stand-in for OpenWeatherMap: counts calls and returns 'status' after 'delay'"""
+
+    def __init__(self, delay=0.0, status="success"):
+        self.delay = delay
+        self.status = status
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _result(self, location):
+        with self.lock:
+            self.calls += 1
+        return {"location": location, "temperature": "24.0°C", "status": self.status}
+
+    def __call__(self, location):
+        time.sleep(self.delay)
+        return self._result(location)
+
+    async def fetch_async(self, location):
+        await asyncio.sleep(self.delay)
+        return self._result(location)
+
+
+class GuardedWeatherTool:
+    """Swaps the weather tool's upstream, cache, breaker and coalescer for test instances"""
+
+    NAMES = ("fetch_weather_data", "fetch_weather_data_async", "WEATHER_CACHE", "BREAKER", "IN_FLIGHT")
+
+    def __init__(self, upstream, cache, breaker):
+        self.values = (upstream, upstream.fetch_async, cache, breaker, SingleFlight())
+
+    def __enter__(self):
+        self.saved = [getattr(weather_tool, name) for name in self.NAMES]
+        for name, value in zip(self.NAMES, self.values):
+            setattr(weather_tool, name, value)
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in zip(self.NAMES, self.saved):
+            setattr(weather_tool, name, value)
+
+
+def test_single_flight_threads():
+    """Concurrent identical calls share one execution and its result"""
+    print("\n🔁 Testing thread coalescing...")
+    flight, upstream = SingleFlight(), FakeUpstream(delay=0.05)
+    with ThreadPoolExecutor(10) as pool:
+        results = list(pool.map(lambda i: flight.do("guntur", upstream, "Guntur"), range(10)))
+    assert upstream.calls == 1 and all(result == results[0] for result in results)
+    assert len({id(result) for result in results}) == 10  # callers get their own copies
+    assert flight.get_stats()["coalesced"] == 9 and flight.get_stats()["in_flight"] == 0
+
+    flight.do("eluru", upstream, "Eluru")
+    assert upstream.calls == 2
+
+    def failing(_):
+        time.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    errors = []
+    def call(_):
+        try:
+            flight.do("broken", failing, "Broken")
+        except RuntimeError as e:
+            errors.append(e)
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(call, range(4)))
+    assert len(errors) == 4
+    print("✅ 10 callers, 1 upstream call")
+
+
+def test_single_flight_async():
+    """Coalesced tasks share one call, and one cancelled caller does not cancel the rest"""
+    print("\n🔁 Testing task coalescing...")
+    flight, upstream = SingleFlight(), FakeUpstream(delay=0.05)
+
+    async def run():
+        tasks = [asyncio.ensure_future(flight.do_async("guntur", upstream.fetch_async, "Guntur")) for _ in range(10)]
+        await asyncio.sleep(0.01)
+        tasks[0].cancel()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert all(result["status"] == "success" for result in results[1:]) and upstream.calls == 1
+    assert flight.get_stats()["in_flight"] == 0
+    print("✅ 10 tasks, 1 upstream call")
+
+
+def test_breaker_trips_and_recovers():
+    """Consecutive failures open the breaker; after the cooldown one probe decides"""
+    print("\n🔌 Testing the circuit breaker...")
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=30, clock=clock)
+    failing, healthy = FakeUpstream(status="timeout"), FakeUpstream()
+
+    breaker.call(failing, "A")
+    breaker.call(FakeUpstream(status="not_found"), "B")  # not an upstream failure
+    breaker.call(healthy, "C")  # resets the count
+    for _ in range(3):
+        breaker.call(failing, "A")
+    assert breaker.state == "open" and failing.calls == 4
+    try:
+        breaker.call(failing, "A")
+        assert False, "expected CircuitOpenError"
+    except CircuitOpenError as e:
+        assert e.retry_after == 30
+    assert failing.calls == 4
+
+    clock.now += 30
+    breaker.call(failing, "A")  # the probe fails: open again
+    assert breaker.state == "open" and breaker.get_stats()["trips"] == 2
+    clock.now += 30
+    breaker.call(healthy, "C")
+    stats = breaker.get_stats()
+    assert stats["state"] == "closed" and stats["consecutive_failures"] == 0 and stats["rejected"] == 1
+    print(f"✅ {stats}")
+
+
+def test_breaker_single_probe():
+    """While the half-open probe is running other calls are rejected"""
+    print("\n🔌 Testing the half-open probe...")
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, clock=clock)
+    breaker.call(FakeUpstream(status="network_error"), "A")
+    clock.now += 10
+    slow = FakeUpstream(delay=0.1)
+    probe = threading.Thread(target=breaker.call, args=(slow, "A"))
+    probe.start()
+    time.sleep(0.02)
+    try:
+        breaker.call(slow, "A")
+        assert False, "expected CircuitOpenError"
+    except CircuitOpenError:
+        pass
+    probe.join()
+    assert slow.calls == 1 and breaker.state == "closed"
+
+    async def cancelled_probe():
+        breaker.call(FakeUpstream(status="timeout"), "A")
+        clock.now += 10
+        task = asyncio.ensure_future(breaker.call_async(FakeUpstream(delay=1).fetch_async, "A"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return await breaker.call_async(FakeUpstream().fetch_async, "A")
+
+    assert asyncio.run(cancelled_probe())["status"] == "success" and breaker.state == "closed"
+    print("✅ One probe at a time")
+
+
+def test_weather_tool_fails_fast_and_serves_last_known():
+    """An open breaker answers at once, with the last cached weather when there is one"""
+    print("\n🔌 Testing get_weather_data with the breaker open...")
+    clock = FakeClock()
+    upstream = FakeUpstream()
+    cache = WeatherCache(ttl=60, stale_grace=0, clock=clock)
+    with GuardedWeatherTool(upstream, cache, CircuitBreaker(failure_threshold=2, cooldown=30, clock=clock)):
+        weather_tool.get_weather_data("Guntur")
+        clock.now += 120
+        upstream.status = "timeout"
+        weather_tool.get_weather_data("Eluru")
+        weather_tool.get_weather_data("Eluru")
+        assert weather_tool.get_weather_upstream_stats()["circuit_breaker"]["state"] == "open"
+
+        calls = upstream.calls
+        missing = weather_tool.get_weather_data("Eluru")
+        assert missing["status"] == "circuit_open" and missing["retry_in_seconds"] == 30.0
+        fallback = weather_tool.get_weather_data("Guntur")
+        assert fallback["status"] == "success" and fallback["cache"] == {"status": "fallback", "age_seconds": 120.0}
+        assert fallback["circuit"]["state"] == "open"
+        assert asyncio.run(weather_tool.get_weather_data_async("guntur"))["cache"]["status"] == "fallback"
+        assert upstream.calls == calls
+
+        clock.now += 30
+        upstream.status = "success"
+        assert weather_tool.get_weather_data("Eluru")["cache"]["status"] == "miss"
+        assert weather_tool.get_weather_upstream_stats()["circuit_breaker"]["state"] == "closed"
+    print("✅ Failed fast, last known weather served")
+
+
+def test_weather_tool_coalesces_async():
+    """Concurrent get_weather calls for one place make one upstream request"""
+    print("\n🔁 Testing get_weather_data_async coalescing...")
+    upstream = FakeUpstream(delay=0.05)
+    with GuardedWeatherTool(upstream, WeatherCache(), CircuitBreaker()):
+        async def storm_warning():
+            return await asyncio.gather(*(weather_tool.get_weather_data_async(name)
+                                          for name in ["Vijayawada", "vijayawada", "VIJAYAWADA "] * 10))
+
+        results = asyncio.run(storm_warning())
+        assert upstream.calls == 1 and all(result["status"] == "success" for result in results)
+        assert weather_tool.get_weather_upstream_stats()["coalescing"]["coalesced"] == 29
+    print("✅ 30 concurrent requests, 1 upstream call")
+
+
+def run_benchmark(callers=50, rounds=5, slow_upstream=0.2):
+    """Upstream calls and wall time for bursts of identical requests while OpenWeatherMap times out"""
+    print("\n⏱️  Upstream guard...")
+    timings = {}
+    for name in ("unguarded", "guarded"):
+        upstream = FakeUpstream(delay=slow_upstream, status="timeout")
+        with GuardedWeatherTool(upstream, None, CircuitBreaker(failure_threshold=1, cooldown=30)):
+            fetch = upstream.fetch_async if name == "unguarded" else weather_tool.guarded_fetch_async
+
+            async def bursts():
+                for _ in range(rounds):
+                    await asyncio.gather(*(fetch("Vijayawada") for _ in range(callers)))
+
+            start = time.perf_counter()
+            asyncio.run(bursts())
+            timings[name] = time.perf_counter() - start
+        print(f"   {name}: {timings[name] * 1000:.0f} ms, {upstream.calls} upstream calls "
+              f"for {rounds * callers} requests")
+    return timings
+
+
+def main():
+    """Run all upstream guard tests"""
+    print("🧪 Upstream Guard Tests")
+    print("=" * 50)
+
+    tests = [
+        test_single_flight_threads,
+        test_single_flight_async,
+        test_breaker_trips_and_recovers,
+        test_breaker_single_probe,
+        test_weather_tool_fails_fast_and_serves_last_known,
+        test_weather_tool_coalesces_async,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
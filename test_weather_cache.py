@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Test the weather response cache
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import tools.weather_tool as weather_tool
+from tools.weather_cache import WeatherCache, normalize_location
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeUpstream:
+    """Stand-in for the OpenWeatherMap call: counts calls and returns a scripted status per location"""
+
+    def __init__(self, delay=0.0, statuses=None):
+        self.delay = delay
+        self.statuses = statuses or {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, location):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls.append(location)
+            call = len(self.calls)
+        status = self.statuses.get(location, "success")
+        return {"location": location, "temperature": f"{20 + call}°C", "status": status}
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_normalize_location():
+    """Spelling variants of one place share a key"""
+    print("\n🌦️  Testing location normalization...")
+    assert normalize_location("Nuzvid , IN") == normalize_location("  nuzvid,in ") == "nuzvid,in"
+    assert normalize_location("New   Delhi") == "new delhi"
+    assert normalize_location("ＨＹＤＥＲＡＢＡＤ") == "hyderabad"
+    assert normalize_location("Hyderabad") != normalize_location("Hyderabad, PK")
+    print("✅ Locations normalized")
+
+
+def test_fresh_hits_and_expiry():
+    """Repeated calls within the TTL are served from the cache with their age"""
+    print("\n🌦️  Testing TTL hits...")
+    clock, upstream = FakeClock(), FakeUpstream()
+    cache = WeatherCache(ttl=600, stale_grace=0, clock=clock)
+    first = cache.get("Hyderabad", upstream)
+    assert first["cache"] == {"status": "miss", "age_seconds": 0.0}
+    clock.now += 120
+    second = cache.get("hyderabad ", upstream)
+    assert second["cache"] == {"status": "hit", "age_seconds": 120.0}
+    assert second["temperature"] == first["temperature"] and len(upstream.calls) == 1
+    assert "cache" not in cache._entries["hyderabad"][1]
+
+    clock.now += 600
+    assert cache.get("Hyderabad", upstream)["cache"]["status"] == "miss"
+    assert len(upstream.calls) == 2
+    print(f"✅ {cache.get_stats()['hit_ratio']:.0%} hit ratio")
+
+
+def test_stale_while_revalidate():
+    """Within the grace window stale data is returned at once and refreshed once in the background"""
+    print("\n🌦️  Testing stale-while-revalidate...")
+    clock, upstream = FakeClock(), FakeUpstream(delay=0.05)
+    cache = WeatherCache(ttl=60, stale_grace=600, clock=clock)
+    original = cache.get("Guntur", upstream)
+    clock.now += 120
+
+    start = time.perf_counter()
+    stale = [cache.get("Guntur", upstream) for _ in range(5)]
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.04, elapsed
+    assert all(result["cache"]["status"] == "stale" for result in stale)
+    assert all(result["temperature"] == original["temperature"] for result in stale)
+
+    wait_for(lambda: cache.get_stats()["refreshes"] == 1 and not cache.get_stats()["refreshing"])
+    assert len(upstream.calls) == 2  # one refresh for five stale reads
+    fresh = cache.get("Guntur", upstream)
+    assert fresh["cache"]["status"] == "hit" and fresh["temperature"] != original["temperature"]
+
+    # Past the grace window the caller waits for a fresh fetch
+    clock.now += 60 + 600
+    assert cache.get("Guntur", upstream)["cache"]["status"] == "miss"
+    print(f"✅ Stale reads in {elapsed * 1000:.1f} ms, one background refresh")
+
+
+def test_failed_refresh_keeps_stale_entry():
+    """An upstream error during refresh does not replace good data"""
+    print("\n🌦️  Testing failed refreshes...")
+    clock = FakeClock()
+    cache = WeatherCache(ttl=60, stale_grace=600, clock=clock)
+    cache.get("Vijayawada", FakeUpstream())
+    clock.now += 100
+    failing = FakeUpstream(statuses={"Vijayawada": "timeout"})
+    cache.get("Vijayawada", failing)
+    wait_for(lambda: cache.get_stats()["failed_refreshes"] == 1 and not cache.get_stats()["refreshing"])
+    assert cache.get("Vijayawada", failing)["status"] == "success"
+    print("✅ Stale entry kept")
+
+
+def test_negative_cache():
+    """not_found is cached on its own TTL; other errors are not cached"""
+    print("\n🌦️  Testing negative caching...")
+    clock = FakeClock()
+    upstream = FakeUpstream(statuses={"Atlantis": "not_found", "Flaky": "timeout"})
+    cache = WeatherCache(ttl=60, negative_ttl=3600, clock=clock)
+    cache.get("Atlantis", upstream)
+    clock.now += 1800
+    missing = cache.get("atlantis", upstream)
+    assert missing["status"] == "not_found" and missing["cache"]["status"] == "negative_hit"
+    clock.now += 1801
+    cache.get("Atlantis", upstream)
+    assert upstream.calls.count("Atlantis") == 2
+
+    cache.get("Flaky", upstream)
+    cache.get("Flaky", upstream)
+    assert upstream.calls.count("Flaky") == 2
+
+    stats = cache.get_stats()
+    assert stats["negative_hits"] == 1 and stats["negative_entries"] == 1 and stats["entries"] == 0
+    print(f"✅ {stats}")
+
+
+def test_eviction_and_stats():
+    """The oldest entries are evicted; stats report ages"""
+    print("\n🌦️  Testing eviction and stats...")
+    clock = FakeClock()
+    cache = WeatherCache(max_entries=2, clock=clock)
+    upstream = FakeUpstream()
+    for location in ("A", "B"):
+        cache.get(location, upstream)
+        clock.now += 10
+    cache.get("C", upstream)
+    stats = cache.get_stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["oldest_entry_age_seconds"] == 10.0 and stats["mean_entry_age_seconds"] == 5.0
+    assert cache.get("A", upstream)["cache"]["status"] == "miss"
+    print("✅ Oldest entry evicted")
+
+
+def test_callers_get_independent_copies():
+    """Editing a response, nested blocks included, does not change the cached entry"""
+    print("\n🌦️  Testing copies of cached responses...")
+    cache = WeatherCache(clock=FakeClock())
+
+    def upstream(location):
+        return {"location": location, "observation": {"humidity": 81.0}, "status": "success"}
+
+    missed = cache.get("Nuzvid", upstream)
+    missed["observation"]["humidity"] = -1.0
+    first = cache.get("Nuzvid", upstream)
+    first["observation"]["humidity"] = -2.0
+    second = cache.get("Nuzvid", upstream)
+    assert second["observation"] == {"humidity": 81.0} and second["cache"]["status"] == "hit"
+    assert second["observation"] is not first["observation"]
+    cache.last_known("Nuzvid")["observation"]["humidity"] = -3.0
+    assert cache.last_known("Nuzvid")["observation"]["humidity"] == 81.0
+    print("✅ Each caller gets its own copy")
+
+
+def test_get_weather_data_uses_cache():
+    """The weather tool goes through the module cache"""
+    print("\n🌦️  Testing get_weather_data...")
+    original_fetch, original_cache = weather_tool.fetch_weather_data, weather_tool.WEATHER_CACHE
+    upstream = FakeUpstream()
+    weather_tool.fetch_weather_data = upstream
+    weather_tool.WEATHER_CACHE = WeatherCache()
+    try:
+        weather_tool.get_weather_data("Eluru")
+        result = weather_tool.get_weather_data("ELURU")
+        assert result["cache"]["status"] == "hit" and len(upstream.calls) == 1
+        assert weather_tool.get_weather_cache_stats()["hits"] == 1
+
+        weather_tool.WEATHER_CACHE = None
+        assert "cache" not in weather_tool.get_weather_data("Eluru")
+        assert weather_tool.get_weather_cache_stats() == {"enabled": False}
+    finally:
+        weather_tool.fetch_weather_data, weather_tool.WEATHER_CACHE = original_fetch, original_cache
+    print("✅ Cached through get_weather_data")
+
+
+def run_benchmark(calls=50, upstream_delay=0.02):
+    """Repeated lookups of a few farms, uncached against cached"""
+    print("\n⏱️  Weather cache...")
+    farms = ["Hyderabad", "hyderabad", "Guntur, IN", "guntur,in", "Eluru"]
+    timings = {}
+    for name, cache in [("uncached", None), ("cached", WeatherCache())]:
+        upstream = FakeUpstream(delay=upstream_delay)
+        start = time.perf_counter()
+        for i in range(calls):
+            location = farms[i % len(farms)]
+            upstream(location) if cache is None else cache.get(location, upstream)
+        timings[name] = time.perf_counter() - start
+        print(f"   {name}: {timings[name] * 1000:.0f} ms for {calls} calls, {len(upstream.calls)} upstream")
+    return timings
+
+
+def main():
+    """Run all weather cache tests"""
+    print("🧪 Weather Cache Tests")
+    print("=" * 50)
+
+    tests = [
+        test_normalize_location,
+        test_fresh_hits_and_expiry,
+        test_stale_while_revalidate,
+        test_failed_refresh_keeps_stale_entry,
+        test_negative_cache,
+        test_eviction_and_stats,
+        test_callers_get_independent_copies,
+        test_get_weather_data_uses_cache,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Test the pooled OpenWeatherMap client against a local HTTP server
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import tools.weather_tool as weather_tool
+from tools.weather_cache import WeatherCache
+
+
+def owm_payload(city, temp=31.5):
+    """A response body in OpenWeatherMap's current-weather shape"""
+    return {
+        "name": city, "sys": {"country": "IN"},
+        "main": {"temp": temp, "feels_like": temp + 2, "humidity": 64, "pressure": 1008},
+        "weather": [{"description": "scattered clouds"}],
+        "wind": {"speed": 3.6}, "visibility": 10000,
+    }
+
+
+class FakeOpenWeatherMap(BaseHTTPRequestHandler):
+    """
+    Scripted upstream: 'Atlantis' is a 404, 'Flaky' fails with 503 until
+    its counter runs out, 'Slow' sleeps past the client timeout, anything
+    else is a 200 after 'delay' seconds.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    delay = 0.0
+    flaky_failures = 0
+    requests_seen = 0
+    connections = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        city = parse_qs(urlparse(self.path).query)["q"][0]
+        with cls.lock:
+            cls.requests_seen += 1
+            cls.connections.add(self.client_address)
+            flaky = city == "Flaky" and cls.flaky_failures > 0
+            if flaky:
+                cls.flaky_failures -= 1
+        if city == "Slow":
+            time.sleep(0.5)
+        elif cls.delay:
+            time.sleep(cls.delay)
+        if city == "Atlantis":
+            self.reply(404, {"cod": "404", "message": "city not found"})
+        elif flaky:
+            self.reply(503, {"cod": 503, "message": "busy"}, {"Retry-After": "0"})
+        else:
+            self.reply(200, owm_payload(city))
+
+    def reply(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up on 'Slow'
+
+    def log_message(self, *args):
+        pass
+
+    @classmethod
+    def reset(cls, delay=0.0, flaky_failures=0):
+        with cls.lock:
+            cls.delay, cls.flaky_failures, cls.requests_seen = delay, flaky_failures, 0
+            cls.connections = set()
+
+
+class LocalUpstream:
+    """Runs the fake server and points the weather tool at it, without its cache"""
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenWeatherMap)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.saved = (weather_tool.BASE_URL, weather_tool.TIMEOUT, weather_tool.BACKOFF_FACTOR,
+                      weather_tool.WEATHER_CACHE, weather_tool._session, os.environ.get("OPENWEATHERMAP_API_KEY"))
+        weather_tool.BASE_URL = f"http://127.0.0.1:{self.server.server_port}/data/2.5/weather"
+        weather_tool.TIMEOUT, weather_tool.BACKOFF_FACTOR = 0.25, 0.01
+        weather_tool.WEATHER_CACHE, weather_tool._session = None, None
+        os.environ["OPENWEATHERMAP_API_KEY"] = "test-key"
+        FakeOpenWeatherMap.reset()
+        return self
+
+    def __exit__(self, *exc):
+        (weather_tool.BASE_URL, weather_tool.TIMEOUT, weather_tool.BACKOFF_FACTOR,
+         weather_tool.WEATHER_CACHE, weather_tool._session, api_key) = self.saved
+        if api_key is None:
+            os.environ.pop("OPENWEATHERMAP_API_KEY", None)
+        else:
+            os.environ["OPENWEATHERMAP_API_KEY"] = api_key
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_sync_responses():
+    """Success, not_found, retried 503s and timeouts map to the tool's response dicts"""
+    print("\n🌐 Testing the pooled client...")
+    with LocalUpstream():
+        result = weather_tool.fetch_weather_data("Hyderabad")
+        assert result["status"] == "success" and result["location"] == "Hyderabad, IN"
+        assert result["temperature"] == "31.5°C" and result["description"] == "Scattered Clouds"
+        assert weather_tool.fetch_weather_data("Atlantis")["status"] == "not_found"
+
+        FakeOpenWeatherMap.reset(flaky_failures=weather_tool.RETRIES)
+        assert weather_tool.fetch_weather_data("Flaky")["status"] == "success"
+        assert FakeOpenWeatherMap.requests_seen == weather_tool.RETRIES + 1
+
+        FakeOpenWeatherMap.reset(flaky_failures=weather_tool.RETRIES + 1)
+        failed = weather_tool.fetch_weather_data("Flaky")
+        assert failed["status"] == "api_error" and "503" in failed["error"]
+
+        start = time.perf_counter()
+        assert weather_tool.fetch_weather_data("Slow")["status"] == "timeout"
+        assert time.perf_counter() - start < 0.45  # read timeouts are not retried
+    print("✅ Responses, retries and timeouts")
+
+
+def test_connection_reuse():
+    """Sequential calls share one keep-alive connection"""
+    print("\n🌐 Testing connection reuse...")
+    with LocalUpstream():
+        for _ in range(10):
+            assert weather_tool.fetch_weather_data("Guntur")["status"] == "success"
+        assert FakeOpenWeatherMap.requests_seen == 10
+        assert len(FakeOpenWeatherMap.connections) == 1, FakeOpenWeatherMap.connections
+        assert weather_tool.get_session() is weather_tool.get_session()
+    print("✅ 10 requests over 1 connection")
+
+
+def test_async_responses():
+    """The async client returns the same dicts as the sync one"""
+    print("\n🌐 Testing the async client...")
+    with LocalUpstream():
+        async def fetch_all():
+            locations = ["Hyderabad", "Atlantis", "Flaky", "Slow"]
+            return await asyncio.gather(*(weather_tool.fetch_weather_data_async(location) for location in locations))
+
+        FakeOpenWeatherMap.reset(flaky_failures=1)
+        results = asyncio.run(fetch_all())
+        assert [result["status"] for result in results] == ["success", "not_found", "success", "timeout"]
+        assert results[0] == {**weather_tool.fetch_weather_data("Hyderabad"), "timestamp": results[0]["timestamp"]}
+
+        weather_tool.WEATHER_CACHE = WeatherCache()
+        FakeOpenWeatherMap.reset()
+        asyncio.run(weather_tool.get_weather_data_async("Guntur"))
+        cached = asyncio.run(weather_tool.get_weather_data_async("guntur"))
+        assert cached["cache"]["status"] == "hit" and FakeOpenWeatherMap.requests_seen == 1
+    print(f"✅ Async client {'(httpx)' if weather_tool.HTTPX_AVAILABLE else '(thread fallback)'}")
+
+
+def test_missing_api_key():
+    """Without a key no request is made"""
+    print("\n🌐 Testing a missing API key...")
+    with LocalUpstream():
+        os.environ.pop("OPENWEATHERMAP_API_KEY")
+        assert weather_tool.fetch_weather_data("Hyderabad")["error"] == "OpenWeatherMap API key is not set"
+        assert asyncio.run(weather_tool.fetch_weather_data_async("Hyderabad"))["status"] == "error"
+        assert FakeOpenWeatherMap.requests_seen == 0
+    print("✅ Error returned before any request")
+
+
+def run_benchmark(calls=40, workers=8, upstream_delay=0.01):
+    """Unpooled requests.get against the pooled session, and threads against asyncio for concurrent fetches"""
+    print("\n⏱️  Weather client...")
+    timings = {}
+    with LocalUpstream():
+        FakeOpenWeatherMap.reset(delay=upstream_delay)
+        params = {"q": "Hyderabad", "appid": "test-key", "units": "metric"}
+        clients = {
+            "unpooled": lambda: requests.get(weather_tool.BASE_URL, params=params, timeout=1),
+            "pooled": lambda: weather_tool.fetch_weather_data("Hyderabad"),
+        }
+        for name, call in clients.items():
+            FakeOpenWeatherMap.reset(delay=upstream_delay)
+            start = time.perf_counter()
+            for _ in range(calls):
+                call()
+            timings[name] = time.perf_counter() - start
+            print(f"   sequential {name}: {timings[name] / calls * 1000:.2f} ms/call, "
+                  f"{len(FakeOpenWeatherMap.connections)} connections")
+
+        FakeOpenWeatherMap.reset(delay=upstream_delay)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(weather_tool.fetch_weather_data, ["Hyderabad"] * calls))
+        timings["threads"] = time.perf_counter() - start
+
+        async def gather():
+            return await asyncio.gather(*(weather_tool.fetch_weather_data_async("Hyderabad") for _ in range(calls)))
+
+        FakeOpenWeatherMap.reset(delay=upstream_delay)
+        start = time.perf_counter()
+        asyncio.run(gather())
+        timings["asyncio"] = time.perf_counter() - start
+        for name in ("threads", "asyncio"):
+            print(f"   {calls} concurrent via {name}: {timings[name] * 1000:.0f} ms")
+    return timings
+
+
+def main():
+    """Run all weather client tests"""
+    print("🧪 Weather Client Tests")
+    print("=" * 50)
+
+    tests = [
+        test_sync_responses,
+        test_connection_reuse,
+        test_async_responses,
+        test_missing_api_key,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Test numeric weather records and the columnar observation store
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import tools.weather_tool as weather_tool
+from tools.upstream_guard import SingleFlight
+from tools.weather_history import COLUMNS, FCNTL_AVAILABLE, WEATHER_DTYPE, ObservationStore, history_window
+
+END = 1_760_000_400  # an hour boundary
+
+
+def owm_payload(dt, temp=23.4, humidity=81):
+    """An OpenWeatherMap current-weather response"""
+    return {
+        "coord": {"lon": 80.8, "lat": 16.78}, "id": 1261221, "name": "Nuzvid", "sys": {"country": "IN"}, "dt": dt,
+        "main": {"temp": temp, "feels_like": temp + 1.5, "humidity": humidity, "pressure": 1006},
+        "weather": [{"id": 500, "description": "light rain"}], "wind": {"speed": 4.1}, "visibility": 8000,
+    }
+
+
+def observations(days, every=600, end=END, seed=0):
+    """Synthetic observations every 'every' seconds up to 'end'"""
+    rng = np.random.default_rng(seed)
+    records = np.zeros(int(days * 86400 // every), dtype=WEATHER_DTYPE)
+    records['time'] = end - every * np.arange(len(records))[::-1]
+    records['temperature'] = rng.uniform(18, 38, len(records))
+    records['humidity'] = rng.uniform(30, 100, len(records))
+    records['pressure'] = 1005
+    return records
+
+
+def test_numeric_observation():
+    """Responses carry float fields and the epoch observation time next to the display strings"""
+    print("\n📈 Testing numeric observations...")
+    response = weather_tool._parse_response("Nuzvid", 200, lambda: owm_payload(END), "")
+    observation = response["observation"]
+    assert response["temperature"] == "23.4°C" and observation["temperature"] == 23.4
+    assert response["humidity"] == "81%" and observation["humidity"] == 81.0
+    assert response["wind_speed"] == "4.1 m/s" and observation["wind_speed"] == 4.1
+    assert observation["time"] == END and observation["city_id"] == 1261221 and observation["condition_id"] == 500
+    assert observation["lat"] == 16.78 and observation["visibility"] == 8000.0
+    payload = owm_payload(END)
+    del payload["visibility"]
+    assert weather_tool._parse_response("Nuzvid", 200, lambda: payload, "")["observation"]["visibility"] is None
+    print(f"✅ {observation}")
+
+
+def test_append_and_query():
+    """Range queries return the rows with start <= time < end, column by column"""
+    print("\n📈 Testing appends and range queries...")
+    with tempfile.TemporaryDirectory() as directory:
+        store = ObservationStore(directory)
+        records = observations(days=3)
+        assert store.append("Plot 7", records) == len(records)
+        assert store.append("Plot 8", observations(days=1, seed=1)) == 144
+        assert store.locations() == {"plot 7": 1, "plot 8": 2}
+
+        rows = store.query("plot 7 ", END - 86400, END, ["humidity"])
+        assert set(rows) == {"time", "humidity"} and len(rows["time"]) == 144
+        assert rows["time"][0] == END - 86400 and rows["time"][-1] == END - 600
+        assert np.array_equal(rows["humidity"], records["humidity"][-145:-1])
+        assert len(store.query("Plot 7")["time"]) == len(records)
+        assert len(store.query("Unknown plot", END - 86400, END)["time"]) == 0
+        assert sorted(os.listdir(Path(directory) / "1")) == sorted(f"{name}.bin" for name in COLUMNS)
+    print("✅ Rows selected by binary search on time")
+
+
+def test_skips_repeated_and_older():
+    """Times stay strictly increasing per location"""
+    print("\n📈 Testing repeated observations...")
+    with tempfile.TemporaryDirectory() as directory:
+        store = ObservationStore(directory)
+        assert store.append("Plot 1", [{"time": END, "humidity": 60.0}]) == 1
+        assert store.append("Plot 1", [{"time": END, "humidity": 61.0}]) == 0  # same observation again
+        assert store.append("Plot 1", [{"time": END - 600, "humidity": 62.0}]) == 0
+        batch = [{"time": END + 1200, "humidity": 64.0}, {"time": END + 600, "humidity": 63.0},
+                 {"time": END + 600, "humidity": 63.5}]
+        assert store.append("Plot 1", batch) == 2
+        rows = store.query("Plot 1")
+        assert rows["time"].tolist() == [END, END + 600, END + 1200]
+        assert rows["humidity"].tolist() == [60.0, 63.0, 64.0]
+        assert np.isnan(rows["temperature"]).all()
+        assert store.get_stats()["skipped"] == 3
+    print("✅ Repeats and late observations skipped")
+
+
+def test_reopen_and_torn_append():
+    """A reopened store keeps its ids; a torn append is trimmed to complete rows"""
+    print("\n📈 Testing persistence...")
+    with tempfile.TemporaryDirectory() as directory:
+        ObservationStore(directory).append("Plot 1", observations(days=1))
+        with open(Path(directory) / "1" / "humidity.bin", "ab") as f:
+            f.write(b"\x00" * 6)  # a crash part-way through the next append
+        store = ObservationStore(directory)
+        assert store.location_id("PLOT 1") == 1 and len(store.query("Plot 1")["time"]) == 144
+        assert store.append("Plot 1", observations(days=1, end=END)) == 0
+        assert store.append("Plot 1", [{"time": END + 600, "humidity": 50.0}]) == 1
+        rows = store.query("Plot 1", END + 1, END + 3600)
+        assert rows["humidity"].tolist() == [50.0]
+        stats = store.get_stats()
+        assert stats["locations"] == 1 and stats["observations"] == 145
+
+        with open(Path(directory) / "meta.json", "w") as f:
+            json.dump({"version": 99}, f)
+        try:
+            ObservationStore(directory)
+            assert False, "expected ValueError"
+        except ValueError as e:
+            assert "version 99" in str(e)
+    print("✅ Ids and rows survive a restart")
+
+
+def test_shared_directory():
+    """Two stores on one directory (as two processes would be) agree on ids and keep times increasing"""
+    print("\n📈 Testing a store shared between processes...")
+    if not FCNTL_AVAILABLE:
+        raise unittest.SkipTest("no file locks (fcntl) on this platform")
+    with tempfile.TemporaryDirectory() as directory:
+        first, second = ObservationStore(directory), ObservationStore(directory)
+        first.append("Plot 1", [{"time": END, "humidity": 60.0}])
+        second.append("Plot 2", [{"time": END, "humidity": 70.0}])
+        assert first.location_id("Plot 2") == second.location_id("Plot 2") == 2
+        assert second.location_id("Plot 1") == 1
+
+        # 'first' has END cached for Plot 1; a later row from 'second' must still be seen
+        second.append("Plot 1", [{"time": END + 1200, "humidity": 62.0}])
+        assert first.append("Plot 1", [{"time": END + 600, "humidity": 61.0}]) == 0
+        assert first.append("Plot 1", [{"time": END + 1800, "humidity": 63.0}]) == 1
+
+        def append(i):
+            store = (first, second)[i % 2]
+            return store.append(f"Plot {3 + i % 5}", [{"time": END + i, "humidity": float(i)}])
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(append, range(200)))
+        assert sorted(ObservationStore(directory).locations().values()) == list(range(1, 8))
+        for plot in range(3, 8):
+            times = first.query(f"Plot {plot}")["time"]
+            assert len(times) and (np.diff(times) > 0).all()
+        assert first.query("Plot 1")["humidity"].tolist() == [60.0, 62.0, 63.0]
+    print("✅ Shared ids and strictly increasing times")
+
+
+def test_hourly_resample():
+    """Hourly means with empty hours as NaN"""
+    print("\n📈 Testing hourly resampling...")
+    with tempfile.TemporaryDirectory() as directory:
+        store = ObservationStore(directory)
+        start = END - 4 * 3600
+        store.append("Plot 1", [
+            {"time": start + 60, "humidity": 40.0}, {"time": start + 1800, "humidity": 60.0},
+            {"time": start + 3 * 3600, "humidity": 90.0},
+            {"time": start + 3 * 3600 + 60},  # humidity missing
+        ])
+        times, means, counts = store.resample("Plot 1", "humidity", start, END)
+        assert times.tolist() == [start + hour * 3600 for hour in range(4)]
+        assert counts.tolist() == [2, 0, 0, 1]
+        assert means[0] == 50.0 and np.isnan(means[1]) and means[3] == 90.0
+        assert history_window(30, END - 10) == (END - 30 * 86400, END)
+    print("✅ Hourly means")
+
+
+def test_weather_tool_records_history():
+    """Upstream responses are stored and answered from history without the API"""
+    print("\n📈 Testing get_weather history...")
+    saved = weather_tool.HISTORY, weather_tool.IN_FLIGHT
+    with tempfile.TemporaryDirectory() as directory:
+        weather_tool.HISTORY, weather_tool.IN_FLIGHT = ObservationStore(directory), SingleFlight()
+        try:
+            clock = [END - 2 * 3600]
+
+            def upstream(location):
+                clock[0] += 1200
+                return weather_tool._parse_response(location, 200, lambda: owm_payload(clock[0], humidity=70), "")
+
+            for _ in range(5):
+                weather_tool.guarded_fetch("Nuzvid, IN", upstream, breaker=False)
+            weather_tool.guarded_fetch("Nuzvid, IN", lambda location: {"status": "timeout"}, breaker=False)
+            history = weather_tool.query_weather_history("nuzvid,in", "humidity", days=1, end=END)
+            assert history["status"] == "success" and history["observations"] == 5
+            assert len(history["values"]) == 24 and history["values"][-2:] == [70.0, 70.0]
+            assert history["values"][0] is None and history["summary"]["mean"] == 70.0
+
+            assert weather_tool.query_weather_history("Guntur", days=1, end=END)["status"] == "no_data"
+            assert weather_tool.query_weather_history("Nuzvid, IN", "rainfall")["status"] == "error"
+            assert weather_tool.get_weather_history_stats()["observations"] == 5
+            weather_tool.HISTORY = None
+            assert weather_tool.query_weather_history("Nuzvid, IN")["status"] == "error"
+        finally:
+            weather_tool.HISTORY, weather_tool.IN_FLIGHT = saved
+    print("✅ Observations recorded and queried")
+
+
+def test_unusable_directory_disables_history():
+    """A store of another record version turns history off instead of failing the weather tools"""
+    print("\n📈 Testing an incompatible history directory...")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(Path(directory) / "meta.json", "w") as f:
+            json.dump({"version": 99}, f)
+        store, error = weather_tool.open_history({"directory": directory})
+        assert store is None and "version 99" in error
+        assert weather_tool.open_history({"directory": directory, "enabled": False}) == (None, None)
+
+        saved = weather_tool.HISTORY, weather_tool.HISTORY_ERROR
+        weather_tool.HISTORY, weather_tool.HISTORY_ERROR = store, error
+        try:
+            assert weather_tool.get_weather_history_stats() == {"enabled": False, "last_error": error}
+            assert weather_tool.query_weather_history("Nuzvid, IN")["message"] == error
+            result = {"observation": {"time": END, "humidity": 70.0}}
+            assert weather_tool._record_observation("Nuzvid, IN", result) is result
+        finally:
+            weather_tool.HISTORY, weather_tool.HISTORY_ERROR = saved
+    print(f"✅ History off: {error}")
+
+
+def run_benchmark(plots=200, days=30, queries=100):
+    """Hourly humidity over 30 days for one plot, from a store of 'plots' plots at 10-minute resolution"""
+    print("\n⏱️  Observation store...")
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory:
+        store = ObservationStore(directory)
+        start = time.perf_counter()
+        for plot in range(plots):
+            store.append(f"Plot {plot}", observations(days, seed=plot))
+        timings["bulk_load"] = time.perf_counter() - start
+        size = sum(path.stat().st_size for path in Path(directory).rglob("*.bin"))
+
+        start = time.perf_counter()
+        for i in range(queries):
+            store.record(f"Plot {i % plots}", {"time": END + 600 * (i + 1), "humidity": 55.0})
+        timings["append_one"] = (time.perf_counter() - start) / queries
+
+        window = history_window(days, END)
+        start = time.perf_counter()
+        for i in range(queries):
+            store.resample(f"Plot {i % plots}", "humidity", *window)
+        timings["hourly_query"] = (time.perf_counter() - start) / queries
+
+        rows = plots * len(observations(days))
+        print(f"   {rows} observations for {plots} plots in {timings['bulk_load']:.2f} s ({size / 2 ** 20:.1f} MB)")
+        print(f"   single observation append: {timings['append_one'] * 1000:.2f} ms")
+        print(f"   hourly humidity over {days} days: {timings['hourly_query'] * 1000:.2f} ms/query")
+    return timings
+
+
+def main():
+    """Run all weather history tests"""
+    print("🧪 Weather History Tests")
+    print("=" * 50)
+
+    tests = [
+        test_numeric_observation,
+        test_append_and_query,
+        test_skips_repeated_and_older,
+        test_reopen_and_torn_append,
+        test_shared_directory,
+        test_hourly_resample,
+        test_weather_tool_records_history,
+        test_unusable_directory_disables_history,
+    ]
+    passed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except unittest.SkipTest as e:
+            skipped += 1
+            print(f"⏭️  {test.__name__} skipped: {e}")
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    print("\n" + "=" * 50)
+    print(f"📊 {passed}/{len(tests)} tests passed, {skipped} skipped")
+    return passed + skipped == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
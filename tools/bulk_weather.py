@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+import tools.weather_tool as weather_tool
+from tools.weather_cache import normalize_location
+
+BULK_CONFIG = weather_tool.WEATHER_CONFIG.get("bulk", {})
+
+def location_query(item) -> str:
+    """
+    Location string for a bulk item: a place name, a 'lat,lon' string, a
+    (lat, lon) pair or a {"lat": ..., "lon": ...} dict. Coordinates are
+    formatted like get_weather's, so both share cache entries.
+    """
+    if isinstance(item, dict):
+        return weather_tool.format_coordinates(item["lat"], item["lon"])
+    if isinstance(item, (list, tuple)):
+        lat, lon = item
+        return weather_tool.format_coordinates(lat, lon)
+    coordinates = weather_tool.parse_coordinates(str(item))
+    return weather_tool.format_coordinates(*coordinates) if coordinates else str(item).strip()
+
+class TokenBucket:
+    """
+    Request rate limit: 'burst' requests at once, refilled at 'rate' per
+    second. acquire() sleeps on the event loop until a token is free.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0}
+
+    def _take(self):
+        """Take a token, or return the seconds until one is available"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.stats["acquired"] += 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        start = time.perf_counter()
+        delay = self._take()
+        if delay:
+            while delay:
+                await asyncio.sleep(delay)
+                delay = self._take()
+            with self._lock:
+                self.stats["waited"] += 1
+                self.stats["wait_seconds"] += time.perf_counter() - start
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "wait_seconds": round(self.stats["wait_seconds"], 3),
+                    "requests_per_second": self.rate, "burst": self.burst}
+
+# One bucket per upstream host, shared by every bulk request in the process
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def rate_limiter_for(url, rate=None, burst=None):
+    """The token bucket for a URL's host, created from the bulk config on first use"""
+    host = urlparse(url).netloc
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(host)
+        if limiter is None:
+            limiter = _rate_limiters[host] = TokenBucket(
+                rate or BULK_CONFIG.get("requests_per_second", 1.0),
+                burst or BULK_CONFIG.get("burst", 10),
+            )
+        return limiter
+
+async def iter_bulk_weather(locations, max_concurrency=None, fetch=None, cache=None, limiter=None, breaker=None):
+    """
+    Fetch weather for many locations concurrently, yielding one result per
+    input location as it completes. Each result is the get_weather response
+    plus 'index' (position in 'locations') and 'query'. Spellings that
+    normalize to the same location share one lookup. Cache hits return at
+    once; at most 'max_concurrency' lookups run together, and only upstream
+    calls take a token from the host's rate limiter. Upstream calls go
+    through get_weather's request coalescing and circuit breaker ('breaker'
+    as in guarded_fetch). Failures are yielded as error results rather
+    than raised.
+    """
+    fetch = fetch or weather_tool.fetch_weather_data_async
+    cache = weather_tool.WEATHER_CACHE if cache is None else cache
+    limiter = limiter or rate_limiter_for(weather_tool.BASE_URL)
+    semaphore = asyncio.Semaphore(max_concurrency or BULK_CONFIG.get("max_concurrency", 8))
+
+    groups = {}
+    for index, item in enumerate(locations):
+        try:
+            query = location_query(item)
+        except (TypeError, ValueError, KeyError) as e:
+            yield {"index": index, "query": repr(item), "location": repr(item), "status": "error",
+                   "error": "Invalid location", "message": str(e)}
+            continue
+        groups.setdefault(normalize_location(query), []).append((index, query))
+
+    async def limited_fetch(query):
+        await limiter.acquire()
+        return await fetch(query)
+
+    async def guarded_fetch(query):
+        return await weather_tool.guarded_fetch_async(query, limited_fetch, breaker)
+
+    async def lookup(members):
+        query = members[0][1]
+        async with semaphore:
+            try:
+                if cache:
+                    result = weather_tool.serve_last_known(query, await cache.get_async(query, guarded_fetch), cache)
+                else:
+                    result = await guarded_fetch(query)
+            except Exception as e:
+                result = {"location": query, "status": "unknown_error", "error": "Unexpected error", "message": str(e)}
+        return members, result
+
+    tasks = [asyncio.ensure_future(lookup(members)) for members in groups.values()]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            members, result = await finished
+            for index, query in members:
+                yield {"index": index, "query": query, **result}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def summarize_bulk_weather(results, elapsed=None) -> dict:
+    """Counts per status, the failed locations and the temperature and humidity spread of the successes"""
+    by_status = {}
+    for result in results:
+        by_status[result.get("status")] = by_status.get(result.get("status"), 0) + 1
+    successes = [result for result in results if result.get("status") == "success"]
+    summary = {
+        "locations": len(results),
+        "succeeded": len(successes),
+        "failed": len(results) - len(successes),
+        "by_status": by_status,
+        "cache_hits": sum(1 for result in results if result.get("cache", {}).get("status") in ("hit", "stale")),
+        "failures": [
+            {"query": result["query"], "status": result.get("status"), "error": result.get("error")}
+            for result in results if result.get("status") != "success"
+        ],
+    }
+    for field in ("temperature", "humidity"):
+        readings = [(result["observation"].get(field), result) for result in successes if result.get("observation")]
+        readings = [(value, result) for value, result in readings if value is not None]
+        if readings:
+            low, high = min(readings, key=lambda reading: reading[0]), max(readings, key=lambda reading: reading[0])
+            summary[field] = {
+                "min": low[0], "min_location": low[1]["query"],
+                "max": high[0], "max_location": high[1]["query"],
+                "mean": round(sum(value for value, _ in readings) / len(readings), 2),
+            }
+    if elapsed is not None:
+        summary["elapsed_seconds"] = round(elapsed, 3)
+    return summary
+
+async def get_bulk_weather(locations, max_concurrency=None, on_result=None, **kwargs) -> dict:
+    """
+    Weather for a list of locations: per-location results in input order
+    and a combined summary. 'on_result(result, done, total)' is awaited as
+    each result arrives. Status is 'success', 'partial' when some
+    locations failed, or 'error' when all did.
+    """
+    start = time.perf_counter()
+    results = []
+    async for result in iter_bulk_weather(locations, max_concurrency, **kwargs):
+        results.append(result)
+        if on_result is not None:
+            await on_result(result, len(results), len(locations))
+    results.sort(key=lambda result: result["index"])
+    summary = summarize_bulk_weather(results, time.perf_counter() - start)
+    if summary["failed"] == 0:
+        status = "success"
+    elif summary["succeeded"]:
+        status = "partial"
+    else:
+        status = "error"
+    return {"status": status, "results": results, "summary": summary}
+
+def get_bulk_weather_stats() -> dict:
+    """Rate limiter counters per host, for the server's health output"""
+    with _rate_limiters_lock:
+        limiters = dict(_rate_limiters)
+    return {host: limiter.get_stats() for host, limiter in limiters.items()}
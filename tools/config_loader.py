@@ -0,0 +1,23 @@
+import json
+from functools import lru_cache
+from pathlib import Path
+
+# config.json lives in the project root, next to server.py
+CONFIG_PATH = Path(__file__).resolve().parent.parent / "config.json"
+
+@lru_cache(maxsize=1)
+def load_config() -> dict:
+    """
+    Load the project configuration from config.json.
+    Returns an empty dictionary if the file is missing or unreadable so callers
+    can always fall back to their built-in defaults.
+    """
+    try:
+        with open(CONFIG_PATH, "r") as config_file:
+            return json.load(config_file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def get_tool_config(tool_name: str) -> dict:
+    """Return the settings block for one tool under the 'tools' section of config.json"""
+    return load_config().get("tools", {}).get(tool_name, {})
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+class CircuitOpenError(Exception):
+    """Raised by CircuitBreaker.call while the breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: while a call for a key is running,
+    other callers with the same key wait for it and share its result
+    instead of starting their own. Threads and event-loop tasks are
+    tracked separately; async calls only coalesce within one loop.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._async_calls = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, fn, *args):
+        """fn(*args), or the result of the identical call already running in another thread"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.stats["calls"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return _copy(future.result())
+        try:
+            result = fn(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key, fn, *args):
+        """await fn(*args), shared with identical calls on the same loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            calls = self._async_calls.setdefault(loop, {})
+            task = calls.get(key)
+            leader = task is None
+            if leader:
+                # A task, so one caller being cancelled does not cancel the others
+                task = calls[key] = loop.create_task(fn(*args))
+                task.add_done_callback(lambda _: self._forget(calls, key, task))
+                self.stats["calls"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        result = await asyncio.shield(task)
+        return result if leader else _copy(result)
+
+    def _forget(self, calls, key, task):
+        with self._lock:
+            if calls.get(key) is task:
+                del calls[key]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls) + sum(len(calls) for calls in self._async_calls.values())
+        total = stats["calls"] + stats["coalesced"]
+        stats["coalesced_ratio"] = round(stats["coalesced"] / total, 4) if total else 0.0
+        return stats
+
+def _copy(result):
+    return dict(result) if isinstance(result, dict) else result
+
+class CircuitBreaker:
+    """
+    Fails fast while an upstream is down. After 'failure_threshold'
+    consecutive failures the breaker opens and call() raises
+    CircuitOpenError without calling the upstream for 'cooldown' seconds.
+    Then one probe call is let through (half-open): success closes the
+    breaker, failure reopens it for another cooldown. A result counts as
+    a failure when it is a dict whose 'status' is in failure_statuses, or
+    when the call raises.
+    """
+
+    FAILURE_STATUSES = ("timeout", "network_error", "api_error", "unknown_error")
+
+    def __init__(self, failure_threshold=5, cooldown=30, failure_statuses=FAILURE_STATUSES, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failure_statuses = set(failure_statuses)
+        self.clock = clock
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._last_failure = None
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "trips": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a breaker from the 'circuit_breaker' block of the weather_tool config"""
+        return cls(
+            failure_threshold=config.get("failure_threshold", 5),
+            cooldown=config.get("cooldown_seconds", 30),
+        )
+
+    def retry_after(self):
+        """Seconds until an open breaker lets a probe through (0 when closed)"""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.cooldown - (self.clock() - self._opened_at))
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == "open" and self.clock() - self._opened_at >= self.cooldown:
+                self.state, self._probing = "half_open", False
+            if self.state == "open" or (self.state == "half_open" and self._probing):
+                self.stats["rejected"] += 1
+                remaining = self.cooldown - (self.clock() - self._opened_at)
+                raise CircuitOpenError(max(0.0, remaining))
+            if self.state == "half_open":
+                self._probing = True
+            self.stats["calls"] += 1
+
+    def _after_call(self, failed, reason=None):
+        """Record an outcome; failed=None (a cancelled call) only frees the half-open probe"""
+        with self._lock:
+            if failed is None:
+                self._probing = False
+                return
+            if not failed:
+                self.state, self._failures, self._probing = "closed", 0, False
+                return
+            self._failures += 1
+            self.stats["failures"] += 1
+            self._last_failure = reason
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.stats["trips"] += 1
+                self.state, self._opened_at, self._probing = "open", self.clock(), False
+
+    def _is_failure(self, result):
+        return isinstance(result, dict) and result.get("status") in self.failure_statuses
+
+    def call(self, fn, *args):
+        """fn(*args) if the breaker allows it; raises CircuitOpenError otherwise"""
+        self._before_call()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self._after_call(True, str(e))
+            raise
+        failed = self._is_failure(result)
+        self._after_call(failed, result["status"] if failed else None)
+        return result
+
+    async def call_async(self, fn, *args):
+        """call() for a coroutine function"""
+        self._before_call()
+        try:
+            result = await fn(*args)
+        except BaseException as e:
+            self._after_call(None if isinstance(e, asyncio.CancelledError) else True, str(e))
+            raise
+        failed = self._is_failure(result)
+        self._after_call(failed, result["status"] if failed else None)
+        return result
+
+    def get_stats(self):
+        """State, counters and the time left in the cooldown, for the server's health output"""
+        retry_after = self.retry_after()
+        with self._lock:
+            return {
+                **self.stats,
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "last_failure": self._last_failure,
+                "retry_in_seconds": round(retry_after, 1),
+                "failure_threshold": self.failure_threshold,
+                "cooldown_seconds": self.cooldown,
+            }
@@ -0,0 +1,188 @@
+import asyncio
+import copy
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+def normalize_location(location: str) -> str:
+    """
+    Cache key for a location: case-folded, with whitespace collapsed and
+    spaces around commas removed, so "Nuzvid , IN" and "nuzvid,in" share
+    an entry.
+    """
+    text = unicodedata.normalize("NFKC", location).casefold()
+    return ",".join(" ".join(part.split()) for part in text.split(","))
+
+class WeatherCache:
+    """
+    Location-keyed TTL cache of weather responses with stale-while-revalidate.
+    Successful responses are fresh for 'ttl' seconds; for a further
+    'stale_grace' seconds they are still served immediately while one
+    background refresh per location replaces them. 'not_found' responses
+    are cached separately for 'negative_ttl' seconds; other errors are not
+    cached. The oldest entry is evicted once max_entries are held.
+    Entries are deep copies and every hit returns a new deep copy, so a
+    caller that edits its response (nested blocks included) does not
+    change what others are served.
+    """
+
+    def __init__(self, ttl=600, stale_grace=1800, negative_ttl=3600, max_entries=1024, clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_grace = stale_grace
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._negative = OrderedDict()
+        self._refreshing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0,
+                      "refreshes": 0, "failed_refreshes": 0, "evictions": 0, "fallbacks": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a cache from the 'cache' block of the weather_tool config"""
+        return cls(
+            ttl=config.get("ttl_seconds", 600),
+            stale_grace=config.get("stale_grace_seconds", 1800),
+            negative_ttl=config.get("negative_ttl_seconds", 3600),
+            max_entries=config.get("max_entries", 1024),
+        )
+
+    def get(self, location, fetch):
+        """
+        Weather for a location through the cache. 'fetch(location)' makes the
+        upstream call and returns the weather tool's response dict. The
+        returned copy carries a 'cache' block with the hit status and the
+        entry's age in seconds.
+        """
+        cached, refresh = self._lookup(location)
+        if cached is not None:
+            if refresh:
+                threading.Thread(target=self._refresh, args=(location, fetch), daemon=True).start()
+            return cached
+        result = fetch(location)
+        self.put(location, result)
+        return {**result, "cache": {"status": "miss", "age_seconds": 0.0}}
+
+    async def get_async(self, location, fetch):
+        """get() for a coroutine 'fetch'; stale entries are refreshed in a task on the running loop"""
+        cached, refresh = self._lookup(location)
+        if cached is not None:
+            if refresh:
+                task = asyncio.get_running_loop().create_task(self._refresh_async(location, fetch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return cached
+        result = await fetch(location)
+        self.put(location, result)
+        return {**result, "cache": {"status": "miss", "age_seconds": 0.0}}
+
+    def _lookup(self, location):
+        """(annotated cached response or None, whether the caller should start a refresh)"""
+        key = normalize_location(location)
+        now = self.clock()
+        with self._lock:
+            negative = self._negative.get(key)
+            if negative is not None and now - negative[0] < self.negative_ttl:
+                self.stats["negative_hits"] += 1
+                return self._annotate(negative, now, "negative_hit"), False
+            entry = self._entries.get(key)
+            age = now - entry[0] if entry is not None else None
+            if age is not None and age < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._annotate(entry, now, "hit"), False
+            if age is not None and age < self.ttl + self.stale_grace:
+                self._entries.move_to_end(key)
+                self.stats["stale_hits"] += 1
+                refresh = key not in self._refreshing
+                self._refreshing.add(key)
+                return self._annotate(entry, now, "stale"), refresh
+            self.stats["misses"] += 1
+            return None, False
+
+    def _refresh(self, location, fetch):
+        try:
+            result = fetch(location)
+        except Exception:
+            result = None
+        self._finish_refresh(location, result)
+
+    async def _refresh_async(self, location, fetch):
+        try:
+            result = await fetch(location)
+        except Exception:
+            result = None
+        self._finish_refresh(location, result)
+
+    def _finish_refresh(self, location, result):
+        status = result.get("status") if result is not None else None
+        # A failed refresh keeps serving the stale entry until its grace runs out
+        if status in ("success", "not_found"):
+            self.put(location, result)
+        with self._lock:
+            self.stats["refreshes"] += 1
+            if status != "success":
+                self.stats["failed_refreshes"] += 1
+            self._refreshing.discard(normalize_location(location))
+
+    def put(self, location, result):
+        """Store a response: successes in the TTL tier, not_found in the negative tier"""
+        key = normalize_location(location)
+        status = result.get("status")
+        if status not in ("success", "not_found"):
+            return
+        with self._lock:
+            entries = self._entries if status == "success" else self._negative
+            (self._negative if status == "success" else self._entries).pop(key, None)
+            entries[key] = (self.clock(), copy.deepcopy(result))
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def last_known(self, location):
+        """
+        The last successful response for a location regardless of age, or
+        None; served while the upstream is unavailable, with cache status
+        'fallback'.
+        """
+        key = normalize_location(location)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.stats["fallbacks"] += 1
+            return self._annotate(entry, now, "fallback")
+
+    @staticmethod
+    def _annotate(entry, now, status):
+        stored, result = entry
+        return {**copy.deepcopy(result), "cache": {"status": status, "age_seconds": round(now - stored, 3)}}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._negative.clear()
+
+    def get_stats(self):
+        """Hit ratio, counters and entry ages, for the server's health output"""
+        now = self.clock()
+        with self._lock:
+            stats = dict(self.stats)
+            ages = [now - stored for stored, _ in self._entries.values()]
+            stats["entries"] = len(self._entries)
+            stats["negative_entries"] = len(self._negative)
+            stats["refreshing"] = len(self._refreshing)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["negative_hits"] + stats["misses"]
+        served = stats["hits"] + stats["stale_hits"] + stats["negative_hits"]
+        stats["hit_ratio"] = round(served / lookups, 4) if lookups else 0.0
+        stats["oldest_entry_age_seconds"] = round(max(ages), 1) if ages else None
+        stats["mean_entry_age_seconds"] = round(sum(ages) / len(ages), 1) if ages else None
+        stats["ttl_seconds"] = self.ttl
+        stats["stale_grace_seconds"] = self.stale_grace
+        return stats
@@ -0,0 +1,273 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # No advisory file locks (Windows): a store directory then belongs to one process
+    FCNTL_AVAILABLE = False
+
+from tools.weather_cache import normalize_location
+
+# Bump whenever WEATHER_DTYPE changes; stores written under another version are rejected
+WEATHER_RECORD_VERSION = 1
+
+# One numeric observation; 'time' is the observation's epoch seconds (UTC)
+WEATHER_DTYPE = np.dtype([
+    ('time', np.int64),
+    ('location_id', np.uint32),
+    ('temperature', np.float32),
+    ('feels_like', np.float32),
+    ('humidity', np.float32),
+    ('pressure', np.float32),
+    ('wind_speed', np.float32),
+    ('visibility', np.float32),
+    ('condition_id', np.uint16),
+])
+
+# Stored per location, one file each; location_id is the directory
+COLUMNS = [name for name in WEATHER_DTYPE.names if name != 'location_id']
+
+def to_weather_records(observations, location_id=0):
+    """
+    Pack numeric observations (the 'observation' dicts of weather
+    responses) into a WEATHER_DTYPE array; missing values become NaN.
+    """
+    records = np.zeros(len(observations), dtype=WEATHER_DTYPE)
+    records['location_id'] = location_id
+    for index, observation in enumerate(observations):
+        for name in COLUMNS:
+            value = observation.get(name)
+            if value is None:
+                value = np.nan if WEATHER_DTYPE[name].kind == 'f' else 0
+            records[name][index] = value
+    return records
+
+class ObservationStore:
+    """
+    Append-only columnar store of weather observations. Each location
+    (keyed by its normalized name) gets a numeric id and a directory with
+    one raw little-endian file per column, so a query memory-maps only the
+    columns it reads. Times are kept strictly increasing per location:
+    repeated or older observations are skipped, which lets range queries
+    binary-search the time column. A torn append (columns of different
+    lengths) is trimmed to the shortest column.
+
+    Several processes may share a directory: id assignment and appends
+    hold an exclusive lock on its '.lock' file, and the registry and the
+    last stored time are re-read from disk under that lock. Readers take
+    no lock; they only see complete rows.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # location_id -> (rows, last time) as of this process's last append
+        self._last_time = {}
+        self.stats = {"appended": 0, "skipped": 0, "write_errors": 0, "queries": 0}
+        self.last_error = None
+        self._meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                stored = json.load(f)
+            if stored.get('version') != WEATHER_RECORD_VERSION:
+                raise ValueError(
+                    f"{directory} holds weather records version {stored.get('version')}, "
+                    f"expected {WEATHER_RECORD_VERSION}"
+                )
+        self._registry_path = os.path.join(directory, "locations.json")
+        self._lock_path = os.path.join(directory, ".lock")
+        self._locations = self._read_registry()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a store from the 'history' block of the weather_tool config"""
+        return cls(config.get("directory", "temp/weather_history"))
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """This store's thread lock plus, where available, the directory's file lock"""
+        with self._lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_registry(self):
+        if not os.path.exists(self._registry_path):
+            return {}
+        with open(self._registry_path) as f:
+            return json.load(f)
+
+    def location_id(self, location, create=False):
+        """Numeric id of a location, assigned on its first append; None if it was never stored"""
+        key = normalize_location(location)
+        with self._lock:
+            if key in self._locations:
+                return self._locations[key]
+            # Possibly added by another process since this one last looked
+            self._locations = self._read_registry()
+            if key in self._locations or not create:
+                return self._locations.get(key)
+        with self._exclusive():
+            self._create()
+            self._locations = self._read_registry()
+            if key not in self._locations:
+                self._locations[key] = max(self._locations.values(), default=0) + 1
+                with open(self._registry_path + ".tmp", "w") as f:
+                    json.dump(self._locations, f, indent=2)
+                os.replace(self._registry_path + ".tmp", self._registry_path)
+            return self._locations[key]
+
+    def _create(self):
+        """Create the store directory and its versioned meta.json on the first write"""
+        if os.path.exists(self._meta_path):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._meta_path + ".tmp", "w") as f:
+            json.dump({
+                'version': WEATHER_RECORD_VERSION,
+                'columns': {name: np.lib.format.dtype_to_descr(WEATHER_DTYPE[name].newbyteorder('<'))
+                            for name in COLUMNS},
+            }, f, indent=2)
+        os.replace(self._meta_path + ".tmp", self._meta_path)
+
+    def locations(self):
+        """Normalized location -> id for every stored location"""
+        with self._lock:
+            return dict(self._locations)
+
+    def _column_path(self, location_id, name):
+        return os.path.join(self.directory, str(location_id), f"{name}.bin")
+
+    def _count(self, location_id):
+        """Complete rows for a location: the length of its shortest column"""
+        sizes = []
+        for name in COLUMNS:
+            path = self._column_path(location_id, name)
+            sizes.append(os.path.getsize(path) // WEATHER_DTYPE[name].itemsize if os.path.exists(path) else 0)
+        return min(sizes), sizes
+
+    def append(self, location, records):
+        """
+        Append WEATHER_DTYPE records (or observation dicts) for a location.
+        Returns the number of rows written.
+        """
+        if not isinstance(records, np.ndarray):
+            records = to_weather_records(records)
+        records = np.sort(np.asarray(records, dtype=WEATHER_DTYPE), order='time', kind='stable')
+        location_id = self.location_id(location, create=True)
+        with self._exclusive():
+            # Other processes may have appended since: trust the cached time only if the row count still matches
+            count, sizes = self._count(location_id)
+            if count != max(sizes):
+                self._trim(location_id, count)
+            cached_count, last = self._last_time.get(location_id, (None, None))
+            if cached_count != count:
+                last = int(self.column(location_id, 'time', count)[-1]) if count else np.iinfo(np.int64).min
+            # Strictly increasing times, also within the batch
+            keep = records['time'] > np.maximum.accumulate(np.concatenate(([last], records['time'][:-1])))
+            fresh = records[keep]
+            self.stats["skipped"] += len(records) - len(fresh)
+            if len(fresh):
+                os.makedirs(os.path.join(self.directory, str(location_id)), exist_ok=True)
+                for name in COLUMNS:
+                    column = np.ascontiguousarray(fresh[name], dtype=WEATHER_DTYPE[name].newbyteorder('<'))
+                    with open(self._column_path(location_id, name), "ab") as f:
+                        f.write(column.tobytes())
+                self._last_time[location_id] = (count + len(fresh), int(fresh['time'][-1]))
+                self.stats["appended"] += len(fresh)
+            else:
+                self._last_time[location_id] = (count, last)
+            return len(fresh)
+
+    def _trim(self, location_id, count):
+        for name in COLUMNS:
+            path = self._column_path(location_id, name)
+            if os.path.exists(path):
+                os.truncate(path, count * WEATHER_DTYPE[name].itemsize)
+
+    def record(self, location, observation):
+        """Append one response's observation; storage errors are counted, never raised"""
+        try:
+            return self.append(location, [observation])
+        except (OSError, ValueError) as e:
+            with self._lock:
+                self.stats["write_errors"] += 1
+                self.last_error = str(e)
+            return 0
+
+    def column(self, location_id, name, count=None):
+        """Read-only memory map of one column (the first 'count' rows)"""
+        if count is None:
+            count = self._count(location_id)[0]
+        if count == 0:
+            return np.zeros(0, dtype=WEATHER_DTYPE[name])
+        return np.memmap(self._column_path(location_id, name), dtype=WEATHER_DTYPE[name].newbyteorder('<'),
+                         mode="r", shape=(count,))
+
+    def query(self, location, start=None, end=None, fields=None):
+        """
+        Observations of a location with start <= time < end (epoch seconds;
+        None for open ends), as a dict of column arrays including 'time'.
+        """
+        fields = [name for name in (fields or COLUMNS) if name != 'time']
+        with self._lock:
+            self.stats["queries"] += 1
+        location_id = self.location_id(location)
+        if location_id is None:
+            return {name: np.zeros(0, dtype=WEATHER_DTYPE[name]) for name in ['time', *fields]}
+        count = self._count(location_id)[0]
+        times = self.column(location_id, 'time', count)
+        first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        last = count if end is None else int(np.searchsorted(times, end, side='left'))
+        result = {'time': np.array(times[first:last])}
+        for name in fields:
+            result[name] = np.array(self.column(location_id, name, count)[first:last])
+        return result
+
+    def resample(self, location, field, start, end, interval=3600):
+        """
+        Mean of 'field' per 'interval' seconds over [start, end): (bucket
+        start times, means, observation counts). Empty buckets are NaN.
+        """
+        rows = self.query(location, start, end, [field])
+        buckets = int(np.ceil((end - start) / interval))
+        index = (rows['time'] - start) // interval
+        values = rows[field].astype(np.float64)
+        valid = ~np.isnan(values)
+        counts = np.bincount(index[valid], minlength=buckets)[:buckets]
+        sums = np.bincount(index[valid], weights=values[valid], minlength=buckets)[:buckets]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        return start + np.arange(buckets, dtype=np.int64) * interval, means, counts
+
+    def get_stats(self):
+        """Locations, rows and write counters for the server's health output"""
+        with self._lock:
+            stats = dict(self.stats)
+            location_ids = list(self._locations.values())
+        stats["locations"] = len(location_ids)
+        stats["observations"] = sum(self._count(location_id)[0] for location_id in location_ids)
+        stats["directory"] = self.directory
+        if self.last_error:
+            stats["last_error"] = self.last_error
+        return stats
+
+def history_window(days, end=None):
+    """(start, end) epoch seconds covering the last 'days' days, end rounded up to the hour"""
+    end = int(end if end is not None else time.time())
+    end += -end % 3600
+    return end - int(days * 86400), end
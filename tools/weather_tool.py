@@ -91,93 +91,387 @@
 
 
 
+import asyncio
+import logging
 import os
+import re
+import threading
+import weakref
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from datetime import datetime
 
+from tools.config_loader import get_tool_config
+from tools.upstream_guard import CircuitBreaker, CircuitOpenError, SingleFlight
+from tools.weather_cache import WeatherCache, normalize_location
+from tools.weather_history import COLUMNS, ObservationStore, history_window
+
+# The async client is optional; without it the async fetch runs the pooled sync one in a thread
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
 # Load environment variables
 load_dotenv()
 
+WEATHER_CONFIG = get_tool_config("weather_tool")
+BASE_URL = (os.getenv("OPENWEATHERMAP_BASE_URL") or WEATHER_CONFIG.get("base_url")
+            or "http://api.openweathermap.org/data/2.5/weather")
+
+# Connection pool and retry policy shared by every call
+HTTP_CONFIG = WEATHER_CONFIG.get("http", {})
+TIMEOUT = HTTP_CONFIG.get("timeout_seconds", 10)
+RETRIES = HTTP_CONFIG.get("retries", 2)
+BACKOFF_FACTOR = HTTP_CONFIG.get("backoff_factor", 0.3)
+RETRY_STATUSES = tuple(HTTP_CONFIG.get("retry_statuses", (429, 500, 502, 503, 504)))
+POOL_SIZE = HTTP_CONFIG.get("pool_size", 10)
+
+# Responses are cached per normalized location; None disables caching
+_cache_config = WEATHER_CONFIG.get("cache", {})
+WEATHER_CACHE = WeatherCache.from_config(_cache_config) if _cache_config.get("enabled", True) else None
+
+def open_history(config):
+    """
+    The observation store for the 'history' config block: (store, None),
+    (None, None) when disabled, or (None, reason) when the store directory
+    cannot be used (for example records of another version). History is
+    then off, but the weather tools keep working.
+    """
+    if not config.get("enabled", True):
+        return None, None
+    try:
+        return ObservationStore.from_config(config), None
+    except (OSError, ValueError) as e:
+        logging.getLogger(__name__).warning(f"Weather history disabled: {e}")
+        return None, str(e)
+
+# Every upstream observation is appended to the local time-series store; None disables it
+HISTORY, HISTORY_ERROR = open_history(WEATHER_CONFIG.get("history", {}))
+
+HISTORY_FIELDS = [name for name in COLUMNS if name not in ("time", "condition_id")]
+
+# Identical in-flight lookups share one upstream call; the breaker fails fast while OpenWeatherMap is down
+IN_FLIGHT = SingleFlight()
+_breaker_config = WEATHER_CONFIG.get("circuit_breaker", {})
+BREAKER = CircuitBreaker.from_config(_breaker_config) if _breaker_config.get("enabled", True) else None
+SERVE_LAST_KNOWN = _breaker_config.get("serve_last_known", True)
+
+# "17.385, 78.4867" is looked up by coordinates rather than by name
+COORDINATES_PATTERN = re.compile(r"^\s*([-+]?\d+(?:\.\d+)?)\s*,\s*([-+]?\d+(?:\.\d+)?)\s*$")
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
 def get_weather_data(location: str) -> dict:
     """
     Fetch current weather data for a given location.
     Returns a dictionary compatible with MCP tools and includes timestamp.
     """
+    if WEATHER_CACHE is None:
+        return guarded_fetch(location)
+    return serve_last_known(location, WEATHER_CACHE.get(location, guarded_fetch))
+
+async def get_weather_data_async(location: str) -> dict:
+    """get_weather_data for the async MCP transport: the same cache, without blocking the event loop"""
+    if WEATHER_CACHE is None:
+        return await guarded_fetch_async(location)
+    return serve_last_known(location, await WEATHER_CACHE.get_async(location, guarded_fetch_async))
+
+def guarded_fetch(location: str, upstream=None, breaker=None) -> dict:
+    """
+    'upstream(location)' (default fetch_weather_data) coalesced with any
+    identical call in flight and passed through the circuit breaker
+    ('breaker' defaults to BREAKER; False disables it). While the breaker
+    is open the result is a 'circuit_open' error, returned immediately.
+    """
+    upstream = upstream or fetch_weather_data
+    breaker = BREAKER if breaker is None else breaker
+
+    def call():
+        if not breaker:
+            return _record_observation(location, upstream(location))
+        try:
+            return _record_observation(location, breaker.call(upstream, location))
+        except CircuitOpenError as e:
+            return _circuit_open(location, e.retry_after)
+
+    return IN_FLIGHT.do(normalize_location(location), call)
+
+async def guarded_fetch_async(location: str, upstream=None, breaker=None) -> dict:
+    """guarded_fetch for a coroutine upstream (default fetch_weather_data_async)"""
+    upstream = upstream or fetch_weather_data_async
+    breaker = BREAKER if breaker is None else breaker
+
+    async def call():
+        if not breaker:
+            return _record_observation(location, await upstream(location))
+        try:
+            return _record_observation(location, await breaker.call_async(upstream, location))
+        except CircuitOpenError as e:
+            return _circuit_open(location, e.retry_after)
+
+    return await IN_FLIGHT.do_async(normalize_location(location), call)
+
+def _record_observation(location: str, result: dict) -> dict:
+    """Append a successful response's observation to HISTORY (one small write per column)"""
+    observation = result.get("observation") if isinstance(result, dict) else None
+    if HISTORY is not None and observation and observation.get("time") is not None:
+        HISTORY.record(location, observation)
+    return result
+
+def serve_last_known(location: str, result: dict, cache=None) -> dict:
+    """While the breaker is open, the last cached success for the location instead of the error, if there is one"""
+    cache = WEATHER_CACHE if cache is None else cache
+    if result.get("status") != "circuit_open" or not cache or not SERVE_LAST_KNOWN:
+        return result
+    last = cache.last_known(location)
+    if last is None:
+        return result
+    return {**last, "circuit": {"state": "open", "retry_in_seconds": result["retry_in_seconds"]}}
+
+def get_weather_cache_stats() -> dict:
+    """Weather cache counters for the server's health output"""
+    if WEATHER_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **WEATHER_CACHE.get_stats()}
+
+def query_weather_history(location: str, field: str = "humidity", days: float = 30, interval: int = 3600,
+                          end=None) -> dict:
+    """
+    Stored observations of one field for a location, averaged per
+    'interval' seconds over the last 'days' days, without calling the API.
+    Empty intervals are None.
+    """
+    if HISTORY is None:
+        return {"error": "Weather history is disabled", **({"message": HISTORY_ERROR} if HISTORY_ERROR else {}),
+                "location": location, "status": "error"}
+    if field not in HISTORY_FIELDS:
+        return {"error": f"Unknown field '{field}'", "message": f"Choose one of {', '.join(HISTORY_FIELDS)}",
+                "location": location, "status": "error"}
+    start, end = history_window(days, end)
+    times, means, counts = HISTORY.resample(location, field, start, end, interval)
+    observed = means[counts > 0]
+    return {
+        "location": location,
+        "field": field,
+        "interval_seconds": interval,
+        "start": start,
+        "end": end,
+        "times": times.tolist(),
+        "values": [round(float(value), 2) if count else None for value, count in zip(means, counts)],
+        "observations": int(counts.sum()),
+        "summary": {
+            "min": round(float(observed.min()), 2), "max": round(float(observed.max()), 2),
+            "mean": round(float(observed.mean()), 2),
+        } if len(observed) else None,
+        "status": "success" if len(observed) else "no_data",
+    }
+
+def get_weather_history_stats() -> dict:
+    """Observation store counters for the server's health output"""
+    if HISTORY is None:
+        return {"enabled": False, **({"last_error": HISTORY_ERROR} if HISTORY_ERROR else {})}
+    return {"enabled": True, **HISTORY.get_stats()}
+
+def get_weather_upstream_stats() -> dict:
+    """Circuit breaker state and request coalescing counters for the server's health output"""
+    return {
+        "circuit_breaker": {"enabled": True, **BREAKER.get_stats()} if BREAKER else {"enabled": False},
+        "coalescing": IN_FLIGHT.get_stats(),
+    }
+
+def create_session() -> requests.Session:
+    """
+    Keep-alive session with a bounded connection pool. Connection errors
+    and RETRY_STATUSES are retried up to RETRIES times with exponential
+    backoff (honouring Retry-After); the last response is returned rather
+    than raised once retries run out. Read timeouts are not retried, so a
+    slow upstream costs one TIMEOUT.
+    """
+    retry = Retry(
+        total=RETRIES,
+        read=0,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_session() -> requests.Session:
+    """The shared session, created on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+def get_async_client():
+    """The httpx client for the running event loop, created on first use in that loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=TIMEOUT,
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+        )
+        _async_clients[loop] = client
+    return client
+
+def _timestamp() -> str:
+    return datetime.utcnow().isoformat() + "Z"  # UTC timestamp
+
+def _request_params(location: str):
+    """(query parameters, None), or (None, error response) when no API key is set"""
     api_key = os.getenv('OPENWEATHERMAP_API_KEY')
     
     if not api_key:
-        return {
+        return None, {
             "error": "OpenWeatherMap API key is not set",
             "message": "Please set OPENWEATHERMAP_API_KEY in your .env file",
             "location": location,
             "status": "error"
         }
+    coordinates = parse_coordinates(location)
+    query = {'lat': coordinates[0], 'lon': coordinates[1]} if coordinates else {'q': location}
+    return {
+        **query,
+        'appid': api_key,
+        'units': 'metric'
+    }, None
+
+def format_coordinates(lat: float, lon: float) -> str:
+    """'lat,lon' location string, rounded to ~10 m so nearby plots share a cache entry"""
+    return f"{float(lat):.4f},{float(lon):.4f}"
+
+def parse_coordinates(location: str):
+    """(lat, lon) for a 'lat,lon' location string, or None for a place name"""
+    match = COORDINATES_PATTERN.match(location)
+    if match is None:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+def _error(location: str, error: str, message: str, status: str) -> dict:
+    return {
+        "error": error,
+        "message": message,
+        "location": location,
+        "status": status,
+        "timestamp": _timestamp()
+    }
+
+def _circuit_open(location: str, retry_after: float) -> dict:
+    response = _error(location, "Weather service unavailable",
+                      f"OpenWeatherMap is failing; skipping requests for {retry_after:.0f}s", "circuit_open")
+    response["retry_in_seconds"] = round(retry_after, 1)
+    return response
+
+def _observation(data: dict) -> dict:
+    """The numeric fields of an OpenWeatherMap response; 'time' is its epoch observation time"""
+    main = data['main']
+    coord = data.get('coord', {})
+    return {
+        "time": data.get('dt'),
+        "city_id": data.get('id'),
+        "lat": coord.get('lat'),
+        "lon": coord.get('lon'),
+        "temperature": float(main['temp']),
+        "feels_like": float(main['feels_like']),
+        "humidity": float(main['humidity']),
+        "pressure": float(main['pressure']),
+        "wind_speed": float(data.get('wind', {}).get('speed', 0)),
+        "visibility": float(data['visibility']) if data.get('visibility') is not None else None,
+        "condition_id": data['weather'][0].get('id', 0),
+    }
+
+def _parse_response(location: str, status_code: int, json_body, text: str) -> dict:
+    """The tool's response dict for an HTTP status and body ('json_body' is a callable)"""
+    if status_code == 200:
+        data = json_body()
+        weather_info = {
+            "location": f"{data['name']}, {data['sys']['country']}",
+            "temperature": f"{data['main']['temp']}°C",
+            "feels_like": f"{data['main']['feels_like']}°C",
+            "humidity": f"{data['main']['humidity']}%",
+            "pressure": f"{data['main']['pressure']} hPa",
+            "description": data['weather'][0]['description'].title(),
+            "wind_speed": f"{data.get('wind', {}).get('speed', 0)} m/s",
+            "visibility": f"{data.get('visibility', 'N/A')} m" if data.get('visibility') else "N/A",
+            "observation": _observation(data),
+            "status": "success",
+            "timestamp": _timestamp()
+        }
+        return weather_info
+    elif status_code == 404:
+        return _error(location, "Location not found", f"Could not find weather data for '{location}'", "not_found")
+    else:
+        return _error(location, f"API request failed with status {status_code}", text, "api_error")
+
+def fetch_weather_data(location: str) -> dict:
+    """Call OpenWeatherMap for a location over the pooled session, bypassing the cache"""
+    params, error = _request_params(location)
+    if error:
+        return error
     
     try:
-        base_url = "http://api.openweathermap.org/data/2.5/weather"
-        params = {
-            'q': location,
-            'appid': api_key,
-            'units': 'metric'
-        }
-        
-        response = requests.get(base_url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            weather_info = {
-                "location": f"{data['name']}, {data['sys']['country']}",
-                "temperature": f"{data['main']['temp']}°C",
-                "feels_like": f"{data['main']['feels_like']}°C",
-                "humidity": f"{data['main']['humidity']}%",
-                "pressure": f"{data['main']['pressure']} hPa",
-                "description": data['weather'][0]['description'].title(),
-                "wind_speed": f"{data.get('wind', {}).get('speed', 0)} m/s",
-                "visibility": f"{data.get('visibility', 'N/A')} m" if data.get('visibility') else "N/A",
-                "status": "success",
-                "timestamp": datetime.utcnow().isoformat() + "Z"  # UTC timestamp
-            }
-            return weather_info
-        
-        elif response.status_code == 404:
-            return {
-                "error": "Location not found",
-                "message": f"Could not find weather data for '{location}'",
-                "location": location,
-                "status": "not_found",
-                "timestamp": datetime.utcnow().isoformat() + "Z"
-            }
-        else:
-            return {
-                "error": f"API request failed with status {response.status_code}",
-                "message": response.text,
-                "location": location,
-                "status": "api_error",
-                "timestamp": datetime.utcnow().isoformat() + "Z"
-            }
-            
+        response = get_session().get(BASE_URL, params=params, timeout=TIMEOUT)
+        return _parse_response(location, response.status_code, response.json, response.text)
     except requests.exceptions.Timeout:
-        return {
-            "error": "Request timeout",
-            "message": "Weather service took too long to respond",
-            "location": location,
-            "status": "timeout",
-            "timestamp": datetime.utcnow().isoformat() + "Z"
-        }
+        return _error(location, "Request timeout", "Weather service took too long to respond", "timeout")
     except requests.exceptions.RequestException as e:
-        return {
-            "error": "Network error",
-            "message": str(e),
-            "location": location,
-            "status": "network_error",
-            "timestamp": datetime.utcnow().isoformat() + "Z"
-        }
+        # With retries mounted, a read timeout surfaces wrapped in MaxRetryError
+        if isinstance(getattr(e.args[0] if e.args else None, "reason", None), ReadTimeoutError):
+            return _error(location, "Request timeout", "Weather service took too long to respond", "timeout")
+        return _error(location, "Network error", str(e), "network_error")
     except Exception as e:
-        return {
-            "error": "Unexpected error",
-            "message": str(e),
-            "location": location,
-            "status": "unknown_error",
-            "timestamp": datetime.utcnow().isoformat() + "Z"
-        }
+        return _error(location, "Unexpected error", str(e), "unknown_error")
+
+async def _get_with_retries(client, params):
+    """GET with the same retry policy as the sync session"""
+    for attempt in range(RETRIES + 1):
+        try:
+            response = await client.get(BASE_URL, params=params)
+        except httpx.TransportError as e:
+            if attempt == RETRIES or isinstance(e, httpx.ReadTimeout):
+                raise
+            delay = 0.0
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == RETRIES:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else 0.0
+        # urllib3's schedule: the first retry is immediate, then backoff_factor * 2 ** attempt
+        await asyncio.sleep(max(delay, BACKOFF_FACTOR * 2 ** attempt if attempt else 0.0))
+
+async def fetch_weather_data_async(location: str) -> dict:
+    """fetch_weather_data on the event loop's pooled httpx client"""
+    if not HTTPX_AVAILABLE:
+        return await asyncio.to_thread(fetch_weather_data, location)
+    params, error = _request_params(location)
+    if error:
+        return error
+
+    try:
+        response = await _get_with_retries(get_async_client(), params)
+        return _parse_response(location, response.status_code, response.json, response.text)
+    except httpx.TimeoutException:
+        return _error(location, "Request timeout", "Weather service took too long to respond", "timeout")
+    except httpx.HTTPError as e:
+        return _error(location, "Network error", str(e), "network_error")
+    except Exception as e:
+        return _error(location, "Unexpected error", str(e), "unknown_error")